@@ -12,7 +12,8 @@ from shapely.geometry import shape, Polygon, MultiPolygon
 from rasterio.windows import Window
 import time
 import shutil
-import uuid
+
+from utils.Shard_Runner import shard_argument_parser, select_shard, stable_id, partial_path, all_partials, finalize
 
 # Ignorar específicamente las advertencias de imágenes no georreferenciadas
 warnings.filterwarnings("ignore", category=NotGeoreferencedWarning)
@@ -23,14 +24,22 @@ annotation_file = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2
 output_directory = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/separado'
 wld_directory = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/wlds'
 
-# Limpiar el directorio de salida antes de comenzar el procesamiento
-for folder in [output_directory, wld_directory]:
-    if os.path.exists(folder):
-        shutil.rmtree(folder)
-    os.makedirs(folder, exist_ok=True)
-# Asegúrate de que las carpetas de salida existan y estén limpias
-os.makedirs(wld_directory, exist_ok=True)
-os.makedirs(output_directory, exist_ok=True)
+# Ejecución por shards: `--shard i/N` procesa solo una partición estable de las imágenes y escribe en
+# su propio directorio parcial (los shards pueden correr en máquinas distintas). Con --merge-shards N se
+# unen los directorios parciales en output_directory y se arma DS_Classifier.
+parser = shard_argument_parser("Recortes PNG georreferenciados por clase y año desde COCO")
+parser.add_argument('--merge-shards', type=int, default=None,
+                    help="Unir las salidas parciales de N shards y reorganizar (sin procesar imágenes)")
+args = parser.parse_args()
+shard = args.shard
+shard_directory = partial_path(output_directory, shard)
+
+# Limpiar el directorio parcial del shard antes de comenzar el procesamiento; el directorio final
+# solo se reemplaza al unir las salidas
+if args.merge_shards is None:
+    if os.path.exists(shard_directory):
+        shutil.rmtree(shard_directory)
+    os.makedirs(shard_directory, exist_ok=True)
 
 # Instancia COCO
 coco = COCO(annotation_file)
@@ -57,11 +66,20 @@ def convert_coco_poly_to_shapely(ann_segmentation):
     else:
         raise ValueError("Formato de segmentación desconocido")
 
+# Une las salidas parciales en output_directory (que se reemplaza) y limpia la carpeta de WLD
+def merge_output(partials):
+    finalize(partials, output_directory, 'DIR')
+    if os.path.exists(wld_directory):
+        shutil.rmtree(wld_directory)
+    os.makedirs(wld_directory, exist_ok=True)
+
 def reorganize_output():
     source_directory = output_directory
     destination_directory = os.path.join(source_directory, "../DS_Classifier")
-    if not os.path.exists(destination_directory):
-        os.makedirs(destination_directory)
+    # Se arma de nuevo desde la salida unida, sin recortes de ejecuciones anteriores
+    if os.path.exists(destination_directory):
+        shutil.rmtree(destination_directory)
+    os.makedirs(destination_directory)
 
     # Recorrer cada subdirectorio y copiar los archivos PNG a la nueva estructura
     for root, dirs, files in os.walk(source_directory):
@@ -92,9 +110,9 @@ def process_image(image_id):
             class_id = ann['category_id']
             class_name = coco.loadCats(class_id)[0]['name']
 
-            # Crea un identificador único para cada anotación procesada
-            unique_dir = uuid.uuid4().hex
-            class_dir = os.path.join(output_directory, class_name, year, unique_dir)
+            # Identificador determinista de cada anotación procesada (igual en cada ejecución y nodo)
+            unique_dir = stable_id(image_id, ann['id'])
+            class_dir = os.path.join(shard_directory, class_name, year, unique_dir)
             os.makedirs(class_dir, exist_ok=True)
 
             polygon = convert_coco_poly_to_shapely(ann['segmentation'])
@@ -135,7 +153,11 @@ def process_image(image_id):
 # Paralelizar el procesamiento de imágenes
 def main():
     start_time = time.time()
-    image_ids = coco.getImgIds()
+    if args.merge_shards is not None:
+        merge_output(all_partials(output_directory, args.merge_shards))
+        reorganize_output()
+        return
+    image_ids = select_shard(coco.getImgIds(), shard)
     results = []
     with ProcessPoolExecutor() as executor:
         futures = [executor.submit(process_image, image_id) for image_id in image_ids]
@@ -144,8 +166,13 @@ def main():
             if result:
                 results.append(result)
 
-    # Reorganizar y copiar los archivos al completar todos los procesos
-    reorganize_output()
+    # Unir, reorganizar y copiar los archivos al completar todos los procesos (con shards, al terminar todos)
+    if shard[1] == 1:
+        merge_output([shard_directory])
+        reorganize_output()
+    else:
+        print(f"Shard {shard[0]}/{shard[1]} completado en {shard_directory}. Al terminar todos: "
+              f"python coco_to_geopng.py --merge-shards {shard[1]}")
 
     print("\n".join([res for res in results if res]))
     end_time = time.time()
@@ -7,6 +7,8 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 import re
 
+from utils.Mask_COGExporter import write_mask_cog, build_mosaics
+
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -49,7 +51,7 @@ def process_annotation(image_id, ann):
         
         # Filtrar solo las imágenes del año 2018
         if year != "2018":
-            return
+            return None
         
         # Extraer la clase de la anotación
         class_id = ann['category_id']
@@ -61,34 +63,25 @@ def process_annotation(image_id, ann):
         # Generar la transformación a partir de las coordenadas de la imagen original
         transform = extract_coordinates_and_transform(coords, mask.shape[1], mask.shape[0])
         
-        # Definir el perfil para el archivo GeoTIFF
-        profile = {
-            'driver': 'GTiff',
-            'dtype': 'uint8',
-            'nodata': 0,
-            'width': mask.shape[1],
-            'height': mask.shape[0],
-            'count': 1,
-            'crs': 'EPSG:4326',
-            'transform': transform
-        }
-        
         # Simplificar el nombre del archivo para evitar errores de GDAL
         output_filename = f"{img_info['id']}_{class_name}_mask_2018.tif"
         output_path = os.path.join(output_directory, output_filename)
         
-        with rasterio.open(output_path, 'w', **profile) as dst:
-            dst.write(mask, 1)
+        # Guardar como COG: teselado, comprimido y con overviews internas
+        write_mask_cog(mask, output_path, transform, crs='EPSG:4326')
 
         logging.info(f"Máscara exportada a {output_path}")
+        return year, class_name, output_path
 
     except Exception as e:
         logging.error(f"Error procesando la imagen ID {image_id}: {e}")
+        return None
 
 # Procesamiento paralelo de las imágenes y anotaciones
 def process_images_parallel(image_ids):
     total_tasks = sum(len(coco.getAnnIds(imgIds=image_id)) for image_id in image_ids)
     completed_tasks = 0
+    exported = []
     
     with ThreadPoolExecutor() as executor:
         futures = [executor.submit(process_annotation, image_id, ann) 
@@ -98,9 +91,14 @@ def process_images_parallel(image_ids):
             completed_tasks += 1
             logging.info(f"Tarea completada: {completed_tasks}/{total_tasks}")
             try:
-                future.result()  # Propaga excepciones si las hay
+                result = future.result()  # Propaga excepciones si las hay
+                if result:
+                    exported.append(result)
             except Exception as e:
                 logging.error(f"Error en tarea completada: {e}")
+    
+    # Un VRT por año y clase que referencia todas las máscaras (se abre en QGIS como una sola capa)
+    build_mosaics(exported, output_directory)
 
 # Obtener IDs de las imágenes
 image_ids = coco.getImgIds()
@@ -7,6 +7,11 @@ from pyproj import Proj, Transformer
 from pycocotools.coco import COCO
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from utils.Shard_Runner import shard_argument_parser, select_shard, partial_path, finalize
+
+# Ejecución por shards: `--shard i/N` procesa solo una partición estable de las imágenes
+shard = shard_argument_parser("CSV de anotaciones COCO con coordenadas geográficas").parse_args().shard
+
 # Define la ruta de las imágenes y el archivo de anotaciones
 image_directory = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/images'
 annotation_file = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/result.json'
@@ -102,8 +107,8 @@ def process_image(image_id):
 
 # Verificar si el archivo CSV ya existe
 if not os.path.exists(output_csv):
-    # Obtener IDs de las imágenes
-    image_ids = coco.getImgIds()
+    # Obtener IDs de las imágenes que le corresponden a este shard
+    image_ids = select_shard(coco.getImgIds(), shard)
 
     # Usar ThreadPoolExecutor para procesar imágenes en paralelo
     num_threads = 12
@@ -115,12 +120,19 @@ if not os.path.exists(output_csv):
             except Exception as e:
                 print(f"Error procesando la imagen ID {futures[future]}: {e}")
 
-    # Escribir el CSV
-    with open(output_csv, 'w', newline='') as csvfile:
+    # Escribir el CSV parcial del shard, ordenado por filas (los hilos terminan en cualquier orden)
+    shard_csv = partial_path(output_csv, shard)
+    with open(shard_csv, 'w', newline='') as csvfile:
         csv_writer = csv.writer(csvfile)
         csv_writer.writerow(['Start Date', 'End Date', 'Year', 'Class', 'Original Bbox', 'Detected Bbox', 'Center Point (Lat/Lon)', 'New Filename'])
-        csv_writer.writerows(csv_rows)
-
-    print("Procesamiento completado y CSV generado.")
+        csv_writer.writerows(sorted(csv_rows))
+
+    # Con un solo nodo el CSV parcial ya es el final y solo se renombra; la unión de N shards da el mismo archivo
+    if shard[1] == 1:
+        finalize([shard_csv], output_csv, 'CSV')
+        print("Procesamiento completado y CSV generado.")
+    else:
+        print(f"Shard {shard[0]}/{shard[1]} generado en {shard_csv}. Unir con: python -m utils.Shard_Runner merge "
+              f"--shards {shard[1]} --output {output_csv} --kind CSV")
 else:
     print(f"El archivo CSV ya existe en la ruta {output_csv}. No se generó un nuevo archivo.")
@@ -5,6 +5,8 @@ import re
 from rasterio.transform import from_bounds
 from pycocotools.coco import COCO
 
+from utils.Mask_COGExporter import write_mask_cog, build_mosaics
+
 # Define la ruta de las imágenes y el archivo de anotaciones
 image_directory = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/images'
 annotation_file = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/result.json'
@@ -44,7 +46,7 @@ def process_image(image_id):
     
     # Filtrar solo las imágenes del año 2018
     if year != "2018":
-        return
+        return None
     
     ann_ids = coco.getAnnIds(imgIds=image_id)
     anns = coco.loadAnns(ann_ids)
@@ -59,28 +61,24 @@ def process_image(image_id):
     # Generar la transformación a partir de las coordenadas de la imagen original
     transform = extract_coordinates_and_transform(coords, mask.shape[1], mask.shape[0])
     
-    # Definir el perfil para el archivo GeoTIFF
-    profile = {
-        'driver': 'GTiff',
-        'dtype': 'uint8',
-        'nodata': 0,
-        'width': mask.shape[1],
-        'height': mask.shape[0],
-        'count': 1,
-        'crs': 'EPSG:4326',  # CRS para WGS84
-        'transform': transform
-    }
-    
-    # Guardar la máscara como un GeoTIFF georreferenciado
+    # Guardar la máscara como un COG georreferenciado (teselado, comprimido y con overviews), en WGS84
     output_path = os.path.join(output_directory, f"{os.path.splitext(img_info['file_name'])[0]}_mask_2018.tif")
-    with rasterio.open(output_path, 'w', **profile) as dst:
-        dst.write(mask, 1)
+    write_mask_cog(mask, output_path, transform, crs='EPSG:4326')
 
     print(f"Máscara exportada a {output_path}")
+    return year, output_path
 
 # Obtener IDs de las imágenes
 image_ids = coco.getImgIds()
 
 # Procesar solo las imágenes del año 2018
+exported = []
 for image_id in image_ids:
-    process_image(image_id)
+    result = process_image(image_id)
+    if result:
+        year, output_path = result
+        # La máscara de cada imagen suma todas sus clases
+        exported.append((year, "all", output_path))
+
+# Un VRT por año que referencia todas las máscaras
+build_mosaics(exported, output_directory)
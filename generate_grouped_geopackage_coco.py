@@ -5,18 +5,28 @@ from rasterio.transform import from_bounds
 from rasterio.features import shapes
 from shapely.geometry import shape, Polygon, Point
 import geopandas as gpd
+import pandas as pd
 from pycocotools.coco import COCO
 import re
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+
+from utils.Geometry_PostProcessor import pixel_size, postprocess
+from utils.Vector_StreamWriter import StreamingVectorWriter, encode_batch, init_worker, send_batch
+from utils.Shard_Runner import shard_argument_parser, select_shard, partial_path, finalize
+
+# Ejecución por shards: `--shard i/N` procesa solo una partición estable de las imágenes
+shard = shard_argument_parser("GeoPackage agrupado por clase y año desde COCO").parse_args().shard
 
 # Define la ruta de las imágenes y el archivo de anotaciones
 image_directory = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/images'
 annotation_file = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/result.json'
+# Formato de salida: 'GPKG' (un archivo, una capa por clase y año), 'Parquet' (GeoParquet) o 'FlatGeobuf'
+# (estos dos escriben un archivo por clase y año dentro de la carpeta de salida). La salida anterior se reemplaza.
+output_format = 'GPKG'
 output_file = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/labeledMasks_grouped.gpkg'
-
-# Asegúrate de que la carpeta de salida exista
-if os.path.exists(output_file):
-    os.remove(output_file)  # Eliminar si ya existe para evitar conflictos
+if output_format != 'GPKG':
+    output_file = os.path.splitext(output_file)[0] + f"_{output_format.lower()}"
 
 # Instancia COCO
 coco = COCO(annotation_file)
@@ -46,19 +56,8 @@ def extract_coordinates_and_transform(coords, width, height):
     transform = from_bounds(lon_min, lat_min, lon_max, lat_max, width, height)
     return transform
 
-# Función para agregar una máscara a la capa correspondiente
-def add_mask_to_geopackage(class_name, year, polygon, attributes, output_file):
-    # Convertir el polígono en un GeoDataFrame
-    gdf = gpd.GeoDataFrame([attributes], geometry=[polygon], crs="EPSG:4326")
-    
-    # Nombre de la capa basada en la clase y el año
-    layer_name = f"{class_name}_{year}"
-    
-    # Escribir en el GeoPackage de forma secuencial
-    gdf.to_file(output_file, layer=layer_name, driver="GPKG", mode='a')
-
-# Procesamiento de imágenes y anotaciones
-def process_image(image_id):
+# Procesamiento de imágenes y anotaciones; `seq` es la posición de la imagen en el orden de escritura
+def process_image(seq, image_id):
     img_info = coco.loadImgs(image_id)[0]
     img_path = os.path.join(image_directory, img_info['file_name'])
     img = rasterio.open(img_path).read(1)  # Lee la imagen como una sola banda (grayscale)
@@ -67,12 +66,14 @@ def process_image(image_id):
     
     # Filtrar solo las imágenes del año 2018 (puedes ajustar el filtro según sea necesario)
     if year != "2018":
-        return []
+        send_batch(encode_batch([], [], pd.DataFrame(), seq=seq))  # El escritor ordenado espera un lote por imagen
+        return 0
     
+    # Anotaciones en orden de id para que la salida sea la misma en cada ejecución
     ann_ids = coco.getAnnIds(imgIds=image_id)
-    anns = coco.loadAnns(ann_ids)
+    anns = sorted(coco.loadAnns(ann_ids), key=lambda ann: ann['id'])
 
-    results = []
+    layers, polygons, results = [], [], []
     for ann in anns:
         # Extraer la clase de la anotación
         class_id = ann['category_id']
@@ -89,7 +90,6 @@ def process_image(image_id):
         for shape_data, value in shapes(mask, transform=transform):
             if value == 1:  # Considerar solo las áreas con valor 1 en la máscara
                 polygon = shape(shape_data)
-                centerpoint = polygon.centroid
                 
                 # Crear el ID único combinado
                 unique_id = f"uniqueID{image_id}_annotationID{ann['id']}"
@@ -101,34 +101,56 @@ def process_image(image_id):
                     "filename": img_info['file_name'],
                     "year": year,
                     "color": color,
-                    "centerpoint": centerpoint
+                    "pixel_size": pixel_size(transform)
                 }
                 
-                results.append((class_name, year, polygon, attributes))
+                layers.append(f"{class_name}_{year}")
+                polygons.append(polygon)
+                results.append(attributes)
     
-    return results
-
-# Función para agregar las máscaras a GeoPackage secuencialmente
-def add_masks_to_geopackage(results):
-    for class_name, year, polygon, attributes in results:
-        # Escribir en el GeoPackage por capa de clase y año
-        add_mask_to_geopackage(class_name, year, polygon, attributes, output_file)
-
-# Procesamiento paralelo de imágenes
-def process_images_parallel(image_ids):
-    all_results = []
-    with ProcessPoolExecutor() as executor:
-        futures = [executor.submit(process_image, image_id) for image_id in image_ids]
-        for future in as_completed(futures):
-            all_results.extend(future.result())  # Agregar resultados
+    if not results:
+        send_batch(encode_batch([], [], pd.DataFrame(), seq=seq))
+        return 0
+    
+    # Simplificar, reducir precisión y calcular área/perímetro/centroide de la imagen en bloque
+    gdf = gpd.GeoDataFrame(pd.DataFrame(results), geometry=polygons, crs="EPSG:4326")
+    gdf["layer"] = layers
+    gdf = postprocess(gdf, pixel=gdf.pop("pixel_size").to_numpy())
+    
+    # Enviar el lote (WKB + columnas) al proceso escritor en vez de devolverlo
+    send_batch(encode_batch(gdf.pop("layer"), gdf.geometry, pd.DataFrame(gdf.drop(columns="geometry")), seq=seq))
+    return len(gdf)
 
-    # Escribir resultados de forma secuencial
-    add_masks_to_geopackage(all_results)
+# Procesamiento paralelo de imágenes; un proceso dedicado escribe mientras los workers calculan.
+# El escritor escribe las imágenes en el orden de `image_ids`; como solo hay unas pocas tareas en curso
+# (se espera siempre a la más antigua), los lotes que llegan adelantados no se acumulan en memoria.
+def process_images_parallel(image_ids, output_path, spatial_order):
+    total = 0
+    max_in_flight = 2 * (os.cpu_count() or 1)
+    with StreamingVectorWriter(output_path, driver=output_format, ordered=True, spatial_order=spatial_order) as writer:
+        with ProcessPoolExecutor(initializer=init_worker, initargs=(writer.queue, writer.failed)) as executor:
+            in_flight = deque()
+            for seq, image_id in enumerate(image_ids):
+                if len(in_flight) >= max_in_flight:
+                    total += in_flight.popleft().result()  # Solo el número de máscaras enviadas al escritor
+                in_flight.append(executor.submit(process_image, seq, image_id))
+            while in_flight:
+                total += in_flight.popleft().result()
+    print(f"Máscaras escritas: {writer.written} de {total}")
 
-# Obtener IDs de las imágenes
-image_ids = coco.getImgIds()
+# Obtener IDs de las imágenes que le corresponden a este shard (en orden, para una salida reproducible)
+image_ids = sorted(select_shard(coco.getImgIds(), shard))
 
-# Procesar las imágenes en paralelo y escribir secuencialmente
-process_images_parallel(image_ids)
+# Procesar las imágenes en paralelo y escribir en paralelo al cómputo (en una salida parcial del shard).
+# Cada parcial queda ordenada por id; con varios shards se escribe sin orden espacial para poder unirlas.
+shard_output = partial_path(output_file, shard)
+process_images_parallel(image_ids, shard_output, spatial_order=shard[1] == 1)
 
-print(f"GeoPackage generado en {output_file}")
+# Con un solo nodo la parcial ya es la salida final y solo se renombra; con N shards la unión en streaming
+# por id produce exactamente el mismo resultado
+if shard[1] == 1:
+    finalize([shard_output], output_file, output_format)
+    print(f"Salida {output_format} generada en {output_file}")
+else:
+    print(f"Shard {shard[0]}/{shard[1]} generado en {shard_output}. Unir con: python -m utils.Shard_Runner merge "
+          f"--shards {shard[1]} --output {output_file} --kind {output_format}")
@@ -5,10 +5,13 @@ from rasterio.transform import from_bounds
 from rasterio.features import shapes
 from shapely.geometry import shape, Polygon, Point
 import geopandas as gpd
+import pandas as pd
 from pycocotools.coco import COCO
 import re
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from utils.Geometry_PostProcessor import pixel_size, postprocess
+
 # Define la ruta de las imágenes y el archivo de anotaciones
 image_directory = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/images'
 annotation_file = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/result.json'
@@ -78,7 +81,6 @@ def process_image(image_id):
         for shape_data, value in shapes(mask, transform=transform):
             if value == 1:  # Considerar solo las áreas con valor 1 en la máscara
                 polygon = shape(shape_data)
-                centerpoint = polygon.centroid
                 
                 # Crear el ID único combinado
                 unique_id = f"uniqueID{image_id}_annotationID{ann['id']}"
@@ -90,7 +92,7 @@ def process_image(image_id):
                     "filename": img_info['file_name'],
                     "year": year,
                     "color": color,
-                    "centerpoint": centerpoint
+                    "pixel_size": pixel_size(transform)
                 }
                 
                 results.append((class_name, polygon, attributes))
@@ -99,15 +101,20 @@ def process_image(image_id):
 
 # Función para agregar las máscaras a GeoPackage secuencialmente
 def add_masks_to_geopackage(results):
-    for class_name, polygon, attributes in results:
-        # Convertir el polígono en un GeoDataFrame
-        gdf = gpd.GeoDataFrame([attributes], geometry=[polygon], crs="EPSG:4326")
-        
+    if not results:
+        return
+    class_names = [class_name for class_name, _, _ in results]
+    
+    # Simplificar, reducir precisión y calcular área/perímetro/centroide de todas las máscaras en bloque
+    gdf = gpd.GeoDataFrame(pd.DataFrame([attributes for _, _, attributes in results]),
+                           geometry=[polygon for _, polygon, _ in results], crs="EPSG:4326")
+    gdf["layer"] = [f"{class_name}_{unique_id}" for class_name, unique_id in zip(class_names, gdf["id"])]
+    gdf = postprocess(gdf, pixel=gdf.pop("pixel_size").to_numpy())
+    
+    for sublayer_name, layer_gdf in gdf.groupby("layer", sort=False):
         # Nombre único para cada subcapa basada en la clase y el ID, sin "mask"
-        sublayer_name = f"{class_name}_{attributes['id']}"
-        
         # Escribir en el GeoPackage de forma secuencial
-        gdf.to_file(output_file, layer=sublayer_name, driver="GPKG", mode='a')
+        layer_gdf.drop(columns="layer").to_file(output_file, layer=sublayer_name, driver="GPKG", mode='a')
 
 # Procesamiento paralelo de imágenes
 def process_images_parallel(image_ids):
@@ -12,6 +12,8 @@ import pandas as pd
 from openpyxl import Workbook
 from openpyxl.worksheet.datavalidation import DataValidation
 
+from utils.Geometry_PostProcessor import pixel_size, postprocess
+
 # Define la ruta de las imágenes y el archivo de anotaciones
 image_directory = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/images'
 annotation_file = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/result.json'
@@ -82,14 +84,10 @@ def process_image(image_id):
         for shape_data, value in shapes(mask, transform=transform):
             if value == 1:  # Considerar solo las áreas con valor 1 en la máscara
                 polygon = shape(shape_data)
-                centerpoint = polygon.centroid
                 
                 # Crear el ID único combinado
                 unique_id = f"uniqueID{image_id}_annotationID{ann['id']}"
                 
-                # Crear enlace a Google Maps
-                google_maps_link = f"https://www.google.com/maps/search/?api=1&query={centerpoint.y},{centerpoint.x}"
-                
                 # Definir los atributos para esta máscara
                 attributes = {
                     "id": unique_id,
@@ -97,8 +95,7 @@ def process_image(image_id):
                     "filename": img_info['file_name'],
                     "year": year,
                     "color": color,
-                    "centerpoint": centerpoint,
-                    "google_maps_link": google_maps_link,
+                    "pixel_size": pixel_size(transform),
                     "review": "Pendiente"  # Valor inicial para el combobox
                 }
                 
@@ -108,25 +105,28 @@ def process_image(image_id):
 
 # Función para agregar las máscaras a GeoPackage secuencialmente y exportar a Excel
 def add_masks_to_geopackage(results, excel_data):
-    for result in results:
-        for class_name, polygon, attributes in result:
-            # Convertir el polígono en un GeoDataFrame
-            gdf = gpd.GeoDataFrame([attributes], geometry=[polygon], crs="EPSG:4326")
-            
-            # Nombre único para cada subcapa basada en la clase y el ID
-            sublayer_name = f"{class_name}_{attributes['id']}"
-            
-            # Escribir en el GeoPackage de forma secuencial
-            gdf.to_file(output_file, layer=sublayer_name, driver="GPKG", mode='a')
-            
-            # Agregar los datos relevantes al Excel
-            excel_data.append([
-                attributes['id'],
-                attributes['filename'],
-                attributes['class'],
-                attributes['google_maps_link'],
-                attributes['review']
-            ])
+    results = [item for result in results for item in result]
+    if not results:
+        return
+    class_names = [class_name for class_name, _, _ in results]
+    
+    # Simplificar, reducir precisión y calcular área/perímetro/centroide de todas las máscaras en bloque
+    gdf = gpd.GeoDataFrame(pd.DataFrame([attributes for _, _, attributes in results]),
+                           geometry=[polygon for _, polygon, _ in results], crs="EPSG:4326")
+    gdf = postprocess(gdf, pixel=gdf.pop("pixel_size").to_numpy())
+    
+    # Crear enlace a Google Maps a partir del centroide calculado
+    gdf["google_maps_link"] = [f"https://www.google.com/maps/search/?api=1&query={lat},{lon}"
+                               for lat, lon in zip(gdf["centroid_lat"], gdf["centroid_lon"])]
+    gdf["layer"] = [f"{class_names[i]}_{unique_id}" for i, unique_id in zip(gdf.index, gdf["id"])]
+    
+    for sublayer_name, layer_gdf in gdf.groupby("layer", sort=False):
+        # Nombre único para cada subcapa basada en la clase y el ID
+        # Escribir en el GeoPackage de forma secuencial
+        layer_gdf.drop(columns="layer").to_file(output_file, layer=sublayer_name, driver="GPKG", mode='a')
+    
+    # Agregar los datos relevantes al Excel
+    excel_data.extend(gdf[["id", "filename", "class", "google_maps_link", "review"]].values.tolist())
 
 # Procesamiento paralelo de imágenes
 def process_images_parallel(image_ids):
@@ -0,0 +1,106 @@
+"""
+Exportador mínimo con el mismo flujo que generate_grouped_geopackage_coco.py (workers que envían lotes
+ordenados a un proceso escritor, salida parcial por shard y unión), sobre un COCO sintético.
+Lo ejecutan las pruebas de utils.Shard_Runner como proceso independiente: `python shard_exporter.py ... --shard i/N`.
+"""
+import os
+import sys
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import shapely
+
+from utils.Vector_StreamWriter import StreamingVectorWriter, encode_batch, init_worker, send_batch
+from utils.Shard_Runner import shard_argument_parser, select_shard, partial_path, finalize
+
+CSV_HEADER = ['image_id', 'annotation_id', 'class', 'bbox']
+
+
+def process_image(seq, image, annotations, categories):
+    # Algunas imágenes tardan más, así los lotes llegan desordenados al escritor
+    if seq % 3 == 0:
+        time.sleep(0.05)
+    lon_min, lat_min, lon_max, lat_max = image['bounds']
+    scale_x = (lon_max - lon_min) / image['width']
+    scale_y = (lat_max - lat_min) / image['height']
+    layers, polygons, rows = [], [], []
+    for ann in sorted(annotations, key=lambda ann: ann['id']):
+        xy = [(lon_min + x * scale_x, lat_max - y * scale_y)
+              for x, y in zip(ann['segmentation'][0][0::2], ann['segmentation'][0][1::2])]
+        class_name = categories[ann['category_id']]
+        layers.append(f"{class_name}_2018")
+        polygons.append(shapely.Polygon(xy))
+        rows.append({'id': f"uniqueID{image['id']}_annotationID{ann['id']}", 'class': class_name,
+                     'area_px': float(ann['area'])})
+    send_batch(encode_batch(layers, polygons, pd.DataFrame(rows, columns=['id', 'class', 'area_px']), seq=seq))
+    return [[str(image['id']), str(ann['id']), categories[ann['category_id']], str(ann['bbox'])]
+            for ann in annotations]
+
+
+def main():
+    parser = shard_argument_parser("Exportador sintético para las pruebas de shards")
+    parser.add_argument('--coco', required=True)
+    parser.add_argument('--output', required=True, help="Salida vectorial")
+    parser.add_argument('--csv', required=True, help="Salida CSV")
+    parser.add_argument('--crops', required=True, help="Directorio de recortes")
+    parser.add_argument('--format', default='GPKG')
+    parser.add_argument('--chunk-size', type=int, default=7)
+    args = parser.parse_args()
+    shard = args.shard
+
+    with open(args.coco) as f:
+        coco = json.load(f)
+    categories = {category['id']: category['name'] for category in coco['categories']}
+    images = {image['id']: image for image in coco['images']}
+    annotations = {image_id: [] for image_id in images}
+    for ann in coco['annotations']:
+        annotations[ann['image_id']].append(ann)
+    image_ids = sorted(select_shard(images, shard))
+
+    vector_output = partial_path(args.output, shard)
+    csv_rows = []
+    with StreamingVectorWriter(vector_output, driver=args.format, ordered=True, flush_size=args.chunk_size,
+                               spatial_order=shard[1] == 1) as writer:
+        with ProcessPoolExecutor(max_workers=3, initializer=init_worker,
+                                 initargs=(writer.queue, writer.failed)) as executor:
+            in_flight = deque()
+            for seq, image_id in enumerate(image_ids):
+                if len(in_flight) >= 4:
+                    csv_rows.extend(in_flight.popleft().result())
+                in_flight.append(executor.submit(process_image, seq, images[image_id], annotations[image_id],
+                                                 categories))
+            while in_flight:
+                csv_rows.extend(in_flight.popleft().result())
+
+    csv_output = partial_path(args.csv, shard)
+    with open(csv_output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(sorted(csv_rows))
+
+    crops_output = partial_path(args.crops, shard)
+    index = []
+    for image_id in image_ids:
+        for ann in annotations[image_id]:
+            relative = os.path.join(categories[ann['category_id']], f"{image_id}_{ann['id']}.txt")
+            os.makedirs(os.path.join(crops_output, os.path.dirname(relative)), exist_ok=True)
+            with open(os.path.join(crops_output, relative), 'w') as f:
+                f.write(str(ann['bbox']))
+            index.append({'path': relative, 'annotation_id': str(ann['id'])})
+    pd.DataFrame(sorted(index, key=lambda row: [row['path'], row['annotation_id']]),
+                 columns=['path', 'annotation_id']).to_csv(os.path.join(crops_output, 'crop_index.csv'), index=False)
+
+    if shard[1] == 1:
+        finalize([vector_output], args.output, args.format)
+        finalize([csv_output], args.csv, 'CSV')
+        finalize([crops_output], args.crops, 'DIR')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip('torch')
+pytest.importorskip('pycocotools')
+
+from utils.COCO_MaskCacheDataset import INDEX_FILENAME, CachedCocoDataset, build_cache
+
+
+def write_image(directory, name, value):
+    Image.fromarray(np.full((8, 6, 3), value, dtype=np.uint8)).save(directory / name)
+
+
+def write_coco(path, names):
+    images = [{'id': i + 1, 'file_name': name, 'height': 8, 'width': 6} for i, name in enumerate(names)]
+    annotations = [{'id': i + 1, 'image_id': i + 1, 'category_id': 1, 'iscrowd': 0, 'area': 4.0,
+                    'bbox': [1, 1, 2, 2], 'segmentation': [[1, 1, 3, 1, 3, 3, 1, 3]]} for i in range(len(names))]
+    with open(path, 'w') as f:
+        json.dump({'images': images, 'annotations': annotations, 'categories': [{'id': 1, 'name': 'relave'}]}, f)
+
+
+@pytest.fixture
+def dataset_files(tmp_path):
+    images = tmp_path / 'images'
+    images.mkdir()
+    write_image(images, 'a.png', 10)
+    write_image(images, 'b.png', 20)
+    write_coco(tmp_path / 'result.json', ['a.png', 'b.png'])
+    return images, tmp_path / 'result.json', tmp_path / 'cache'
+
+
+def index_mtime(cache_dir):
+    return os.stat(cache_dir / INDEX_FILENAME).st_mtime_ns
+
+
+def test_cache_is_reused_while_nothing_changes(dataset_files):
+    images, annotation_file, cache_dir = dataset_files
+    build_cache(str(images), str(annotation_file), str(cache_dir), max_workers=1)
+    built = index_mtime(cache_dir)
+
+    index = build_cache(str(images), str(annotation_file), str(cache_dir), max_workers=1)
+
+    assert index_mtime(cache_dir) == built
+    assert [entry['file_name'] for entry in index['entries']] == ['a.png', 'b.png']
+
+
+def test_cache_is_rebuilt_when_the_file_listing_changes(dataset_files):
+    images, annotation_file, cache_dir = dataset_files
+    build_cache(str(images), str(annotation_file), str(cache_dir), max_workers=1)
+
+    # Nueva imagen en result.json
+    write_image(images, 'c.png', 30)
+    write_coco(annotation_file, ['a.png', 'b.png', 'c.png'])
+    dataset = CachedCocoDataset(str(images), str(annotation_file), str(cache_dir), build_workers=1)
+    assert len(dataset) == 3
+    img, mask = dataset[2]
+    assert img.shape == (8, 6, 3) and (img == 30).all()
+    assert mask.sum() == 4
+
+    # Imagen reemplazada en disco con el mismo nombre (result.json no cambia)
+    write_image(images, 'a.png', 99)
+    os.utime(images / 'a.png', ns=(0, 0))
+    dataset = CachedCocoDataset(str(images), str(annotation_file), str(cache_dir), build_workers=1)
+    assert (dataset[0][0] == 99).all()
@@ -0,0 +1,62 @@
+import numpy as np
+import geopandas as gpd
+import shapely
+from rasterio.features import shapes
+from rasterio.transform import from_origin
+from shapely.geometry import shape
+
+from utils.Geometry_PostProcessor import ATTRIBUTE_COLUMNS, pixel_size, postprocess, simplify_geometries
+
+
+def staircase(pixel, run=1):
+    """
+    Triángulo rasterizado (20 escalones de `run` píxeles de ancho) vectorizado con píxeles de `pixel` metros,
+    cerca del meridiano central de la zona UTM.
+    """
+    mask = np.kron(np.tril(np.ones((20, 20), dtype=np.uint8)), np.ones((1, run), dtype=np.uint8))
+    transform = from_origin(500000, 7500000, pixel, pixel)
+    return next(shape(geom) for geom, value in shapes(mask, mask=mask.astype(bool), transform=transform) if value)
+
+
+def test_tolerance_and_precision_scale_with_pixel_size():
+    assert pixel_size(from_origin(0, 0, 10, 20)) == 10
+
+    for run in (1, 3):
+        small, large = staircase(1.0, run), staircase(10.0, run)
+        simplified_small = simplify_geometries(np.array([small], dtype=object), 1.0)[0]
+        simplified_large = simplify_geometries(np.array([large], dtype=object), 10.0)[0]
+
+        # La escalera desaparece: queda el triángulo
+        assert shapely.get_num_coordinates(simplified_large) == 5
+        # Misma forma a otra escala: mismo resultado escalado
+        assert shapely.get_num_coordinates(simplified_small) == 5
+        # El borde se mueve menos de un píxel (más la grilla de precisión)
+        assert shapely.hausdorff_distance(simplified_large, large) < 10 + 0.05 * 10
+    # Con medio píxel la escalera no se simplifica
+    half = simplify_geometries(np.array([large], dtype=object), 10.0, tolerance_px=0.5)[0]
+    assert shapely.get_num_coordinates(half) > 5
+    # Coordenadas sobre la grilla de 0.05 píxeles
+    coords = shapely.get_coordinates(simplified_large)
+    np.testing.assert_allclose(coords / 0.5, np.round(coords / 0.5))
+    assert simplified_large.is_valid
+
+
+def test_geometries_smaller_than_the_grid_are_dropped():
+    tiny = shapely.box(0, 0, 0.1, 0.1)
+    gdf = gpd.GeoDataFrame({'id': ['tiny', 'big']}, geometry=[tiny, staircase(10.0)], crs='EPSG:32719')
+
+    result = postprocess(gdf, pixel=10.0)
+
+    assert list(result['id']) == ['big']
+    assert set(ATTRIBUTE_COLUMNS) <= set(result.columns)
+    assert np.isclose(result['area_m2'].iloc[0], result.geometry.area.iloc[0], rtol=1e-3)
+
+
+def test_pixel_size_per_row():
+    gdf = gpd.GeoDataFrame({'id': ['fine', 'coarse']}, geometry=[staircase(10.0), staircase(10.0)],
+                           crs='EPSG:32719')
+
+    result = postprocess(gdf, pixel=np.array([1.0, 10.0]))
+
+    fine, coarse = result.geometry
+    assert shapely.get_num_coordinates(fine) > shapely.get_num_coordinates(coarse)
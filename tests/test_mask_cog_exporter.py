@@ -0,0 +1,38 @@
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from utils.Mask_COGExporter import write_mask_cog, write_mosaic_vrt
+
+
+def test_mosaic_vrt_of_masks_at_different_resolutions(tmp_path):
+    # A: 1 m, x 0..10, y 10..20, clase 1
+    write_mask_cog(np.ones((10, 10), dtype=np.uint8), str(tmp_path / 'a.tif'), from_origin(0, 20, 1, 1),
+                   crs='EPSG:32719')
+    # B: 2 m, x 6..16, y 4..14, clase 2, con 0 (nodata) justo donde se solapa con A
+    b = np.full((5, 5), 2, dtype=np.uint8)
+    b[:2, :2] = 0
+    write_mask_cog(b, str(tmp_path / 'b.tif'), from_origin(6, 14, 2, 2), crs='EPSG:32719')
+    # Otro CRS: se omite
+    write_mask_cog(np.full((4, 4), 3, dtype=np.uint8), str(tmp_path / 'c.tif'), from_origin(0, 20, 1, 1),
+                   crs='EPSG:32718')
+
+    vrt_path = write_mosaic_vrt([str(tmp_path / name) for name in ('a.tif', 'b.tif', 'c.tif')],
+                                str(tmp_path / 'mosaics' / 'mosaic.vrt'))
+
+    with rasterio.open(vrt_path) as src:
+        assert (src.width, src.height) == (16, 16)
+        assert src.res == (1.0, 1.0)
+        assert src.bounds == (0, 4, 16, 20)
+        assert src.crs.to_epsg() == 32719
+        data = src.read(1)
+    # El 0 de B no tapa a A en el solape
+    assert (data[6:10, 6:10] == 1).all()
+    assert (data[:10, :10] == 1).all()
+    assert (data[10:, 10:] == 2).all()
+    assert int(data.sum()) == 100 * 1 + (100 - 16) * 2
+    assert not (data == 3).any()
+
+
+def test_empty_mosaic_returns_none(tmp_path):
+    assert write_mosaic_vrt([], str(tmp_path / 'empty.vrt')) is None
@@ -0,0 +1,100 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import box
+
+from utils.Raster_BandRatioEngine import band_index, bounded_as_completed, compute_indices
+from utils.Sentinel_COGWriter import write_multiband_cog
+
+CRS = 'EPSG:32719'
+ORIGIN = (300000.0, 7500000.0)
+
+
+def write_band(path, value, resolution, size):
+    data = np.full((1, size, size), value, dtype='uint16')
+    with rasterio.open(path, 'w', driver='GTiff', width=size, height=size, count=1, dtype='uint16', crs=CRS,
+                       transform=from_origin(*ORIGIN, resolution, resolution)) as dst:
+        dst.write(data)
+    return str(path)
+
+
+@pytest.fixture
+def band_paths(tmp_path):
+    # B04/B08 a 10 m y B11 a 20 m sobre la misma extensión de 400 m
+    return {
+        'B04': write_band(tmp_path / 'B04.tif', 1000, 10, 40),
+        'B08': write_band(tmp_path / 'B08.tif', 3000, 10, 40),
+        'B11': write_band(tmp_path / 'B11.tif', 1500, 20, 20),
+    }
+
+
+def test_compute_indices_on_mixed_resolutions_in_a_polygon_window(band_paths, tmp_path):
+    x0, y0 = ORIGIN
+    polygon = box(x0 + 40, y0 - 200, x0 + 200, y0 - 40).__geo_interface__
+
+    result, meta = compute_indices(band_paths, ['NDVI', 'FMR'], geometries=[polygon], block_size=4, max_workers=2)
+
+    # La grilla común es la de B11 (20 m) y la ventana cubre solo el polígono
+    assert result.shape == (2, 8, 8)
+    assert meta['transform'].a == 20
+    assert meta['bounds'] == (x0 + 40, y0 - 200, x0 + 200, y0 - 40)
+    np.testing.assert_allclose(result[0], 0.5)
+    np.testing.assert_allclose(result[1], 0.5)
+
+    output_path = str(tmp_path / 'indices.tif')
+    on_disk, disk_meta = compute_indices(band_paths, ['NDVI', 'FMR'], geometries=[polygon], block_size=4,
+                                         max_workers=2, output_path=output_path)
+    assert on_disk is None
+    with rasterio.open(output_path) as src:
+        assert src.descriptions == ('NDVI', 'FMR')
+        assert src.transform == disk_meta['transform']
+        np.testing.assert_array_equal(src.read(), result)
+
+
+def test_polygon_outside_the_scene_raises_value_error(band_paths):
+    x0, y0 = ORIGIN
+    polygon = box(x0 + 1000, y0 - 100, x0 + 1100, y0).__geo_interface__
+    with pytest.raises(ValueError, match="no intersectan"):
+        compute_indices(band_paths, ['NDVI'], geometries=[polygon], max_workers=1)
+
+
+def test_missing_band_in_multiband_cog_raises(tmp_path):
+    path = str(tmp_path / 'scene.tif')
+    data = np.ones((3, 16, 16), dtype='uint16')
+    write_multiband_cog(data, path, from_origin(*ORIGIN, 10, 10), CRS, ('B02', 'B03', 'B04'))
+    with rasterio.open(path) as src:
+        assert band_index(src, 'B04') == 3
+        with pytest.raises(ValueError, match=r"B08.*scene\.tif"):
+            band_index(src, 'B08')
+    with pytest.raises(ValueError, match="B08"):
+        compute_indices({'B08': path, 'B04': path}, ['NDVI'], max_workers=1)
+
+
+def test_single_band_file_without_description_uses_band_1(band_paths):
+    with rasterio.open(band_paths['B04']) as src:
+        assert band_index(src, 'B04') == 1
+
+
+def test_bounded_as_completed_limits_tasks_in_flight():
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def work(i):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.01 * (i % 3))
+        with lock:
+            state['running'] -= 1
+        return i
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = bounded_as_completed(executor, work, ((i,) for i in range(40)), max_in_flight=3)
+        results = sorted(future.result() for future in futures)
+    assert results == list(range(40))
+    assert state['peak'] <= 3
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import box
+
+from utils.Raster_ZonalStatsBatch import Scene, zonal_statistics
+
+
+def write_band(path, value):
+    with rasterio.open(path, 'w', driver='GTiff', width=20, height=20, count=1, dtype='float32',
+                       crs='EPSG:32719', transform=from_origin(500000, 7500000, 10, 10)) as dst:
+        dst.write(np.full((1, 20, 20), value, dtype='float32'))
+
+
+def test_polygon_touching_scene_edge_is_reported_without_data(tmp_path):
+    write_band(tmp_path / 'b04.tif', 1.0)
+    write_band(tmp_path / 'b08.tif', 3.0)
+    scene = Scene('S2_TEST', '2020-01-01', {'B04': str(tmp_path / 'b04.tif'), 'B08': str(tmp_path / 'b08.tif')})
+    polygons = gpd.GeoDataFrame({'id': ['inside', 'edge']}, crs='EPSG:32719', geometry=[
+        box(500020, 7499900, 500080, 7499960),
+        # Comparte solo el borde derecho de la escena (x = 500200)
+        box(500200, 7499900, 500260, 7499960),
+    ])
+
+    rows = zonal_statistics(polygons, [scene], str(tmp_path / 'stats.parquet'), indices=['NDVI'], max_workers=1)
+
+    stats = pd.read_parquet(tmp_path / 'stats.parquet').set_index('polygon_id')
+    assert rows == 2
+    assert stats.loc['inside', 'pixel_count'] == 36
+    assert np.isclose(stats.loc['inside', 'mean'], 0.5)
+    assert stats.loc['edge', 'pixel_count'] == 0
+    assert np.isnan(stats.loc['edge', 'mean'])
+
+
+def test_failed_clusters_are_reported(tmp_path, caplog):
+    # COG multibanda sin B08: la lectura del grupo falla en el worker
+    with rasterio.open(tmp_path / 'scene.tif', 'w', driver='GTiff', width=20, height=20, count=2, dtype='float32',
+                       crs='EPSG:32719', transform=from_origin(500000, 7500000, 10, 10)) as dst:
+        dst.write(np.ones((2, 20, 20), dtype='float32'))
+        dst.descriptions = ('B02', 'B04')
+    path = str(tmp_path / 'scene.tif')
+    scene = Scene('S2_MULTI', '2020-01-01', {'B04': path, 'B08': path})
+    polygons = gpd.GeoDataFrame({'id': ['a']}, crs='EPSG:32719', geometry=[box(500020, 7499900, 500080, 7499960)])
+
+    with caplog.at_level('WARNING'):
+        rows = zonal_statistics(polygons, [scene], str(tmp_path / 'stats.parquet'), indices=['NDVI'], max_workers=1)
+
+    assert rows == 0
+    assert "1 de 1 lecturas agrupadas fallaron" in caplog.text
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('segment_anything')
+
+from utils.SAM_EmbeddingCache import SamEmbeddingCache
+
+
+class FakePredictor:
+    """
+    Lo mínimo de `SamPredictor` que usa el caché.
+    """
+
+    device = 'cpu'
+
+    def __init__(self, value=0.0):
+        self.features = torch.full((1, 4, 8, 8), value)
+        self.original_size = (64, 64)
+        self.input_size = (64, 64)
+        self.is_image_set = True
+
+    def reset_image(self):
+        self.is_image_set = False
+
+
+def test_entry_just_saved_survives_eviction(tmp_path):
+    cache = SamEmbeddingCache(str(tmp_path), max_bytes=1)
+    cache.save(FakePredictor(1.0), 'old', 'vit_b')
+    cache.save(FakePredictor(2.0), 'new', 'vit_b')
+
+    assert sorted(os.listdir(tmp_path)) == ['vit_b_new.npz']
+    predictor = FakePredictor()
+    assert cache.load(predictor, 'new', 'vit_b')
+    assert float(predictor.features.mean()) == 2.0
+
+
+def test_concurrent_saves_of_the_same_key(tmp_path):
+    cache = SamEmbeddingCache(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: cache.save(FakePredictor(3.0), 'key', 'vit_b'), range(32)))
+
+    assert os.listdir(tmp_path) == ['vit_b_key.npz']
+    predictor = FakePredictor()
+    assert cache.load(predictor, 'key', 'vit_b')
+    assert np.all(predictor.features.numpy() == 3.0)
@@ -0,0 +1,36 @@
+import pytest
+import shapely
+
+for module in ('cv2', 'torch', 'ultralytics', 'segment_anything'):
+    pytest.importorskip(module)
+
+from utils.Scene_SlidingWindowInference import SeamMerger
+
+
+def detection(x_min, x_max, class_id=0, score=0.5, last_row=10):
+    return {'geometry': shapely.box(x_min, 0, x_max, 10), 'class_id': class_id, 'class_name': str(class_id),
+            'score': score, 'sam_score': score, 'last_row': last_row, 'n_windows': 1}
+
+
+def test_detection_bridging_two_pending_parts_merges_them_all():
+    merger = SeamMerger()
+    # Dos mitades del mismo objeto vistas en ventanas que no se solapan entre sí
+    merger.add([detection(0, 10, score=0.6), detection(10, 20, score=0.4)])
+    assert len(merger.pending) == 2
+
+    merger.add([detection(2, 18, score=0.9, last_row=30), detection(2, 18, class_id=1)])
+    objects = merger.flush()
+
+    assert len(objects) == 2
+    merged = next(d for d in objects if d['class_id'] == 0)
+    assert merged['geometry'].equals(shapely.box(0, 0, 20, 10))
+    assert merged['n_windows'] == 3
+    assert merged['score'] == 0.9
+    assert merged['last_row'] == 30
+
+
+def test_detections_below_threshold_are_kept_apart():
+    merger = SeamMerger(iou_threshold=0.5, containment_threshold=0.8)
+    merger.add([detection(0, 10)])
+    merger.add([detection(9, 19)])
+    assert len(merger.flush()) == 2
@@ -0,0 +1,48 @@
+import numpy as np
+from pycocotools import mask as mask_utils
+
+from utils.Segmentation_Evaluator import IOU_THRESHOLDS, average_precision, evaluate_image
+
+HEIGHT, WIDTH = 20, 20
+
+
+def square_rle(x_min, y_min, x_max, y_max):
+    polygon = [x_min, y_min, x_max, y_min, x_max, y_max, x_min, y_max]
+    return mask_utils.merge(mask_utils.frPyObjects([polygon], HEIGHT, WIDTH))
+
+
+def test_perfect_match_duplicate_and_missed_ground_truth():
+    gt = {'classes': [1, 1], 'iscrowd': [0, 0], 'rles': [square_rle(0, 0, 8, 8), square_rle(12, 12, 19, 19)]}
+    pred = {'classes': [1, 1], 'scores': [0.8, 0.9],
+            # Detección duplicada del primer objeto (menor puntaje) y la detección exacta; el segundo GT queda sin par
+            'rles': [square_rle(0, 0, 8, 8), square_rle(0, 0, 8, 8)]}
+
+    result = evaluate_image(gt, pred)[1]
+
+    assert result['n_gt'] == 2
+    # Orden por puntaje: la de 0.9 acierta en todos los umbrales, la duplicada en ninguno
+    np.testing.assert_array_equal(result['scores'], [0.9, 0.8])
+    assert result['matches'][:, 0].all()
+    assert not result['matches'][:, 1].any()
+    assert not result['ignored'].any()
+    # IoU semántica: la unión de predicciones cubre solo el primer objeto
+    areas = mask_utils.area(gt['rles'])
+    assert result['intersection'] == areas[0]
+    assert result['union'] == areas.sum()
+
+    ap, precision, recall = average_precision(result['scores'], result['matches'][0], result['ignored'][0],
+                                              result['n_gt'])
+    # Precisión 1 hasta recall 0.5 (51 de los 101 puntos) y 0 después
+    assert np.isclose(ap, 51 / 101)
+    assert precision == 0.5
+    assert recall == 0.5
+
+
+def test_class_without_predictions_has_zero_ap():
+    gt = {'classes': [2], 'iscrowd': [0], 'rles': [square_rle(0, 0, 8, 8)]}
+    pred = {'classes': [], 'scores': [], 'rles': []}
+
+    result = evaluate_image(gt, pred, IOU_THRESHOLDS)[2]
+
+    assert result['matches'].shape == (len(IOU_THRESHOLDS), 0)
+    assert average_precision(result['scores'], result['matches'][0], result['ignored'][0], 1) == (0.0, 0.0, 0.0)
@@ -0,0 +1,24 @@
+import pytest
+
+from utils.Sentinel_COGWriter import SceneIndex, SceneItem
+
+
+def scene(scene_id, cloud_cover):
+    return SceneItem(id=scene_id, path=f"{scene_id}.tif", bbox=(-70.0, -23.0, -69.0, -22.0),
+                     start_date='2020-01-01', end_date='2020-02-01', bands=['B04'], width=10, height=10,
+                     crs='EPSG:4326', cloud_cover=cloud_cover)
+
+
+@pytest.mark.parametrize('filename', ['index.json', 'index.parquet'])
+def test_unknown_cloud_cover_is_excluded_by_max_cloud_cover(tmp_path, filename):
+    index = SceneIndex(str(tmp_path / filename))
+    index.add(scene('clear', 5.0))
+    index.add(scene('cloudy', 60.0))
+    index.add(scene('unknown', None))
+    index.add(scene('nan', float('nan')))
+    index.save()
+
+    reloaded = SceneIndex(str(tmp_path / filename))
+    assert [item.id for item in reloaded.query(max_cloud_cover=20)] == ['clear']
+    assert len(reloaded.query()) == 4
+    assert reloaded.items['unknown'].cloud_cover is None
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import rasterio
+from PIL import Image
+from pyproj import Transformer
+from rasterio.transform import from_origin
+
+from utils.Sentinel_GridTiler import compute_tile_grid, grid_offsets, tile_scene
+
+CRS = 'EPSG:32719'
+TRANSFORM = from_origin(300000.0, 7500000.0, 10, 10)
+
+
+def write_band(path, value):
+    data = np.full((1, 30, 30), value, dtype='uint16')
+    data[:, :10, :10] = 0
+    with rasterio.open(path, 'w', driver='GTiff', width=30, height=30, count=1, dtype='uint16', crs=CRS,
+                       transform=TRANSFORM) as dst:
+        dst.write(data)
+    return str(path)
+
+
+def test_grid_offsets_align_the_last_tile_with_the_edge():
+    assert list(grid_offsets(100, 40, 32)) == [0, 32, 60]
+    assert list(grid_offsets(64, 64, 51)) == [0]
+    assert list(grid_offsets(30, 64, 51)) == [0]
+
+
+def test_tile_names_are_wgs84_bounds_latitude_first():
+    grid = compute_tile_grid(TRANSFORM, CRS, 30, 30, size=10, stride=10)
+    assert len(grid['names']) == 9
+
+    # Tesela de la fila 10, columna 20: x 300200..300300, y 7499800..7499900
+    i = int(np.where((grid['rows'] == 10) & (grid['cols'] == 20))[0][0])
+    transformer = Transformer.from_crs(CRS, 'epsg:4326')
+    lat_min, lon_min = transformer.transform(300200.0, 7499800.0)
+    lat_max, lon_max = transformer.transform(300300.0, 7499900.0)
+    assert grid['names'][i] == f"{lat_min}_{lat_max}_{lon_min}_{lon_max}"
+    assert lat_min < lat_max < 0 and lon_min < lon_max < 0
+
+
+def test_tiles_keep_the_band_order_and_skip_nodata(tmp_path):
+    # Canales RGB = B08, B04, B03 como en el notebook
+    band_paths = [write_band(tmp_path / 'B08.tif', 6000), write_band(tmp_path / 'B04.tif', 3000),
+                  write_band(tmp_path / 'B03.tif', 1500)]
+    output_directory = tmp_path / 'tiles'
+
+    saved, skipped = tile_scene(band_paths, str(output_directory), size=10, stride=10, max_workers=1)
+
+    assert (saved, skipped) == (8, 1)
+    grid = compute_tile_grid(TRANSFORM, CRS, 30, 30, size=10, stride=10)
+    assert sorted(os.listdir(output_directory)) == sorted(f"{name}.png" for name in grid['names'][1:])
+    tile = np.asarray(Image.open(output_directory / f"{grid['names'][4]}.png"))
+    assert tile.shape == (10, 10, 3)
+    assert tuple(tile[0, 0]) == (255, 127, 63)
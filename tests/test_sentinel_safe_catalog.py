@@ -0,0 +1,56 @@
+import shutil
+
+from utils.Sentinel_SafeCatalog import SafeCatalog
+
+MTD = """<?xml version="1.0" encoding="UTF-8"?>
+<n1:Level-2A_User_Product xmlns:n1="https://psd-14.sentinel2.eo.esa.int/PSD/User_Product_Level-2A.xsd">
+  <General_Info><Product_Info>
+    <PRODUCT_START_TIME>{date}T14:37:21.024Z</PRODUCT_START_TIME>
+    <PROCESSING_LEVEL>Level-2A</PROCESSING_LEVEL>
+    <Datatake><SPACECRAFT_NAME>Sentinel-2A</SPACECRAFT_NAME></Datatake>
+    <Product_Organisation><Granule_List><Granule>
+      <IMAGE_FILE>GRANULE/L2A_T19KEU/IMG_DATA/R10m/T19KEU_B04_10m</IMAGE_FILE>
+    </Granule></Granule_List></Product_Organisation>
+  </Product_Info></General_Info>
+  <Geometric_Info><Product_Footprint><Product_Footprint><Global_Footprint>
+    <EXT_POS_LIST>-23.0 -70.0 -22.0 -70.0 -22.0 -69.0 -23.0 -69.0 -23.0 -70.0</EXT_POS_LIST>
+  </Global_Footprint></Product_Footprint></Product_Footprint></Geometric_Info>
+  <Quality_Indicators_Info><Cloud_Coverage_Assessment>10.0</Cloud_Coverage_Assessment></Quality_Indicators_Info>
+</n1:Level-2A_User_Product>
+"""
+
+
+def make_product(root, date):
+    name = f"S2A_MSIL2A_{date.replace('-', '')}T143721_N0213_R096_T19KEU_{date.replace('-', '')}T181240.SAFE"
+    safe_dir = root / name
+    safe_dir.mkdir(parents=True)
+    (safe_dir / 'MTD_MSIL2A.xml').write_text(MTD.format(date=date))
+    return safe_dir
+
+
+def count_rows(catalog):
+    products = catalog.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    rtree = catalog.conn.execute("SELECT COUNT(*) FROM products_rtree").fetchone()[0]
+    return products, rtree
+
+
+def test_rescan_removes_products_missing_from_the_tree(tmp_path):
+    root = tmp_path / 'safe'
+    kept = make_product(root, '2020-01-05')
+    removed = make_product(root / 'moved', '2020-02-09')
+    other_root = tmp_path / 'other'
+    make_product(other_root, '2020-03-10')
+
+    catalog = SafeCatalog(str(tmp_path / 'catalog.sqlite'))
+    assert catalog.scan(str(root), max_workers=1) == 2
+    assert catalog.scan(str(other_root), max_workers=1) == 1
+    assert count_rows(catalog) == (3, 3)
+
+    shutil.rmtree(removed)
+    assert catalog.scan(str(root), max_workers=1) == 0
+
+    assert count_rows(catalog) == (2, 2)
+    products = catalog.query((-69.5, -22.5, -69.4, -22.4))
+    assert [p['sensing_date'] for p in products] == ['2020-01-05', '2020-03-10']
+    assert str(kept) in [p['path'] for p in products]
+    catalog.close()
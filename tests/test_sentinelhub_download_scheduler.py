@@ -0,0 +1,128 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sentinelhub import DataCollection, SHConfig
+
+from utils.SentinelHub_DownloadScheduler import (PARTIAL_FILENAME, RESPONSE_FILENAME, SentinelHubDownloadScheduler,
+                                                 build_jobs)
+
+# Cabecera TIFF mínima: el servidor de prueba no genera imágenes reales
+FAKE_TIFF = b'II*\x00' + b'\x00' * 60
+
+
+class StandInServer:
+    """
+    Servidor HTTP local que imita el endpoint de token OAuth y la Process API de Sentinel Hub.
+    `failures[x_min]` es la lista de códigos con que responder antes de entregar la imagen de ese bbox.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.failures = {}
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                if status == 429:
+                    # Sentinel Hub indica la espera en milisegundos
+                    self.send_header('Retry-After', '50')
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path.endswith('/token'):
+                    token = {'access_token': 'token', 'token_type': 'Bearer', 'expires_in': 3600}
+                    return self._send(200, json.dumps(token).encode(), 'application/json')
+                x_min = json.loads(body)['input']['bounds']['bbox'][0]
+                stand_in.calls.append(x_min)
+                pending = stand_in.failures.get(x_min)
+                if pending:
+                    return self._send(pending.pop(0), b'{"error": {"message": "falla de prueba"}}', 'application/json')
+                return self._send(200, FAKE_TIFF, 'image/tiff')
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        # Cada servidor usa otro puerto: la colección se define con un nombre propio
+        self.data_collection = DataCollection.SENTINEL2_L2A.define_from(
+            name=f"s2_stand_in_{self.httpd.server_address[1]}", service_url=self.url)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # oauthlib exige https salvo que se permita explícitamente (el servidor de prueba es http local)
+    monkeypatch.setenv('OAUTHLIB_INSECURE_TRANSPORT', '1')
+    with StandInServer() as stand_in:
+        yield stand_in
+
+
+def make_scheduler(server, cache_dir, max_rounds=3):
+    config = SHConfig()
+    config.sh_client_id = 'id'
+    config.sh_client_secret = 'secret'
+    config.sh_base_url = server.url
+    config.sh_token_url = f"{server.url}/oauth/token"
+    # Sin reintentos ni esperas del cliente: los reintentos son las rondas del planificador
+    config.max_download_attempts = 1
+    config.download_sleep_time = 0
+    return SentinelHubDownloadScheduler(config, str(cache_dir), max_threads=2, max_rounds=max_rounds,
+                                        backoff_seconds=0, data_collection=server.data_collection)
+
+
+BBOXES = [(-70.0, -23.0, -69.99, -22.99), (-69.0, -23.0, -68.99, -22.99)]
+SLOTS = [('2020-01-01', '2020-02-01')]
+
+
+def test_duplicates_are_downloaded_once_and_reused_from_cache(server, tmp_path):
+    jobs = build_jobs(BBOXES, SLOTS)
+    results = list(make_scheduler(server, tmp_path).run(jobs + jobs))
+
+    assert len(results) == 2 and all(r.ok and not r.cached for r in results)
+    assert sorted(server.calls) == [-70.0, -69.0]
+    with open(results[0].path, 'rb') as f:
+        assert f.read() == FAKE_TIFF
+
+    again = list(make_scheduler(server, tmp_path).run(jobs))
+    assert all(r.ok and r.cached for r in again)
+    assert len(server.calls) == 2
+
+
+def test_rate_limit_and_server_errors_are_retried(server, tmp_path):
+    server.failures[-70.0] = [429, 503]
+    results = {r.job.bbox[0]: r for r in make_scheduler(server, tmp_path).run(build_jobs(BBOXES, SLOTS))}
+
+    assert results[-70.0].ok and results[-69.0].ok
+    assert server.calls.count(-70.0) == 3
+    assert server.calls.count(-69.0) == 1
+
+
+def test_failed_download_leaves_no_cache_entry(server, tmp_path):
+    server.failures[-70.0] = [500, 500]
+    scheduler = make_scheduler(server, tmp_path, max_rounds=2)
+    job = build_jobs(BBOXES[:1], SLOTS)[0]
+    # Resto de una descarga interrumpida en una ejecución anterior
+    (tmp_path / job.key).mkdir()
+    (tmp_path / job.key / PARTIAL_FILENAME).write_bytes(FAKE_TIFF[:10])
+
+    result, = scheduler.run([job])
+
+    assert not result.ok and result.error
+    assert scheduler.cached_path(job) is None
+    assert not (tmp_path / job.key / RESPONSE_FILENAME).exists()
@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+from utils.Vector_FormatBenchmark import benchmark, synthetic_annotations
+
+
+def test_caller_workdir_is_kept(tmp_path):
+    workdir = tmp_path / 'benchmark'
+    workdir.mkdir()
+    (workdir / 'notes.txt').write_text('del llamador')
+
+    result = benchmark(synthetic_annotations(200), chunk_size=64, workdir=str(workdir))
+
+    assert list(result['features']) == [200] * len(result)
+    assert (workdir / 'notes.txt').read_text() == 'del llamador'
+    assert (workdir / 'output.gpkg').exists()
+
+
+def test_temporary_workdir_is_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    benchmark(synthetic_annotations(50), chunk_size=16, drivers=['GPKG'])
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pytest
+import shapely
+
+from utils.Vector_StreamWriter import StreamingVectorWriter, encode_batch, init_worker, send_batch
+
+
+def _send_squares(seq):
+    x = np.arange(50, dtype=float) + seq
+    squares = shapely.box(x, 0, x + 0.5, 0.5)
+    attributes = pd.DataFrame({'id': [f"{seq}_{i}" for i in range(len(squares))]})
+    send_batch(encode_batch(['squares'] * len(squares), squares, attributes, seq=seq))
+    return len(squares)
+
+
+def _run(output_file, n_batches, **options):
+    with StreamingVectorWriter(output_file, **options) as writer:
+        with ProcessPoolExecutor(max_workers=2, initializer=init_worker,
+                                 initargs=(writer.queue, writer.failed)) as executor:
+            sent = sum(executor.map(_send_squares, range(n_batches)))
+    return sent, writer.written
+
+
+def test_ordered_writer_keeps_batch_order(tmp_path):
+    output_file = str(tmp_path / 'out.gpkg')
+    sent, written = _run(output_file, 20, ordered=True, flush_size=64)
+    assert sent == written == 1000
+    ids = gpd.read_file(output_file, layer='squares')['id']
+    assert list(ids) == [f"{seq}_{i}" for seq in range(20) for i in range(50)]
+
+
+def test_writer_failure_is_raised_instead_of_hanging(tmp_path):
+    # El escritor no puede crear el GeoPackage: su directorio es un archivo
+    blocker = tmp_path / 'blocker'
+    blocker.write_text('')
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match='proceso escritor'):
+        _run(str(blocker / 'out.gpkg'), 200, max_pending=1)
+    assert time.monotonic() - start < 60
+
+
+def test_geopackage_sink_creates_missing_directories(tmp_path):
+    output_file = str(tmp_path / 'nested' / 'shard' / 'out.gpkg')
+    sent, written = _run(output_file, 2)
+    assert sent == written == 100
+    assert len(gpd.read_file(output_file, layer='squares')) == 100
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+torch = pytest.importorskip('torch')
+
+from utils.ViT_TensorCache import CachedCropDataset, build_tensor_cache, parse_crop_bounds, split_of
+
+
+def test_split_is_stable_and_follows_the_ratio():
+    paths = [os.path.join('tranque', f"{i}.png") for i in range(2000)]
+    splits = [split_of(path, 0.2) for path in paths]
+
+    assert splits == [split_of(path, 0.2) for path in reversed(paths)][::-1]
+    assert 0.17 < splits.count('test') / len(paths) < 0.23
+    # Agregar recortes no cambia la partición de los existentes
+    more = paths + [os.path.join('relave', f"{i}.png") for i in range(500)]
+    assert [split_of(path, 0.2) for path in more[:2000]] == splits
+    assert {split_of(path, 0.0) for path in paths} == {'train'}
+    assert {split_of(path, 1.0) for path in paths} == {'test'}
+    assert [split_of(path, 0.2, seed=1) for path in paths] != splits
+
+
+def test_parse_crop_bounds_of_both_filename_formats():
+    # COCO_GeoImageCropExtractor: [lon_min,lat_min,lon_max,lat_max]_<clase>_<id>.png
+    assert parse_crop_bounds('tranque/[-70.12345,-23.50000,-70.10000,-23.40000]_tranque_17.png') == \
+        (-70.12345, -23.5, -70.1, -23.4)
+    # coco_to_geopng: <clase>_(top, left, bottom, right).png
+    assert parse_crop_bounds('relave_(-23.4, -70.12345, -23.5, -70.1).png') == (-70.12345, -23.5, -70.1, -23.4)
+    assert parse_crop_bounds('sin_coordenadas.png') is None
+    assert parse_crop_bounds('clase_(a, b, c, d).png') is None
+
+
+def write_crop(path, value, size=(12, 10)):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(np.full((size[1], size[0], 3), value, dtype=np.uint8)).save(path)
+
+
+def test_build_tensor_cache_round_trip(tmp_path):
+    crop_root = tmp_path / 'crops'
+    write_crop(crop_root / 'relave' / '[-70.2,-23.2,-70.1,-23.1]_relave_1.png', 255)
+    write_crop(crop_root / 'tranque' / 'tranque_(-23.1, -70.2, -23.2, -70.1).png', 0)
+    write_crop(crop_root / 'tranque' / 'b.png', 51)
+    cache_dir = tmp_path / 'cache'
+
+    # Con test_ratio 0 todo queda en entrenamiento
+    index = build_tensor_cache(str(crop_root), str(cache_dir), image_size=8, test_ratio=0.0, max_workers=1)
+
+    assert index['label2id'] == {'relave': 0, 'tranque': 1}
+    bounds = (-70.2, -23.2, -70.1, -23.1)
+    assert [entry['bounds'] for entry in index['entries']] == [bounds, None, bounds]
+    dataset = CachedCropDataset(str(cache_dir), 'train')
+    assert len(dataset) == 3 and len(CachedCropDataset(str(cache_dir), 'test')) == 0
+    items = [dataset[i] for i in range(3)]
+    assert [item['labels'] for item in items] == [0, 1, 1]
+    assert items[0]['pixel_values'].shape == (3, 8, 8)
+    # Normalización de ViT: (x / 255 - 0.5) / 0.5
+    np.testing.assert_allclose(items[0]['pixel_values'].numpy(), 1.0)
+    np.testing.assert_allclose(items[1]['pixel_values'].numpy(), 51 / 255 * 2 - 1, rtol=1e-6)
+    np.testing.assert_allclose(items[2]['pixel_values'].numpy(), -1.0)
+
+    # Reutilización mientras no cambien los archivos; reconstrucción al agregar un recorte
+    built = os.stat(cache_dir / 'index.json').st_mtime_ns
+    build_tensor_cache(str(crop_root), str(cache_dir), image_size=8, test_ratio=0.0, max_workers=1)
+    assert os.stat(cache_dir / 'index.json').st_mtime_ns == built
+    write_crop(crop_root / 'tranque' / 'c.png', 10)
+    index = build_tensor_cache(str(crop_root), str(cache_dir), image_size=8, test_ratio=0.0, max_workers=1)
+    assert index['total'] == 4
@@ -0,0 +1,24 @@
+import pytest
+
+from utils.YOLO_LabelGeoExporter import parse_tile_bounds
+
+# Nombre de ejemplo de `clean_filename` en YOLOv8SAM_GIS.ipynb
+ROBOFLOW_FILENAME = ('3b9c485d-22-288307913390632_-22-265160142211556_-68-88090586893881_-68-85607786197419'
+                     '_png.rf.28f47ff5afabf72e6cd9cafee69b9e92.jpg')
+
+
+def test_roboflow_filename_keeps_latitude_sign():
+    lon_min, lat_min, lon_max, lat_max = parse_tile_bounds(ROBOFLOW_FILENAME)
+    assert lat_min == pytest.approx(-22.288307913390632)
+    assert lat_max == pytest.approx(-22.265160142211556)
+    assert lon_min == pytest.approx(-68.88090586893881)
+    assert lon_max == pytest.approx(-68.85607786197419)
+
+
+def test_tiler_filename():
+    bounds = parse_tile_bounds('-22.288307913390632_-22.265160142211556_-68.88090586893881_-68.85607786197419.png')
+    assert bounds == pytest.approx((-68.88090586893881, -22.288307913390632, -68.85607786197419, -22.265160142211556))
+
+
+def test_unparseable_filename():
+    assert parse_tile_bounds('imagen_sin_coordenadas.png') is None
@@ -8,10 +8,15 @@ from PIL import Image
 from pycocotools.coco import COCO
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import time
+import shutil
 from collections import Counter
 import logging
 from typing import Tuple, List, Dict, Optional
 
+import pandas as pd
+
+from utils.Shard_Runner import Shard, shard_argument_parser, select_shard, partial_path, finalize
+
 # Configuración del logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -118,7 +123,8 @@ def process_single_image(coco: COCO, img_info: Dict, image_directory: str, outpu
     logger.info(f"Procesamiento completado para {img_filename}")
     return results, category_counts
 
-def extract_image_crops_parallel(coco: COCO, image_directory: str, output_directory: str, max_workers: Optional[int] = None) -> Tuple[List[str], Counter]:
+def extract_image_crops_parallel(coco: COCO, image_directory: str, output_directory: str, max_workers: Optional[int] = None,
+                                 shard: Shard = (0, 1)) -> Tuple[List[str], Counter]:
     """
     Procesa imágenes en paralelo, extrayendo recortes de objetos.
     
@@ -127,12 +133,13 @@ def extract_image_crops_parallel(coco: COCO, image_directory: str, output_direct
         image_directory (str): Directorio de las imágenes originales.
         output_directory (str): Directorio para guardar los recortes.
         max_workers (Optional[int]): Número máximo de workers para el procesamiento paralelo.
+        shard (Shard): Partición (i, N) de las imágenes a procesar; por defecto todas.
     
     Returns:
         Tuple[List[str], Counter]: Lista de todas las rutas de recortes y contador total de categorías.
     """
     os.makedirs(output_directory, exist_ok=True)
-    image_ids = coco.getImgIds()
+    image_ids = select_shard(coco.getImgIds(), shard)
     all_results = []
     total_category_counts = Counter()
     logger.info(f"Procesando {len(image_ids)} imágenes en paralelo...")
@@ -150,8 +157,33 @@ def extract_image_crops_parallel(coco: COCO, image_directory: str, output_direct
     logger.info(f"Procesamiento paralelo completado. Total de recortes: {len(all_results)}")
     return all_results, total_category_counts
 
-# Uso del script
+def write_crop_index(crop_paths: List[str], output_directory: str, index_path: str) -> int:
+    """
+    Escribe el índice de recortes (ruta relativa, categoría, anotación y límites del nombre) en un CSV,
+    ordenado por sus filas para que los índices de varios shards se puedan unir con `merge_csv`.
+    
+    Returns:
+        int: Número de recortes indexados.
+    """
+    rows = []
+    for crop_path in crop_paths:
+        stem = os.path.splitext(os.path.basename(crop_path))[0]
+        coords, rest = stem[1:].split(']_', 1)
+        category, annotation_id = rest.rsplit('_', 1)
+        rows.append({
+            'path': os.path.relpath(crop_path, output_directory),
+            'category': category,
+            'annotation_id': annotation_id,
+            'bounds': coords,
+        })
+    columns = ['path', 'category', 'annotation_id', 'bounds']
+    rows = sorted(rows, key=lambda row: [row[column] for column in columns])
+    pd.DataFrame(rows, columns=columns).to_csv(index_path, index=False)
+    return len(rows)
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.COCO_GeoImageCropExtractor [--shard i/N]`)
 if __name__ == "__main__":
+    shard = shard_argument_parser("Recortes georreferenciados de las anotaciones COCO").parse_args().shard
     start_time = time.time()
 
     # Configuración
@@ -162,8 +194,23 @@ if __name__ == "__main__":
     # Cargar el dataset COCO
     coco = COCO(coco_json_path)
 
+    # Cada shard escribe en su propio directorio parcial (se vacía al comenzar), así los shards pueden
+    # correr en máquinas distintas; el directorio final solo se reemplaza al unir
+    shard_directory = partial_path(output_directory, shard)
+    if os.path.exists(shard_directory):
+        shutil.rmtree(shard_directory)
+
     # Procesar imágenes y extraer recortes en paralelo
-    results, category_counts = extract_image_crops_parallel(coco, image_directory, output_directory, max_workers=20)
+    results, category_counts = extract_image_crops_parallel(coco, image_directory, shard_directory, max_workers=20,
+                                                            shard=shard)
+
+    # Índice de recortes del shard (rutas relativas, válidas también en el directorio final)
+    write_crop_index(results, shard_directory, os.path.join(shard_directory, 'crop_index.csv'))
+    if shard[1] == 1:
+        finalize([shard_directory], output_directory, 'DIR')
+    else:
+        logger.info(f"Unir los shards con: python -m utils.Shard_Runner merge --shards {shard[1]} "
+                    f"--output {output_directory} --kind DIR --csv-files crop_index.csv")
 
     # Calcular el tiempo de ejecución
     end_time = time.time()
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from pycocotools.coco import COCO
+from torch.utils.data import Dataset
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'index.json'
+IMAGES_FILENAME = 'images.u8'
+MASKS_FILENAME = 'masks.u8'
+CACHE_VERSION = 2
+
+
+def file_sha1(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Hash SHA-1 del contenido de un archivo.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def images_signature(image_directory: str, file_names: List[str]) -> str:
+    """
+    Firma del listado de imágenes referenciadas (nombre, tamaño y fecha de modificación de cada archivo),
+    sin leer su contenido: cambia si se agrega, quita o reemplaza alguna imagen.
+    """
+    digest = hashlib.sha1()
+    for file_name in sorted(file_names):
+        path = os.path.join(image_directory, file_name)
+        try:
+            stat = os.stat(path)
+            digest.update(f"{file_name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+        except FileNotFoundError:
+            digest.update(f"{file_name}\0-\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_mask(coco: COCO, img_info: Dict, mask_mode: str, category_to_label: Dict[int, int]) -> np.ndarray:
+    """
+    Construye la máscara de una imagen.
+
+    Args:
+        coco (COCO): Objeto COCO cargado.
+        img_info (Dict): Información de la imagen.
+        mask_mode (str): 'sum' suma `annToMask` como el CocoDataset original; 'class' pinta cada
+            anotación con la etiqueta de su categoría (0 = fondo).
+        category_to_label (Dict[int, int]): Mapeo category_id -> etiqueta para el modo 'class'.
+
+    Returns:
+        np.ndarray: Máscara uint8 de alto × ancho.
+    """
+    mask = np.zeros((img_info['height'], img_info['width']), dtype=np.uint8)
+    anns = coco.loadAnns(coco.getAnnIds(imgIds=img_info['id'], iscrowd=None))
+    for ann in anns:
+        if mask_mode == 'sum':
+            mask += coco.annToMask(ann)
+        else:
+            mask[coco.annToMask(ann) > 0] = category_to_label[ann['category_id']]
+    return mask
+
+
+def _fill_entry(cache_dir: str, annotation_file: str, image_directory: str, entry: Dict,
+                totals: Tuple[int, int], mask_mode: str, category_to_label: Dict[int, int]) -> int:
+    """
+    Decodifica una imagen y su máscara y las escribe en su posición de los arreglos memory-mapped.
+    """
+    coco = _get_coco(annotation_file)
+    img_info = coco.loadImgs(entry['id'])[0]
+    img = np.array(Image.open(os.path.join(image_directory, img_info['file_name'])).convert('RGB'))
+    if img.shape[:2] != (entry['height'], entry['width']):
+        raise ValueError(f"Tamaño inesperado para {img_info['file_name']}: {img.shape[:2]}")
+    mask = build_mask(coco, img_info, mask_mode, category_to_label)
+
+    images = np.memmap(os.path.join(cache_dir, IMAGES_FILENAME), dtype=np.uint8, mode='r+', shape=(totals[0],))
+    masks = np.memmap(os.path.join(cache_dir, MASKS_FILENAME), dtype=np.uint8, mode='r+', shape=(totals[1],))
+    images[entry['image_offset']:entry['image_offset'] + img.size] = img.ravel()
+    masks[entry['mask_offset']:entry['mask_offset'] + mask.size] = mask.ravel()
+    images.flush()
+    masks.flush()
+    return entry['id']
+
+
+_coco_per_process: Dict[str, COCO] = {}
+
+
+def _get_coco(annotation_file: str) -> COCO:
+    # Un solo índice COCO por proceso de construcción
+    if annotation_file not in _coco_per_process:
+        _coco_per_process[annotation_file] = COCO(annotation_file)
+    return _coco_per_process[annotation_file]
+
+
+def build_cache(image_directory: str, annotation_file: str, cache_dir: str, mask_mode: str = 'sum',
+                max_workers: Optional[int] = None, force: bool = False) -> Dict:
+    """
+    Materializa imágenes RGB y máscaras en arreglos memory-mapped con un índice JSON.
+
+    El caché se reconstruye solo si cambia el contenido de result.json, el listado de imágenes
+    referenciadas (ver `images_signature`) o el modo de máscara.
+
+    Args:
+        image_directory (str): Directorio de las imágenes.
+        annotation_file (str): Ruta a result.json (COCO).
+        cache_dir (str): Directorio del caché.
+        mask_mode (str): 'sum' o 'class' (ver `build_mask`).
+        max_workers (Optional[int]): Número de procesos para la construcción.
+        force (bool): Reconstruir aunque el caché esté vigente.
+
+    Returns:
+        Dict: Índice del caché.
+    """
+    if mask_mode not in ('sum', 'class'):
+        raise ValueError(f"Modo de máscara desconocido: {mask_mode}")
+
+    annotation_sha1 = file_sha1(annotation_file)
+    index_path = os.path.join(cache_dir, INDEX_FILENAME)
+    if not force and os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+        if (index.get('version') == CACHE_VERSION and index.get('annotation_sha1') == annotation_sha1
+                and index.get('mask_mode') == mask_mode
+                and index.get('images_signature') == images_signature(
+                    image_directory, [entry['file_name'] for entry in index['entries']])):
+            logger.info(f"Caché vigente en {cache_dir} ({len(index['entries'])} imágenes)")
+            return index
+        logger.info("result.json o las imágenes cambiaron: reconstruyendo el caché")
+
+    coco = COCO(annotation_file)
+    categories = sorted(coco.getCatIds())
+    category_to_label = {cat_id: i + 1 for i, cat_id in enumerate(categories)}
+
+    entries = []
+    image_offset = mask_offset = 0
+    for img_id in sorted(coco.imgs.keys()):
+        img_info = coco.imgs[img_id]
+        height, width = img_info['height'], img_info['width']
+        entries.append({
+            'id': img_id,
+            'file_name': img_info['file_name'],
+            'height': height,
+            'width': width,
+            'image_offset': image_offset,
+            'mask_offset': mask_offset,
+        })
+        image_offset += height * width * 3
+        mask_offset += height * width
+    totals = (max(image_offset, 1), max(mask_offset, 1))
+
+    # Construir en un directorio temporal y reemplazar al final: nunca queda un caché a medias
+    tmp_dir = cache_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.memmap(os.path.join(tmp_dir, IMAGES_FILENAME), dtype=np.uint8, mode='w+', shape=(totals[0],)).flush()
+    np.memmap(os.path.join(tmp_dir, MASKS_FILENAME), dtype=np.uint8, mode='w+', shape=(totals[1],)).flush()
+
+    logger.info(f"Construyendo caché de {len(entries)} imágenes en {cache_dir}...")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_fill_entry, tmp_dir, annotation_file, image_directory, entry,
+                                   totals, mask_mode, category_to_label) for entry in entries]
+        for future in as_completed(futures):
+            future.result()
+
+    index = {
+        'version': CACHE_VERSION,
+        'annotation_sha1': annotation_sha1,
+        'mask_mode': mask_mode,
+        'images_signature': images_signature(image_directory, [entry['file_name'] for entry in entries]),
+        'categories': {str(cat_id): coco.cats[cat_id]['name'] for cat_id in categories},
+        'category_to_label': {str(k): v for k, v in category_to_label.items()},
+        'totals': list(totals),
+        'entries': entries,
+    }
+    with open(os.path.join(tmp_dir, INDEX_FILENAME), 'w') as f:
+        json.dump(index, f)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    return index
+
+
+class CachedCocoDataset(Dataset):
+    """
+    Variante de CocoDataset que lee imágenes y máscaras desde el caché memory-mapped.
+
+    Los workers del DataLoader no cargan el índice COCO ni decodifican PNG/TIFF: abren los mismos
+    archivos en modo solo lectura, por lo que comparten las páginas del sistema operativo sin copias.
+    """
+
+    def __init__(self, root: str, annFile: str, cache_dir: str, transform: Optional[Callable] = None,
+                 mask_mode: str = 'sum', build_workers: Optional[int] = None):
+        self.root = root
+        self.transform = transform
+        self.cache_dir = cache_dir
+        self.index = build_cache(root, annFile, cache_dir, mask_mode=mask_mode, max_workers=build_workers)
+        self.entries: List[Dict] = self.index['entries']
+        self.ids = [entry['id'] for entry in self.entries]
+        self._images = None
+        self._masks = None
+
+    def _open(self) -> None:
+        # Apertura diferida: cada worker abre su propio memmap tras el fork (no se serializan arreglos)
+        totals = self.index['totals']
+        self._images = np.memmap(os.path.join(self.cache_dir, IMAGES_FILENAME), dtype=np.uint8, mode='r',
+                                 shape=(totals[0],))
+        self._masks = np.memmap(os.path.join(self.cache_dir, MASKS_FILENAME), dtype=np.uint8, mode='r',
+                                shape=(totals[1],))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        state['_masks'] = None
+        return state
+
+    def __getitem__(self, index: int):
+        if self._images is None:
+            self._open()
+        entry = self.entries[index]
+        height, width = entry['height'], entry['width']
+        img = self._images[entry['image_offset']:entry['image_offset'] + height * width * 3].reshape(height, width, 3)
+        mask = self._masks[entry['mask_offset']:entry['mask_offset'] + height * width].reshape(height, width)
+
+        if self.transform:
+            # Las transformaciones reciben copias escribibles; el caché nunca se modifica
+            augmented = self.transform(image=np.array(img), mask=np.array(mask))
+            return augmented['image'], augmented['mask']
+        return np.array(img), np.array(mask)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.COCO_MaskCacheDataset`)
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración
+    PATH = "/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/images"
+    annotation_file = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/result.json'
+    cache_dir = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/mask_cache'
+
+    dataset = CachedCocoDataset(root=PATH, annFile=annotation_file, cache_dir=cache_dir)
+    img, mask = dataset[0]
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Imágenes en caché: {len(dataset)}; ejemplo: {img.shape}, {mask.shape}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
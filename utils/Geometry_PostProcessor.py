@@ -0,0 +1,139 @@
+import time
+import logging
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import rasterio
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ATTRIBUTE_COLUMNS = ['area_m2', 'perimeter_m', 'centroid_lon', 'centroid_lat']
+
+
+def pixel_size(transform: rasterio.Affine) -> float:
+    """
+    Tamaño de píxel (el menor de los dos ejes) en unidades del CRS del raster.
+    """
+    return float(min(abs(transform.a), abs(transform.e)))
+
+
+def simplify_geometries(geometries: np.ndarray, pixel: float, tolerance_px: float = 1.0,
+                        precision_px: float = 0.05) -> np.ndarray:
+    """
+    Simplifica todo un arreglo de geometrías de una vez y reduce la precisión de sus coordenadas.
+
+    Los polígonos de `rasterio.features.shapes` siguen los bordes de los píxeles (un vértice por escalón).
+    Las esquinas de una escalera quedan a menos de un píxel de la recta que la aproxima (1/√2 en diagonal,
+    casi 1 en pendientes suaves; con medio píxel no se elimina ninguna), así que la tolerancia por defecto
+    de un píxel quita la escalera sin mover el borde más de lo que ya es incierto.
+    La simplificación preserva la topología y la reducción de precisión devuelve geometrías válidas.
+
+    Args:
+        geometries (np.ndarray): Geometrías shapely.
+        pixel (float): Tamaño de píxel en unidades del CRS.
+        tolerance_px (float): Tolerancia de simplificación en píxeles.
+        precision_px (float): Tamaño de la grilla de coordenadas en píxeles (0 para no reducir).
+
+    Returns:
+        np.ndarray: Geometrías procesadas (None donde la geometría quedó vacía).
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    simplified = shapely.simplify(geometries, tolerance_px * pixel, preserve_topology=True)
+    if precision_px > 0:
+        simplified = shapely.set_precision(simplified, precision_px * pixel)
+    simplified[shapely.is_empty(simplified) | shapely.is_missing(simplified)] = None
+    return simplified
+
+
+def utm_epsg(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """
+    Código EPSG de la zona UTM WGS84 de cada punto.
+    """
+    zone = np.clip(np.floor((np.asarray(lon) + 180.0) / 6.0).astype(int) + 1, 1, 60)
+    return np.where(np.asarray(lat) < 0, 32700, 32600) + zone
+
+
+def geometry_attributes(geometries: gpd.GeoSeries) -> pd.DataFrame:
+    """
+    Área (m²), perímetro (m) y centroide (lon/lat) de todas las geometrías, medidos en la zona UTM
+    de cada una. Las geometrías se agrupan por zona y cada grupo se reproyecta en bloque.
+
+    Returns:
+        pd.DataFrame: Columnas `ATTRIBUTE_COLUMNS`, alineadas con el índice de `geometries`.
+    """
+    attributes = pd.DataFrame(np.nan, index=geometries.index, columns=ATTRIBUTE_COLUMNS)
+    valid = ~(geometries.isna() | geometries.is_empty)
+    if not valid.any():
+        return attributes
+
+    wgs84 = geometries[valid].to_crs("EPSG:4326")
+    # Zona según el centro de la caja envolvente (barato y suficiente para objetos de unos km)
+    bounds = wgs84.bounds
+    zones = utm_epsg((bounds['minx'] + bounds['maxx']) / 2, (bounds['miny'] + bounds['maxy']) / 2)
+
+    for epsg in np.unique(zones):
+        in_zone = zones == epsg
+        projected = wgs84[in_zone].to_crs(epsg=int(epsg))
+        centroids = projected.centroid.to_crs("EPSG:4326")
+        index = projected.index
+        attributes.loc[index, 'area_m2'] = projected.area.to_numpy()
+        attributes.loc[index, 'perimeter_m'] = projected.length.to_numpy()
+        attributes.loc[index, 'centroid_lon'] = centroids.x.to_numpy()
+        attributes.loc[index, 'centroid_lat'] = centroids.y.to_numpy()
+    return attributes
+
+
+def postprocess(gdf: gpd.GeoDataFrame, pixel: Optional[Union[float, np.ndarray]] = None,
+                tolerance_px: float = 1.0, precision_px: float = 0.05) -> gpd.GeoDataFrame:
+    """
+    Etapa de post-proceso previa a cualquier escritura vectorial: simplificación y precisión (si se
+    conoce el tamaño de píxel) y atributos geométricos en bloque. Las geometrías que quedan vacías se descartan.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Geometrías y atributos.
+        pixel (Optional[Union[float, np.ndarray]]): Tamaño de píxel en unidades del CRS, uno o por fila;
+            None omite la simplificación.
+        tolerance_px (float): Tolerancia de simplificación en píxeles.
+        precision_px (float): Grilla de coordenadas en píxeles.
+
+    Returns:
+        gpd.GeoDataFrame: Copia con geometrías procesadas y las columnas `ATTRIBUTE_COLUMNS`.
+    """
+    gdf = gdf.copy()
+    if pixel is not None and len(gdf):
+        pixel = np.broadcast_to(np.asarray(pixel, dtype=np.float64), (len(gdf),))
+        simplified = np.empty(len(gdf), dtype=object)
+        # set_precision admite una sola grilla por llamada: se agrupa por tamaño de píxel
+        for value in np.unique(pixel):
+            rows = pixel == value
+            simplified[rows] = simplify_geometries(gdf.geometry.to_numpy()[rows], value, tolerance_px, precision_px)
+        gdf = gdf.set_geometry(gpd.GeoSeries(simplified, index=gdf.index, crs=gdf.crs))
+        gdf = gdf[~gdf.geometry.isna()]
+    gdf[ATTRIBUTE_COLUMNS] = geometry_attributes(gdf.geometry)
+    return gdf
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Geometry_PostProcessor`)
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración
+    input_file = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/labeledMasks_grouped.gpkg'
+    layer = 'tranque_2018'
+    output_file = 'labeledMasks_grouped_simplified.gpkg'
+    # Píxel de Sentinel-2 (10 m) en grados, aproximado
+    sentinel_pixel_deg = 10 / 111320
+
+    gdf = gpd.read_file(input_file, layer=layer)
+    n_vertices = shapely.get_num_coordinates(gdf.geometry.to_numpy()).sum()
+    processed = postprocess(gdf, pixel=sentinel_pixel_deg)
+    processed.to_file(output_file, layer=layer, driver="GPKG")
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Vértices: {n_vertices} -> {shapely.get_num_coordinates(processed.geometry.to_numpy()).sum()}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
@@ -0,0 +1,141 @@
+import os
+import time
+import logging
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import rasterio
+
+from utils.Sentinel_COGWriter import write_multiband_cog
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Opciones para máscaras categóricas: sin predictor y overviews por moda (no promediar clases)
+MASK_COG_OPTIONS = {
+    'COMPRESS': 'DEFLATE',
+    'LEVEL': '9',
+    'BLOCKSIZE': '256',
+    'OVERVIEWS': 'AUTO',
+    'OVERVIEW_RESAMPLING': 'MODE',
+    'BIGTIFF': 'IF_SAFER',
+}
+
+
+def write_mask_cog(mask: np.ndarray, output_path: str, transform: rasterio.Affine, crs: str = 'EPSG:4326',
+                   cog_options: Optional[Dict] = None) -> None:
+    """
+    Escribe una máscara (alto, ancho) uint8 como COG teselado, comprimido y con overviews internas.
+    """
+    write_multiband_cog(mask[np.newaxis].astype(np.uint8), output_path, transform, crs, ['mask'],
+                        nodata=0, cog_options=cog_options or MASK_COG_OPTIONS)
+
+
+def write_mosaic_vrt(paths: List[str], output_path: str, resolution: Optional[float] = None) -> Optional[str]:
+    """
+    Escribe un VRT que referencia todas las máscaras (mismo CRS) sin copiar píxeles.
+
+    El VRT usa la resolución más fina de las fuentes (o `resolution`) y el 0 de cada máscara como
+    nodata, de modo que las máscaras solapadas no se borran entre sí. Como cada fuente es un COG con
+    overviews, GDAL lee solo las teselas y el nivel de zoom necesarios.
+
+    Returns:
+        Optional[str]: Ruta del VRT, o None si no hay máscaras.
+    """
+    if not paths:
+        return None
+    sources = []
+    crs = None
+    for path in paths:
+        with rasterio.open(path) as src:
+            if crs is None:
+                crs = src.crs
+            elif src.crs != crs:
+                logger.warning(f"{path} tiene un CRS distinto ({src.crs}); se omite del VRT")
+                continue
+            block_height, block_width = src.block_shapes[0]
+            sources.append((path, src.bounds, src.width, src.height, abs(src.res[0]), abs(src.res[1]),
+                            block_width, block_height))
+    if not sources:
+        return None
+
+    res_x = resolution or min(s[4] for s in sources)
+    res_y = resolution or min(s[5] for s in sources)
+    left = min(s[1].left for s in sources)
+    top = max(s[1].top for s in sources)
+    right = max(s[1].right for s in sources)
+    bottom = min(s[1].bottom for s in sources)
+    width = int(np.ceil((right - left) / res_x))
+    height = int(np.ceil((top - bottom) / res_y))
+
+    dataset = ET.Element('VRTDataset', rasterXSize=str(width), rasterYSize=str(height))
+    ET.SubElement(dataset, 'SRS').text = crs.to_wkt()
+    ET.SubElement(dataset, 'GeoTransform').text = f"{left!r}, {res_x!r}, 0.0, {top!r}, 0.0, {-res_y!r}"
+    band = ET.SubElement(dataset, 'VRTRasterBand', dataType='Byte', band='1')
+    ET.SubElement(band, 'NoDataValue').text = '0'
+    ET.SubElement(band, 'ColorInterp').text = 'Gray'
+
+    vrt_directory = os.path.dirname(os.path.abspath(output_path))
+    for path, bounds, src_width, src_height, _, _, block_width, block_height in sources:
+        source = ET.SubElement(band, 'ComplexSource', resampling='nearest')
+        filename = ET.SubElement(source, 'SourceFilename', relativeToVRT='1')
+        filename.text = os.path.relpath(os.path.abspath(path), vrt_directory)
+        ET.SubElement(source, 'SourceBand').text = '1'
+        ET.SubElement(source, 'SourceProperties', RasterXSize=str(src_width), RasterYSize=str(src_height),
+                      DataType='Byte', BlockXSize=str(block_width), BlockYSize=str(block_height))
+        ET.SubElement(source, 'SrcRect', xOff='0', yOff='0', xSize=str(src_width), ySize=str(src_height))
+        ET.SubElement(source, 'DstRect',
+                      xOff=f"{(bounds.left - left) / res_x:.6f}", yOff=f"{(top - bounds.top) / res_y:.6f}",
+                      xSize=f"{(bounds.right - bounds.left) / res_x:.6f}",
+                      ySize=f"{(bounds.top - bounds.bottom) / res_y:.6f}")
+        ET.SubElement(source, 'NODATA').text = '0'
+
+    os.makedirs(vrt_directory, exist_ok=True)
+    ET.ElementTree(dataset).write(output_path, encoding='utf-8')
+    return output_path
+
+
+def build_mosaics(exported: Iterable[Tuple[str, str, str]], output_directory: str) -> Dict[Tuple[str, str], str]:
+    """
+    Agrupa las máscaras exportadas por año y clase y escribe un VRT por grupo (`{clase}_{año}.vrt`).
+
+    Args:
+        exported (Iterable[Tuple[str, str, str]]): Tuplas (año, clase, ruta del COG).
+        output_directory (str): Directorio de los VRT.
+
+    Returns:
+        Dict[Tuple[str, str], str]: (año, clase) -> ruta del VRT.
+    """
+    groups = defaultdict(list)
+    for year, class_name, path in exported:
+        groups[(year, class_name)].append(path)
+
+    mosaics = {}
+    for (year, class_name), paths in sorted(groups.items()):
+        vrt_path = write_mosaic_vrt(sorted(paths), os.path.join(output_directory, f"{class_name}_{year}.vrt"))
+        if vrt_path:
+            mosaics[(year, class_name)] = vrt_path
+            logger.info(f"Mosaico {vrt_path}: {len(paths)} máscaras")
+    return mosaics
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Mask_COGExporter`)
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración: regenerar los VRT de una carpeta de máscaras ya exportadas ({id}_{clase}_mask_{año}.tif)
+    masks_directory = '/media/noobird/2002f002-8812-46a4-953d-1872302534b1/project-2-at-2024-06-17-17-54-839d4e00/export_geotiffs_new'
+
+    exported = []
+    for filename in os.listdir(masks_directory):
+        parts = os.path.splitext(filename)[0].split('_')
+        if filename.endswith('.tif') and len(parts) >= 4 and parts[-2] == 'mask':
+            exported.append((parts[-1], '_'.join(parts[1:-2]), os.path.join(masks_directory, filename)))
+    mosaics = build_mosaics(exported, masks_directory)
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"VRT generados: {len(mosaics)}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
@@ -0,0 +1,346 @@
+import os
+import time
+import logging
+import itertools
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.errors import WindowError
+from rasterio.features import geometry_mask
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import transform_geom
+from rasterio.windows import Window, bounds as window_bounds, from_bounds as window_from_bounds
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def _ratio(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Evitar divisiones por cero: los píxeles con denominador 0 quedan como NaN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b != 0, a / b, np.nan).astype('float32')
+
+
+def _normalized_difference(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return _ratio(a - b, a + b)
+
+
+# Índices disponibles: nombre -> (bandas requeridas, función sobre los arreglos float32 de esas bandas)
+INDICES: Dict[str, Tuple[Tuple[str, ...], Callable[..., np.ndarray]]] = {
+    # Ferrous Minerals Ratio tal como en Minera_LasCenizas_1deposito.ipynb (SWIR / NIR)
+    'FMR': (('B11', 'B08'), _ratio),
+    # Óxidos férricos (SWIR1 / NIR angosto)
+    'FERRIC_OXIDE': (('B11', 'B8A'), _ratio),
+    # Hierro férrico (rojo / azul)
+    'FERRIC_IRON': (('B04', 'B02'), _ratio),
+    # Minerales de arcilla (SWIR1 / SWIR2)
+    'CLAY': (('B11', 'B12'), _ratio),
+    'NDVI': (('B08', 'B04'), _normalized_difference),
+}
+
+
+class TargetGrid:
+    """
+    Grilla común (CRS, transformación y tamaño) sobre la que se remuestrean todas las bandas.
+    """
+
+    def __init__(self, crs, transform: rasterio.Affine, width: int, height: int):
+        self.crs = crs
+        self.transform = transform
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_band(cls, path: str) -> 'TargetGrid':
+        with rasterio.open(path) as src:
+            return cls(src.crs, src.transform, src.width, src.height)
+
+
+def polygon_window(grid: TargetGrid, geometries: Sequence[Dict]) -> Window:
+    """
+    Calcula la ventana (en la grilla común) que cubre los polígonos, recortada a la extensión del raster.
+
+    Args:
+        grid (TargetGrid): Grilla común.
+        geometries (Sequence[Dict]): Geometrías GeoJSON en el CRS de la grilla.
+
+    Returns:
+        Window: Ventana en píxeles de la grilla común.
+
+    Raises:
+        ValueError: Si los polígonos quedan fuera de la extensión del raster.
+    """
+    xs, ys = [], []
+    for geom in geometries:
+        coords = np.array(_flatten_coordinates(geom['coordinates']))
+        xs.extend([coords[:, 0].min(), coords[:, 0].max()])
+        ys.extend([coords[:, 1].min(), coords[:, 1].max()])
+    window = window_from_bounds(min(xs), min(ys), max(xs), max(ys), transform=grid.transform)
+    window = window.round_offsets(op='floor').round_lengths(op='ceil')
+    try:
+        return window.intersection(Window(0, 0, grid.width, grid.height))
+    except WindowError:
+        raise ValueError("Los polígonos no intersectan la extensión del raster") from None
+
+
+def _flatten_coordinates(coords) -> List[Tuple[float, float]]:
+    if isinstance(coords[0], (int, float)):
+        return [tuple(coords[:2])]
+    points = []
+    for c in coords:
+        points.extend(_flatten_coordinates(c))
+    return points
+
+
+def iter_blocks(window: Window, block_size: int) -> List[Window]:
+    """
+    Divide una ventana en bloques de a lo más block_size × block_size píxeles.
+    """
+    blocks = []
+    col_off, row_off = int(window.col_off), int(window.row_off)
+    width, height = int(window.width), int(window.height)
+    for row in range(row_off, row_off + height, block_size):
+        for col in range(col_off, col_off + width, block_size):
+            blocks.append(Window(col, row,
+                                 min(block_size, col_off + width - col),
+                                 min(block_size, row_off + height - row)))
+    return blocks
+
+
+def band_index(src, band: str) -> int:
+    """
+    Índice (base 1) de una banda: por su descripción en COGs multibanda, o 1 en JP2 de una sola banda.
+
+    Raises:
+        ValueError: Si un archivo multibanda no tiene ninguna banda con esa descripción.
+    """
+    descriptions = list(src.descriptions or ())
+    if band in descriptions:
+        return descriptions.index(band) + 1
+    if src.count == 1:
+        return 1
+    raise ValueError(f"La banda {band} no está en {src.name} (bandas: {descriptions})")
+
+
+def open_band_vrt(path: str, grid: TargetGrid, resampling: Resampling) -> WarpedVRT:
+    """
+    Abre una banda como WarpedVRT alineado a la grilla común (el remuestreo ocurre al leer).
+    """
+    src = rasterio.open(path)
+    return WarpedVRT(src, crs=grid.crs, transform=grid.transform, width=grid.width, height=grid.height,
+                     resampling=resampling, src_nodata=0, nodata=0)
+
+
+# Estado por proceso: VRTs abiertos una sola vez por worker
+_worker_state: Dict = {}
+
+
+def _init_worker(band_paths: Dict[str, str], grid: TargetGrid, resampling: Resampling,
+                 geometries: Optional[List[Dict]], indices: Sequence[str]) -> None:
+    _worker_state.clear()
+    _worker_state['vrts'] = {}
+    for band, path in band_paths.items():
+        vrt = open_band_vrt(path, grid, resampling)
+        _worker_state['vrts'][band] = (vrt, band_index(vrt.src_dataset, band))
+    _worker_state['grid'] = grid
+    _worker_state['geometries'] = geometries
+    _worker_state['indices'] = list(indices)
+
+
+def _process_block(block: Window) -> Tuple[Window, np.ndarray]:
+    """
+    Lee solo el bloque de cada banda (remuestreado a la grilla común) y evalúa los índices.
+    """
+    vrts = _worker_state['vrts']
+    grid = _worker_state['grid']
+    indices = _worker_state['indices']
+
+    bands = {band: vrt.read(index, window=block).astype('float32') for band, (vrt, index) in vrts.items()}
+    outputs = np.empty((len(indices), int(block.height), int(block.width)), dtype='float32')
+    for i, name in enumerate(indices):
+        required, func = INDICES[name]
+        outputs[i] = func(*[bands[band] for band in required])
+
+    if _worker_state['geometries']:
+        outside = geometry_mask(_worker_state['geometries'], out_shape=outputs.shape[1:],
+                                transform=rasterio.windows.transform(block, grid.transform))
+        outputs[:, outside] = np.nan
+    return block, outputs
+
+
+def bounded_as_completed(executor: Executor, fn: Callable, tasks: Iterable[Tuple],
+                         max_in_flight: int) -> Iterator[Future]:
+    """
+    Envía `fn(*task)` por cada tarea manteniendo como máximo `max_in_flight` en curso y entrega cada
+    future apenas termina. A diferencia de enviar todo y recorrer `as_completed`, no conserva los
+    futures terminados: el resultado de cada bloque se libera cuando quien consume termina de escribirlo,
+    así la memoria depende del tamaño de bloque y no del tamaño de la escena.
+    """
+    tasks = iter(tasks)
+    pending = {executor.submit(fn, *task) for task in itertools.islice(tasks, max_in_flight)}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for task in itertools.islice(tasks, len(done)):
+            pending.add(executor.submit(fn, *task))
+        while done:
+            yield done.pop()
+
+
+def compute_indices(
+    band_paths: Dict[str, str],
+    indices: Sequence[str] = ('FMR',),
+    geometries: Optional[Sequence[Dict]] = None,
+    geometries_crs=None,
+    reference_band: Optional[str] = None,
+    block_size: int = 512,
+    max_workers: Optional[int] = None,
+    resampling: Resampling = Resampling.bilinear,
+    output_path: Optional[str] = None,
+) -> Tuple[Optional[np.ndarray], Dict]:
+    """
+    Calcula índices espectrales bloque a bloque, leyendo solo la ventana del polígono.
+
+    Args:
+        band_paths (Dict[str, str]): Banda -> ruta (JP2 o GeoTIFF), con resoluciones posiblemente distintas.
+        indices (Sequence[str]): Nombres de índices de `INDICES`.
+        geometries (Optional[Sequence[Dict]]): Polígonos GeoJSON; si es None se procesa el raster completo.
+        geometries_crs: CRS de las geometrías (por defecto el de la grilla común).
+        reference_band (Optional[str]): Banda que define la grilla común; por defecto la de menor resolución.
+        block_size (int): Tamaño de bloque en píxeles; acota la memoria por worker.
+        max_workers (Optional[int]): Número de procesos.
+        resampling (Resampling): Método de remuestreo al llevar las bandas a la grilla común.
+        output_path (Optional[str]): Si se indica, los bloques se escriben directamente a este GeoTIFF
+            y no se acumulan en memoria.
+
+    Returns:
+        Tuple[Optional[np.ndarray], Dict]: Arreglo (índices, alto, ancho) del recorte (None si se escribió
+            a disco) y metadatos con la transformación, CRS y nombres de los índices.
+    """
+    unknown = [name for name in indices if name not in INDICES]
+    if unknown:
+        raise ValueError(f"Índices desconocidos: {unknown}")
+    required = sorted({band for name in indices for band in INDICES[name][0]})
+    missing = [band for band in required if band not in band_paths]
+    if missing:
+        raise ValueError(f"Faltan rutas para las bandas: {missing}")
+    band_paths = {band: band_paths[band] for band in required}
+    # Validar las bandas antes de lanzar los workers (un error en su inicialización rompe el pool)
+    for band, path in band_paths.items():
+        with rasterio.open(path) as src:
+            band_index(src, band)
+
+    if reference_band is None:
+        # La banda de menor resolución define la grilla (como remuestrear NIR de 10 m a 20 m)
+        reference_band = max(required, key=lambda band: abs(TargetGrid.from_band(band_paths[band]).transform.a))
+    grid = TargetGrid.from_band(band_paths[reference_band])
+
+    geometries = list(geometries) if geometries else None
+    if geometries:
+        geometries_crs = CRS.from_user_input(geometries_crs) if geometries_crs else grid.crs
+        if geometries_crs != grid.crs:
+            geometries = [transform_geom(geometries_crs, grid.crs, geom) for geom in geometries]
+        window = polygon_window(grid, geometries)
+    else:
+        window = Window(0, 0, grid.width, grid.height)
+
+    out_transform = rasterio.windows.transform(window, grid.transform)
+    out_height, out_width = int(window.height), int(window.width)
+    meta = {
+        'driver': 'GTiff',
+        'dtype': 'float32',
+        'nodata': np.nan,
+        'width': out_width,
+        'height': out_height,
+        'count': len(indices),
+        'crs': grid.crs,
+        'transform': out_transform,
+    }
+
+    blocks = iter_blocks(window, block_size)
+    logger.info(f"Procesando {len(blocks)} bloques de {block_size}px en una ventana de {out_width}x{out_height}")
+
+    result = None
+    dst = None
+    if output_path:
+        dst = rasterio.open(output_path, 'w', tiled=True, blockxsize=256, blockysize=256,
+                            compress='DEFLATE', predictor=3, **meta)
+        dst.descriptions = tuple(indices)
+    else:
+        result = np.full((len(indices), out_height, out_width), np.nan, dtype='float32')
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(band_paths, grid, resampling, geometries, list(indices))) as executor:
+            max_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+            for future in bounded_as_completed(executor, _process_block, ((block,) for block in blocks),
+                                               max_in_flight):
+                block, outputs = future.result()
+                local = Window(block.col_off - window.col_off, block.row_off - window.row_off,
+                               block.width, block.height)
+                if dst is not None:
+                    dst.write(outputs, window=local)
+                else:
+                    r0, c0 = int(local.row_off), int(local.col_off)
+                    result[:, r0:r0 + int(local.height), c0:c0 + int(local.width)] = outputs
+    finally:
+        if dst is not None:
+            dst.close()
+
+    meta['indices'] = list(indices)
+    meta['bounds'] = window_bounds(window, grid.transform)
+    return result, meta
+
+
+def find_band_paths(granule_img_data: str, bands: Sequence[str]) -> Dict[str, str]:
+    """
+    Busca en IMG_DATA (R10m/R20m/R60m) el JP2 de mejor resolución disponible para cada banda.
+
+    Args:
+        granule_img_data (str): Ruta a la carpeta IMG_DATA de un gránulo L2A.
+        bands (Sequence[str]): Bandas buscadas.
+
+    Returns:
+        Dict[str, str]: Banda -> ruta del JP2.
+    """
+    paths = {}
+    for resolution in ('R10m', 'R20m', 'R60m'):
+        folder = os.path.join(granule_img_data, resolution)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            for band in bands:
+                if band not in paths and f"_{band}_" in filename and filename.endswith('.jp2'):
+                    paths[band] = os.path.join(folder, filename)
+    return paths
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Raster_BandRatioEngine`)
+if __name__ == "__main__":
+    import geopandas as gpd
+
+    start_time = time.time()
+
+    # Configuración
+    img_data = "/media/manuel/BE8A98BF8A98759D/Minera_LasCenizas/2024/07/S2B_MSIL2A_20240706T143749_N0510_R096_T19HBE_20240706T183738.SAFE/GRANULE/L2A_T19HBE_A038303_20240706T144712/IMG_DATA"
+    polygon_file = 'minera_lascenizas.geojson'
+    indices = ['FMR', 'FERRIC_OXIDE', 'CLAY', 'NDVI']
+
+    required = sorted({band for name in indices for band in INDICES[name][0]})
+    band_paths = find_band_paths(img_data, required)
+    poligono = gpd.read_file(polygon_file)
+
+    result, meta = compute_indices(
+        band_paths, indices,
+        geometries=[geom.__geo_interface__ for geom in poligono.geometry],
+        geometries_crs=poligono.crs.to_wkt(),
+    )
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    for i, name in enumerate(meta['indices']):
+        logger.info(f"{name}: media={np.nanmean(result[i]):.4f}, píxeles válidos={np.count_nonzero(~np.isnan(result[i]))}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
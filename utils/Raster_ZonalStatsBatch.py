@@ -0,0 +1,323 @@
+import os
+import time
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.features import rasterize
+from rasterio.windows import Window, union as windows_union
+from shapely.geometry import box
+from shapely.strtree import STRtree
+
+from utils.Raster_BandRatioEngine import (INDICES, TargetGrid, band_index, bounded_as_completed, open_band_vrt,
+                                          polygon_window)
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+SCHEMA = pa.schema(
+    [('polygon_id', pa.string()), ('scene_id', pa.string()), ('date', pa.string()), ('index', pa.string()),
+     ('pixel_count', pa.int64()), ('valid_count', pa.int64()),
+     ('mean', pa.float64()), ('std', pa.float64()), ('min', pa.float64())]
+    + [(f'p{q}', pa.float64()) for q in PERCENTILES]
+    + [('max', pa.float64())]
+)
+
+
+@dataclass
+class Scene:
+    """
+    Una escena Sentinel-2: identificador, fecha y ruta de cada banda (JP2 sueltos o un COG multibanda).
+    """
+    scene_id: str
+    date: str
+    band_paths: Dict[str, str]
+
+
+def scenes_from_index(index) -> List[Scene]:
+    """
+    Convierte las entradas de un `SceneIndex` (COGs multibanda) en escenas.
+    """
+    return [Scene(item.id, (item.datetime or item.start_date)[:10], {band: item.path for band in item.bands})
+            for item in index.items.values()]
+
+
+def label_statistics(labels: np.ndarray, values: np.ndarray, n_labels: int,
+                     percentiles: Sequence[int] = PERCENTILES) -> Dict[str, np.ndarray]:
+    """
+    Estadísticas por etiqueta de forma vectorizada (sin recorrer polígonos en Python).
+
+    Args:
+        labels (np.ndarray): Imagen de etiquetas (0 = fondo, 1..n_labels = polígonos).
+        values (np.ndarray): Valores del índice (NaN = no válido).
+        n_labels (int): Número de etiquetas.
+        percentiles (Sequence[int]): Percentiles a calcular.
+
+    Returns:
+        Dict[str, np.ndarray]: Arreglos de largo n_labels por estadística.
+    """
+    labels = labels.ravel()
+    values = values.ravel()
+    pixel_count = np.bincount(labels, minlength=n_labels + 1)[1:]
+
+    valid = (labels > 0) & ~np.isnan(values)
+    lab = labels[valid]
+    val = values[valid].astype('float64')
+    count = np.bincount(lab, minlength=n_labels + 1)[1:]
+    total = np.bincount(lab, weights=val, minlength=n_labels + 1)[1:]
+    total_sq = np.bincount(lab, weights=val * val, minlength=n_labels + 1)[1:]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+        std = np.sqrt(np.maximum(np.where(count > 0, total_sq / count, np.nan) - mean * mean, 0))
+
+    # Ordenar por (etiqueta, valor) una sola vez; cada etiqueta queda en un tramo contiguo
+    order = np.lexsort((val, lab))
+    sorted_val = val[order]
+    starts = np.cumsum(count) - count
+    has = count > 0
+    last = np.where(has, starts + count - 1, 0)
+
+    def pick(positions: np.ndarray) -> np.ndarray:
+        out = np.full(n_labels, np.nan)
+        if sorted_val.size:
+            out[has] = sorted_val[positions[has]]
+        return out
+
+    stats = {
+        'pixel_count': pixel_count,
+        'valid_count': count,
+        'mean': mean,
+        'std': std,
+        'min': pick(starts),
+    }
+    for q in percentiles:
+        position = starts + (count - 1).clip(min=0) * (q / 100.0)
+        lo = np.floor(position).astype(np.int64)
+        hi = np.ceil(position).astype(np.int64)
+        frac = position - lo
+        stats[f'p{q}'] = pick(lo) * (1 - frac) + pick(hi) * frac
+    stats['max'] = pick(last)
+    return stats
+
+
+def _non_overlapping_layers(geometries: List) -> List[List[int]]:
+    """
+    Reparte los polígonos en capas sin solapes, para rasterizarlos como imagen de etiquetas.
+    """
+    layers: List[List[int]] = []
+    for i, geom in enumerate(geometries):
+        for layer in layers:
+            if not any(geom.intersects(geometries[j]) and not geom.touches(geometries[j]) for j in layer):
+                layer.append(i)
+                break
+        else:
+            layers.append([i])
+    return layers
+
+
+# Estado por proceso: VRTs de la última escena abierta
+_worker_cache: Dict = {}
+
+
+def _scene_vrts(scene: Scene, bands: Sequence[str], grid: TargetGrid, resampling: Resampling) -> Dict:
+    if _worker_cache.get('scene_id') != scene.scene_id:
+        for vrt, _ in _worker_cache.get('vrts', {}).values():
+            vrt.src_dataset.close()
+            vrt.close()
+        vrts = {}
+        for band in bands:
+            vrt = open_band_vrt(scene.band_paths[band], grid, resampling)
+            vrts[band] = (vrt, band_index(vrt.src_dataset, band))
+        _worker_cache.update(scene_id=scene.scene_id, vrts=vrts)
+    return _worker_cache['vrts']
+
+
+def _process_cluster(scene: Scene, grid: TargetGrid, window: Window, polygon_ids: List[str],
+                     geometries: List[Dict], layers: List[List[int]], indices: Sequence[str],
+                     resampling: Resampling) -> pd.DataFrame:
+    """
+    Lee una sola vez la ventana de un grupo de polígonos y calcula las estadísticas de todos ellos.
+    """
+    bands = sorted({band for name in indices for band in INDICES[name][0]})
+    vrts = _scene_vrts(scene, bands, grid, resampling)
+    data = {band: vrt.read(index, window=window).astype('float32') for band, (vrt, index) in vrts.items()}
+    values = {name: INDICES[name][1](*[data[band] for band in INDICES[name][0]]) for name in indices}
+
+    transform = rasterio.windows.transform(window, grid.transform)
+    shape = (int(window.height), int(window.width))
+    frames = []
+    for layer in layers:
+        labels = rasterize(((geometries[i], k + 1) for k, i in enumerate(layer)), out_shape=shape,
+                           transform=transform, fill=0, dtype='int32')
+        for name in indices:
+            stats = label_statistics(labels, values[name], len(layer))
+            frame = pd.DataFrame(stats)
+            frame.insert(0, 'index', name)
+            frame.insert(0, 'date', scene.date)
+            frame.insert(0, 'scene_id', scene.scene_id)
+            frame.insert(0, 'polygon_id', [polygon_ids[i] for i in layer])
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def no_data_frame(scene: Scene, polygon_ids: List[str], indices: Sequence[str]) -> pd.DataFrame:
+    """
+    Filas sin datos (0 píxeles, estadísticas NaN) para polígonos que no cubren ningún píxel de la escena.
+    """
+    frame = pd.DataFrame(
+        [(polygon_id, scene.scene_id, scene.date, name) for name in indices for polygon_id in polygon_ids],
+        columns=['polygon_id', 'scene_id', 'date', 'index'])
+    frame['pixel_count'] = 0
+    frame['valid_count'] = 0
+    for column in SCHEMA.names[6:]:
+        frame[column] = np.nan
+    return frame
+
+
+def plan_tasks(polygons: gpd.GeoDataFrame, scenes: Sequence[Scene], indices: Sequence[str],
+               id_column: str, chunk_size: int) -> Tuple[List[Tuple], List[Tuple[Scene, List[str]]]]:
+    """
+    Agrupa los polígonos por huella de escena y, dentro de cada escena, por bloques de chunk_size píxeles.
+    Cada tarea resultante lee una sola ventana por banda para todos sus polígonos.
+
+    Returns:
+        Tuple[List[Tuple], List[Tuple[Scene, List[str]]]]: Tareas y, por escena, los polígonos que
+            intersectan la huella sin cubrir píxeles (p. ej. solo tocan el borde), que quedan sin datos.
+    """
+    bands = sorted({band for name in indices for band in INDICES[name][0]})
+    reprojected: Dict = {}
+    tasks = []
+    no_data = []
+    for scene in scenes:
+        reference_band = max(bands, key=lambda band: abs(TargetGrid.from_band(scene.band_paths[band]).transform.a))
+        grid = TargetGrid.from_band(scene.band_paths[reference_band])
+
+        crs_key = grid.crs.to_string()
+        if crs_key not in reprojected:
+            layer = polygons.to_crs(grid.crs)
+            reprojected[crs_key] = (layer, STRtree(list(layer.geometry)))
+        layer, tree = reprojected[crs_key]
+
+        left, top = grid.transform * (0, 0)
+        right, bottom = grid.transform * (grid.width, grid.height)
+        hits = tree.query(box(min(left, right), min(top, bottom), max(left, right), max(top, bottom)),
+                          predicate='intersects')
+        if len(hits) == 0:
+            continue
+
+        clusters = defaultdict(list)
+        outside = []
+        for i in sorted(hits):
+            geom = layer.geometry.iloc[i].__geo_interface__
+            try:
+                window = polygon_window(grid, [geom])
+            except ValueError:
+                # El árbol también devuelve polígonos que solo tocan el borde de la huella
+                outside.append(str(layer[id_column].iloc[i]))
+                continue
+            clusters[(int(window.row_off) // chunk_size, int(window.col_off) // chunk_size)].append((i, window))
+        if outside:
+            no_data.append((scene, outside))
+
+        for members in clusters.values():
+            window = windows_union(*[w for _, w in members])
+            ids = [i for i, _ in members]
+            shapes = [layer.geometry.iloc[i] for i in ids]
+            tasks.append((scene, grid, window,
+                          [str(layer[id_column].iloc[i]) for i in ids],
+                          [geom.__geo_interface__ for geom in shapes],
+                          _non_overlapping_layers(shapes)))
+    return tasks, no_data
+
+
+def zonal_statistics(
+    polygons: gpd.GeoDataFrame,
+    scenes: Sequence[Scene],
+    output_path: str,
+    indices: Sequence[str] = ('FMR',),
+    id_column: str = 'id',
+    chunk_size: int = 2048,
+    max_workers: Optional[int] = None,
+    resampling: Resampling = Resampling.bilinear,
+) -> int:
+    """
+    Calcula estadísticas zonales de muchos polígonos sobre muchas escenas y las guarda en Parquet (formato largo).
+
+    Args:
+        polygons (gpd.GeoDataFrame): Capa de polígonos (depósitos) con una columna identificadora.
+        scenes (Sequence[Scene]): Escenas a procesar.
+        output_path (str): Ruta del Parquet de salida.
+        indices (Sequence[str]): Índices de `INDICES` a evaluar.
+        id_column (str): Columna con el identificador del polígono.
+        chunk_size (int): Tamaño (en píxeles) de los bloques usados para agrupar polígonos cercanos.
+        max_workers (Optional[int]): Número de procesos.
+        resampling (Resampling): Método de remuestreo a la grilla común.
+
+    Returns:
+        int: Número de filas escritas. Las lecturas agrupadas que fallan se registran y se omiten;
+            al final se advierte cuántas fallaron (sus polígonos quedan sin filas para esa escena).
+    """
+    tasks, no_data = plan_tasks(polygons, scenes, indices, id_column, chunk_size)
+    logger.info(f"{len(polygons)} polígonos, {len(scenes)} escenas -> {len(tasks)} lecturas agrupadas")
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    rows = 0
+    failed = 0
+    with pq.ParquetWriter(output_path, SCHEMA) as writer:
+        for scene, polygon_ids in no_data:
+            logger.info(f"{len(polygon_ids)} polígonos solo tocan el borde de {scene.scene_id}: sin datos")
+            frame = no_data_frame(scene, polygon_ids, indices)
+            writer.write_table(pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False))
+            rows += len(frame)
+        # Las tareas van ordenadas por escena, así cada worker reutiliza los VRTs abiertos; solo unas pocas
+        # están en curso a la vez y cada resultado se libera apenas se escribe
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            max_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+            for future in bounded_as_completed(executor, _process_cluster,
+                                               ((*task, list(indices), resampling) for task in tasks), max_in_flight):
+                try:
+                    frame = future.result()
+                except Exception as e:
+                    logger.error(f"Error en el cálculo zonal: {str(e)}")
+                    failed += 1
+                    continue
+                writer.write_table(pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False))
+                rows += len(frame)
+    if failed:
+        logger.warning(f"{failed} de {len(tasks)} lecturas agrupadas fallaron: a {output_path} le faltan "
+                       f"las filas de sus polígonos")
+    return rows
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Raster_ZonalStatsBatch`)
+if __name__ == "__main__":
+    from utils.Sentinel_COGWriter import SceneIndex
+
+    start_time = time.time()
+
+    # Configuración
+    polygon_file = 'depositos_cdr_atlas.gpkg'
+    index_path = './sentinel_cogs/index.parquet'
+    output_path = './zonal_stats.parquet'
+
+    polygons = gpd.read_file(polygon_file)
+    scenes = scenes_from_index(SceneIndex(index_path))
+    rows = zonal_statistics(polygons, scenes, output_path,
+                            indices=['FMR', 'FERRIC_OXIDE', 'CLAY', 'NDVI'], id_column='id')
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Filas escritas: {rows}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
@@ -0,0 +1,174 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+from segment_anything import SamPredictor
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def image_hash(image: np.ndarray) -> str:
+    """
+    Hash del contenido de una imagen (incluye forma y tipo para evitar colisiones triviales).
+    """
+    digest = hashlib.sha1()
+    digest.update(str((image.shape, image.dtype.str)).encode('utf-8'))
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+class SamEmbeddingCache:
+    """
+    Caché en disco de los embeddings de imagen de `SamPredictor`, acotado en tamaño con desalojo LRU.
+
+    La clave es (hash del contenido de la imagen, tipo de modelo). Un acierto restaura el estado del
+    predictor sin ejecutar el encoder ViT, por lo que re-preguntar con otras cajas o puntos es inmediato.
+    El orden LRU se lleva con la fecha de modificación de cada archivo, así que el caché puede
+    compartirse entre procesos.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 10 * 1024 ** 3):
+        """
+        Args:
+            cache_dir (str): Directorio del caché.
+            max_bytes (int): Tamaño máximo en bytes (10 GiB por defecto, ~2500 imágenes con ViT-H).
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str, model_type: str) -> str:
+        return os.path.join(self.cache_dir, f"{model_type}_{key}.npz")
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def load(self, predictor: SamPredictor, key: str, model_type: str) -> bool:
+        """
+        Restaura en el predictor el embedding guardado. Devuelve False si no está en caché.
+        """
+        path = self._path(key, model_type)
+        try:
+            with np.load(path) as data:
+                features = torch.from_numpy(data['features']).to(predictor.device)
+                original_size = tuple(int(v) for v in data['original_size'])
+                input_size = tuple(int(v) for v in data['input_size'])
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return False
+
+        predictor.reset_image()
+        predictor.features = features
+        predictor.original_size = original_size
+        predictor.input_size = input_size
+        predictor.is_image_set = True
+        # Marcar como usado recientemente
+        os.utime(path, None)
+        return True
+
+    def save(self, predictor: SamPredictor, key: str, model_type: str) -> None:
+        """
+        Guarda el embedding actual del predictor y desaloja lo menos usado si se supera el tamaño máximo.
+        """
+        path = self._path(key, model_type)
+        # Nombre temporal único: varios procesos pueden guardar la misma clave a la vez
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f,
+                         features=predictor.features.detach().cpu().numpy(),
+                         original_size=np.array(predictor.original_size),
+                         input_size=np.array(predictor.input_size))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict(keep=path)
+
+    def set_image(self, predictor: SamPredictor, image: np.ndarray, model_type: str,
+                  key: Optional[str] = None) -> bool:
+        """
+        Reemplazo de `predictor.set_image(image)` que usa el caché.
+
+        Args:
+            predictor (SamPredictor): Predictor de SAM.
+            image (np.ndarray): Imagen RGB (alto, ancho, 3).
+            model_type (str): Tipo de modelo ('vit_h', 'vit_l', 'vit_b').
+            key (Optional[str]): Hash precalculado de la imagen.
+
+        Returns:
+            bool: True si fue un acierto del caché.
+        """
+        key = key or image_hash(image)
+        if self.load(predictor, key, model_type):
+            self.hits += 1
+            return True
+        self.misses += 1
+        predictor.set_image(image)
+        self.save(predictor, key, model_type)
+        return False
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Elimina los embeddings menos usados hasta quedar bajo `max_bytes`. El archivo `keep` (el recién
+        guardado) nunca se elimina, aunque por sí solo supere el máximo.
+        """
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.npz') or filename.endswith('.tmp.npz'):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.SAM_EmbeddingCache`)
+if __name__ == "__main__":
+    import cv2
+    from segment_anything import sam_model_registry
+
+    start_time = time.time()
+
+    # Configuración
+    sam_checkpoint = "sam_vit_h_4b8939.pth"
+    model_type = "vit_h"
+    image_path = "/home/robotica10/yolov7-segmentation/c.v2i.yolov5pytorch/train/images/0b73d9f7-sample_1593_png.rf.ad781b3b3b8137dc9b703545bafe73f7.jpg"
+    cache_dir = "./sam_embeddings"
+
+    sam = sam_model_registry[model_type](checkpoint=sam_checkpoint)
+    predictor = SamPredictor(sam)
+    cache = SamEmbeddingCache(cache_dir, max_bytes=2 * 1024 ** 3)
+
+    image = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2RGB)
+    for _ in range(2):
+        t0 = time.time()
+        hit = cache.set_image(predictor, image, model_type)
+        logger.info(f"set_image: {'acierto' if hit else 'fallo'} en {time.time() - t0:.2f} s")
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Estadísticas del caché: {cache.stats}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
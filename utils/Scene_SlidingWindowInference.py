@@ -0,0 +1,331 @@
+import os
+import queue
+import time
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import geopandas as gpd
+import rasterio
+import shapely
+from rasterio.features import shapes
+from rasterio.windows import Window, transform as window_transform
+from shapely.geometry import shape
+from shapely.strtree import STRtree
+
+from utils.Sentinel_GridTiler import grid_offsets, format_to_save
+from utils.YOLO_SAM_Pipeline import YoloSamPipeline, batched
+from utils.Geometry_PostProcessor import pixel_size, postprocess
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Marca de fin de la cola de prelectura
+_END = object()
+
+
+def mask_to_geometry(mask: np.ndarray, transform: rasterio.Affine) -> Optional[shapely.Geometry]:
+    """
+    Vectoriza una máscara booleana en coordenadas del raster (une todas sus partes).
+    """
+    parts = [shape(geom) for geom, value in shapes(mask.astype(np.uint8), mask=mask, transform=transform) if value]
+    if not parts:
+        return None
+    return shapely.union_all(parts) if len(parts) > 1 else parts[0]
+
+
+class SeamMerger:
+    """
+    Fusiona detecciones de ventanas solapadas: NMS geográfica con unión de máscaras.
+
+    Dos detecciones de la misma clase se consideran el mismo objeto si su IoU supera `iou_threshold`
+    o si una queda contenida en la otra en más de `containment_threshold` (el caso típico de un objeto
+    cortado por el borde de una ventana). Al fusionarlas se unen las geometrías y se conserva el mayor puntaje.
+
+    Solo se mantienen en memoria las detecciones que todavía pueden tocar ventanas futuras:
+    al avanzar por filas, las que terminan antes de la fila actual se entregan con `flush`.
+    """
+
+    def __init__(self, iou_threshold: float = 0.5, containment_threshold: float = 0.8):
+        self.iou_threshold = iou_threshold
+        self.containment_threshold = containment_threshold
+        self.pending: List[Dict] = []
+
+    def add(self, detections: List[Dict]) -> None:
+        """
+        Agrega las detecciones de una ventana, fusionándolas con las pendientes que correspondan.
+
+        Una detección puede coincidir con varias pendientes (p. ej. las dos mitades de un objeto vistas en
+        ventanas que no se solapan entre sí); todas las coincidencias se agrupan con union-find y cada
+        grupo se fusiona en un solo objeto.
+        """
+        if not detections:
+            return
+        tree = STRtree([d['geometry'] for d in self.pending]) if self.pending else None
+        items = self.pending + list(detections)
+        parent = list(range(len(items)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        offset = len(self.pending)
+        for j, detection in enumerate(detections):
+            if tree is None:
+                break
+            for i in self._matches(tree, detection):
+                a, b = find(i), find(offset + j)
+                # La raíz es el menor índice: el grupo conserva la posición de la detección más antigua
+                parent[max(a, b)] = min(a, b)
+
+        groups: Dict[int, List[Dict]] = {}
+        for i, item in enumerate(items):
+            groups.setdefault(find(i), []).append(item)
+        self.pending = [self._merge(group) for group in groups.values()]
+
+    def _matches(self, tree: STRtree, detection: Dict) -> List[int]:
+        """
+        Índices de las detecciones pendientes que superan el umbral de IoU o de contención con `detection`.
+        """
+        candidates = tree.query(detection['geometry'], predicate='intersects')
+        candidates = [i for i in candidates if self.pending[i]['class_id'] == detection['class_id']]
+        if not candidates:
+            return []
+        geometries = np.array([self.pending[i]['geometry'] for i in candidates], dtype=object)
+        intersection = shapely.area(shapely.intersection(geometries, detection['geometry']))
+        areas = shapely.area(geometries)
+        area = shapely.area(detection['geometry'])
+        iou = intersection / np.maximum(areas + area - intersection, np.finfo(np.float64).eps)
+        containment = intersection / np.maximum(np.minimum(areas, area), np.finfo(np.float64).eps)
+        merge = (iou >= self.iou_threshold) | (containment >= self.containment_threshold)
+        return [int(i) for i, m in zip(candidates, merge) if m]
+
+    @staticmethod
+    def _merge(group: List[Dict]) -> Dict:
+        """
+        Fusiona un grupo de detecciones del mismo objeto: une las geometrías y conserva el mayor puntaje.
+        """
+        if len(group) == 1:
+            return group[0]
+        best = max(group, key=lambda d: d['score'])
+        merged = dict(group[0])
+        merged['geometry'] = shapely.union_all([d['geometry'] for d in group])
+        merged['last_row'] = max(d['last_row'] for d in group)
+        merged['n_windows'] = sum(d['n_windows'] for d in group)
+        merged['score'] = best['score']
+        merged['sam_score'] = best['sam_score']
+        return merged
+
+    def flush(self, row: Optional[int] = None) -> List[Dict]:
+        """
+        Entrega (y olvida) las detecciones que terminan antes de la fila de píxeles `row`; todas si es None.
+        """
+        if row is None:
+            done, self.pending = self.pending, []
+        else:
+            done = [d for d in self.pending if d['last_row'] <= row]
+            self.pending = [d for d in self.pending if d['last_row'] > row]
+        return done
+
+
+def _read_windows(band_paths: Sequence[str], offsets: List[Tuple[int, int]], size: int, scale: float,
+                  skip_nodata: bool, output: queue.Queue, stop: threading.Event) -> None:
+    """
+    Hilo lector: lee las ventanas en orden y las deja en una cola acotada (prelectura).
+    """
+    datasets = [rasterio.open(path) for path in band_paths]
+    try:
+        for row, col in offsets:
+            if stop.is_set():
+                break
+            window = Window(col, row, size, size)
+            sample = np.stack([src.read(1, window=window, boundless=True, fill_value=0) for src in datasets])
+            if skip_nodata and not sample.any():
+                continue
+            output.put((row, col, np.asarray(format_to_save(sample, scale))))
+    except Exception as e:
+        output.put(e)
+    finally:
+        for src in datasets:
+            src.close()
+        output.put(_END)
+
+
+def iter_windows(band_paths: Sequence[str], size: int, overlap: int, scale: float = 6000.0,
+                 skip_nodata: bool = True, prefetch: int = 16) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """
+    Recorre la escena en ventanas solapadas (orden por filas). Un hilo lee las siguientes ventanas
+    mientras se ejecuta la inferencia; la cola acotada limita la memoria a `prefetch` ventanas.
+
+    Yields:
+        Tuple[int, int, np.ndarray]: Fila, columna e imagen RGB uint8 de cada ventana.
+    """
+    with rasterio.open(band_paths[0]) as src:
+        width, height = src.width, src.height
+    stride = size - overlap
+    offsets = [(int(r), int(c)) for r in grid_offsets(height, size, stride) for c in grid_offsets(width, size, stride)]
+    logger.info(f"{len(offsets)} ventanas de {size}px (solape {overlap}px)")
+
+    windows = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    reader = threading.Thread(target=_read_windows,
+                              args=(list(band_paths), offsets, size, scale, skip_nodata, windows, stop), daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = windows.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Vaciar la cola para que el lector no quede bloqueado en put()
+        while reader.is_alive():
+            try:
+                windows.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        reader.join()
+
+
+class VectorLayerWriter:
+    """
+    Escribe detecciones en una capa vectorial a medida que se confirman (modo append), pasando
+    cada lote por el post-proceso geométrico (simplificación a la escala del píxel y atributos en bloque).
+    """
+
+    def __init__(self, output_file: str, layer: str, crs, output_crs: Optional[str] = "EPSG:4326",
+                 pixel: Optional[float] = None):
+        self.output_file = output_file
+        self.layer = layer
+        self.crs = crs
+        self.output_crs = output_crs
+        self.pixel = pixel
+        self.count = 0
+        if os.path.exists(output_file):
+            os.remove(output_file)
+
+    def write(self, detections: List[Dict]) -> None:
+        if not detections:
+            return
+        gdf = gpd.GeoDataFrame({
+            'id': np.arange(self.count, self.count + len(detections)),
+            'class_id': [d['class_id'] for d in detections],
+            'class': [d['class_name'] for d in detections],
+            'score': [d['score'] for d in detections],
+            'sam_score': [d['sam_score'] for d in detections],
+            'n_windows': [d['n_windows'] for d in detections],
+        }, geometry=[d['geometry'] for d in detections], crs=self.crs)
+        gdf = postprocess(gdf, pixel=self.pixel)
+        if self.output_crs:
+            gdf = gdf.to_crs(self.output_crs)
+        gdf.to_file(self.output_file, layer=self.layer, driver="GPKG", mode='a' if self.count else 'w')
+        self.count += len(gdf)
+
+
+def infer_scene(
+    pipeline: YoloSamPipeline,
+    band_paths: Sequence[str],
+    output_file: str,
+    layer: str = 'detections',
+    size: int = 1024,
+    overlap: int = 256,
+    scale: float = 6000.0,
+    iou_threshold: float = 0.5,
+    containment_threshold: float = 0.8,
+    prefetch: int = 16,
+    output_crs: Optional[str] = "EPSG:4326",
+) -> int:
+    """
+    Inferencia YOLO+SAM sobre una escena georreferenciada completa, sin pre-cortar teselas PNG.
+
+    La escena se lee en ventanas solapadas con prelectura en segundo plano, YOLO procesa las ventanas
+    por lotes y SAM segmenta todas las cajas de cada ventana de una vez. Las máscaras se vectorizan en
+    el CRS de la escena y se fusionan a través de las costuras con `SeamMerger`; las detecciones que ya no
+    pueden tocar ventanas futuras se escriben de inmediato, así que la memoria depende del tamaño de ventana
+    y no del de la escena.
+
+    Args:
+        pipeline (YoloSamPipeline): Modelos cargados.
+        band_paths (Sequence[str]): Rutas de las bandas en el orden de los canales RGB.
+        output_file (str): GeoPackage de salida.
+        layer (str): Nombre de la capa.
+        size (int): Tamaño de ventana en píxeles.
+        overlap (int): Solape entre ventanas; debe superar el tamaño del objeto más grande esperado.
+        scale (float): Valor que se mapea a 255 (como `formatToSave`).
+        iou_threshold (float): IoU mínima para fusionar dos detecciones.
+        containment_threshold (float): Fracción de la menor contenida en la mayor para fusionarlas.
+        prefetch (int): Ventanas leídas por adelantado.
+        output_crs (Optional[str]): CRS de salida; None conserva el de la escena.
+
+    Returns:
+        int: Número de objetos escritos.
+    """
+    if not 0 <= overlap < size:
+        raise ValueError("El solape debe estar entre 0 y el tamaño de ventana")
+    with rasterio.open(band_paths[0]) as src:
+        scene_transform, scene_crs = src.transform, src.crs
+
+    merger = SeamMerger(iou_threshold, containment_threshold)
+    writer = VectorLayerWriter(output_file, layer, scene_crs, output_crs, pixel=pixel_size(scene_transform))
+    n_windows = 0
+
+    for batch in batched(iter_windows(band_paths, size, overlap, scale, prefetch=prefetch), pipeline.batch_size):
+        images = [image for _, _, image in batch]
+        for (row, col, image), (boxes, classes, scores) in zip(batch, pipeline.detect(images)):
+            n_windows += 1
+            # Las ventanas llegan en orden por filas: nada que termine antes de esta fila puede volver a tocarse
+            writer.write(merger.flush(row))
+            if len(boxes) == 0:
+                continue
+            # Cada ventana de la escena se ve una sola vez: su embedding no se guarda en el caché persistente
+            pipeline.set_image(image, use_cache=False)
+            masks, sam_scores = pipeline.segment(image, boxes)
+            transform = window_transform(Window(col, row, size, size), scene_transform)
+            detections = []
+            for i, mask in enumerate(masks):
+                geometry = mask_to_geometry(mask, transform)
+                if geometry is None:
+                    continue
+                detections.append({
+                    'geometry': geometry,
+                    'class_id': int(classes[i]),
+                    'class_name': pipeline.class_names.get(int(classes[i]), str(classes[i])),
+                    'score': float(scores[i]),
+                    'sam_score': float(sam_scores[i]),
+                    'last_row': row + int(np.nonzero(mask.any(axis=1))[0].max()) + 1,
+                    'n_windows': 1,
+                })
+            merger.add(detections)
+
+    writer.write(merger.flush())
+    logger.info(f"{n_windows} ventanas procesadas, {writer.count} objetos escritos en {output_file}")
+    return writer.count
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Scene_SlidingWindowInference`)
+if __name__ == "__main__":
+    from utils.Raster_BandRatioEngine import find_band_paths
+
+    start_time = time.time()
+
+    # Configuración
+    yolo_weights = '/home/robotica10/yolov8/runs/segment/train3/weights/best.pt'
+    sam_checkpoint = "sam_vit_h_4b8939.pth"
+    img_data = "/home/manuel/Descargas/gaby2_2019/S2A_MSIL2A.SAFE/GRANULE/L2A_T19KEU/IMG_DATA"
+    rgb_bands = ['B08', 'B04', 'B03']
+
+    pipeline = YoloSamPipeline(yolo_weights, sam_checkpoint, model_type="vit_h", device="cpu",
+                               batch_size=4, num_threads=os.cpu_count(), imgsz=1024)
+    found = find_band_paths(img_data, rgb_bands)
+    n = infer_scene(pipeline, [found[band] for band in rgb_bands], 'gaby2_2019_detections.gpkg')
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Objetos detectados: {n}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
@@ -0,0 +1,236 @@
+import os
+import time
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pycocotools import mask as mask_utils
+from pycocotools.coco import COCO
+
+from utils.YOLO_LabelGeoExporter import load_yolo_labels
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+IOU_THRESHOLDS = np.round(np.arange(0.5, 1.0, 0.05), 2)
+RECALL_POINTS = np.linspace(0.0, 1.0, 101)
+
+
+def load_ground_truth(coco: COCO) -> Dict[str, Dict]:
+    """
+    Convierte una sola vez todas las anotaciones COCO a RLE, agrupadas por nombre base de la imagen.
+    """
+    ground_truth = {}
+    for img_id, img_info in coco.imgs.items():
+        anns = coco.loadAnns(coco.getAnnIds(imgIds=img_id))
+        stem = os.path.splitext(os.path.basename(img_info['file_name']))[0]
+        ground_truth[stem] = {
+            'image_id': img_id,
+            'height': img_info['height'],
+            'width': img_info['width'],
+            'classes': [ann['category_id'] for ann in anns],
+            'iscrowd': [int(ann.get('iscrowd', 0)) for ann in anns],
+            'rles': [coco.annToRLE(ann) for ann in anns],
+        }
+    return ground_truth
+
+
+def load_predictions(labels_folder: str, ground_truth: Dict[str, Dict],
+                     class_map: Optional[Dict[int, int]] = None) -> Dict[str, Dict]:
+    """
+    Lee todas las predicciones YOLO de una vez (arreglos columnares) y las convierte a RLE usando
+    el tamaño de la imagen del GT (sin volver a abrir la imagen).
+    """
+    labels = load_yolo_labels(labels_folder)
+    stems = [os.path.splitext(filename)[0] for filename in labels.filenames]
+    predictions = {stem: {'classes': [], 'scores': [], 'rles': []} for stem in stems if stem in ground_truth}
+    for i in range(len(labels)):
+        stem = stems[labels.file_index[i]]
+        if stem not in predictions:
+            continue
+        height, width = ground_truth[stem]['height'], ground_truth[stem]['width']
+        polygon = labels.polygon(i) * (width, height)
+        class_id = int(labels.class_id[i])
+        entry = predictions[stem]
+        entry['rles'].append(mask_utils.merge(mask_utils.frPyObjects([polygon.ravel().tolist()], height, width)))
+        entry['classes'].append(class_map.get(class_id, class_id) if class_map else class_id)
+        entry['scores'].append(float(labels.confidence[i]))
+    return predictions
+
+
+def evaluate_image(gt: Dict, pred: Dict, iou_thresholds: np.ndarray = IOU_THRESHOLDS) -> Dict:
+    """
+    Evalúa una imagen: matriz de IoU pred×GT en una sola llamada RLE, emparejamiento por clase
+    y áreas de intersección/unión por clase.
+
+    Returns:
+        Dict: Por clase, puntajes y aciertos por umbral de las predicciones, número de GT,
+            e intersección/unión de las máscaras semánticas.
+    """
+    gt_classes = np.array(gt['classes'], dtype=np.int64)
+    gt_crowd = np.array(gt['iscrowd'], dtype=np.uint8)
+    pred_classes = np.array(pred['classes'], dtype=np.int64)
+    pred_scores = np.array(pred['scores'], dtype=np.float64)
+
+    if len(pred['rles']) and len(gt['rles']):
+        ious = np.asarray(mask_utils.iou(pred['rles'], gt['rles'], gt_crowd.tolist()))
+    else:
+        ious = np.zeros((len(pred['rles']), len(gt['rles'])))
+
+    per_class = {}
+    for class_id in set(gt_classes.tolist()) | set(pred_classes.tolist()):
+        p_idx = np.where(pred_classes == class_id)[0]
+        g_idx = np.where(gt_classes == class_id)[0]
+        p_idx = p_idx[np.argsort(-pred_scores[p_idx], kind='stable')]
+        sub = ious[np.ix_(p_idx, g_idx)]
+        crowd = gt_crowd[g_idx].astype(bool)
+
+        matches = np.zeros((len(iou_thresholds), len(p_idx)), dtype=bool)
+        ignored = np.zeros((len(iou_thresholds), len(p_idx)), dtype=bool)
+        for t, threshold in enumerate(iou_thresholds):
+            taken = np.zeros(len(g_idx), dtype=bool)
+            for i in range(len(p_idx)):
+                candidates = np.where((~taken | crowd) & (sub[i] >= threshold))[0] if len(g_idx) else []
+                if len(candidates) == 0:
+                    continue
+                # Preferir GT no-crowd; entre ellos, el de mayor IoU
+                non_crowd = [c for c in candidates if not crowd[c]]
+                best = max(non_crowd or candidates, key=lambda c: sub[i, c])
+                if crowd[best]:
+                    ignored[t, i] = True
+                else:
+                    matches[t, i] = True
+                    taken[best] = True
+
+        pred_union = [pred['rles'][i] for i in p_idx]
+        gt_union = [gt['rles'][i] for i in g_idx]
+        pred_mask = mask_utils.merge(pred_union) if pred_union else None
+        gt_mask = mask_utils.merge(gt_union) if gt_union else None
+        if pred_mask is not None and gt_mask is not None:
+            intersection = float(mask_utils.area(mask_utils.merge([pred_mask, gt_mask], intersect=True)))
+            union = float(mask_utils.area(mask_utils.merge([pred_mask, gt_mask])))
+        else:
+            intersection = 0.0
+            union = float(mask_utils.area(pred_mask if pred_mask is not None else gt_mask))
+
+        per_class[class_id] = {
+            'scores': pred_scores[p_idx],
+            'matches': matches,
+            'ignored': ignored,
+            'n_gt': int((~crowd).sum()),
+            'intersection': intersection,
+            'union': union,
+        }
+    return per_class
+
+
+def _evaluate_chunk(items: List[Tuple[Dict, Dict]], iou_thresholds: np.ndarray) -> List[Dict]:
+    return [evaluate_image(gt, pred, iou_thresholds) for gt, pred in items]
+
+
+def average_precision(scores: np.ndarray, matches: np.ndarray, ignored: np.ndarray, n_gt: int) -> Tuple[float, float, float]:
+    """
+    AP interpolada en 101 puntos (como COCO), precisión y recall finales para un umbral.
+    """
+    if n_gt == 0:
+        return np.nan, np.nan, np.nan
+    order = np.argsort(-scores, kind='mergesort')
+    keep = ~ignored[order]
+    tp = np.cumsum(matches[order][keep])
+    fp = np.cumsum(~matches[order][keep])
+    if len(tp) == 0:
+        return 0.0, 0.0, 0.0
+    recall = tp / n_gt
+    precision = tp / np.maximum(tp + fp, np.finfo(np.float64).eps)
+    # Envolvente monótona de la precisión
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    idx = np.searchsorted(recall, RECALL_POINTS, side='left')
+    interpolated = np.where(idx < len(precision), precision[np.minimum(idx, len(precision) - 1)], 0.0)
+    return float(interpolated.mean()), float(precision[-1]), float(recall[-1])
+
+
+def evaluate(
+    annotation_file: str,
+    labels_folder: str,
+    class_map: Optional[Dict[int, int]] = None,
+    iou_thresholds: np.ndarray = IOU_THRESHOLDS,
+    max_workers: Optional[int] = None,
+    chunk_size: int = 64,
+) -> pd.DataFrame:
+    """
+    Evalúa predicciones YOLO contra un GT COCO y devuelve métricas por clase.
+
+    Args:
+        annotation_file (str): Ruta al result.json (COCO).
+        labels_folder (str): Carpeta runs/segment/predict/labels.
+        class_map (Optional[Dict[int, int]]): Clase YOLO -> category_id COCO (identidad por defecto).
+        iou_thresholds (np.ndarray): Umbrales de IoU (0.50:0.95 por defecto).
+        max_workers (Optional[int]): Número de procesos.
+        chunk_size (int): Imágenes por tarea.
+
+    Returns:
+        pd.DataFrame: Por clase, AP@[.5:.95], AP50, AP75, precisión y recall @0.5, IoU semántica e instancias.
+    """
+    coco = COCO(annotation_file)
+    ground_truth = load_ground_truth(coco)
+    predictions = load_predictions(labels_folder, ground_truth, class_map)
+    empty = {'classes': [], 'scores': [], 'rles': []}
+
+    items = [(gt, predictions.get(stem, empty)) for stem, gt in ground_truth.items()]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    logger.info(f"Evaluando {len(items)} imágenes ({len(predictions)} con predicciones) en {len(chunks)} tareas")
+
+    aggregated = defaultdict(lambda: defaultdict(list))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # map conserva el orden de las imágenes: el resultado es determinista
+        for results in executor.map(_evaluate_chunk, chunks, [iou_thresholds] * len(chunks)):
+            for per_class in results:
+                for class_id, values in per_class.items():
+                    for key, value in values.items():
+                        aggregated[class_id][key].append(value)
+
+    rows = []
+    t50 = int(np.argmin(np.abs(iou_thresholds - 0.5)))
+    t75 = int(np.argmin(np.abs(iou_thresholds - 0.75)))
+    for class_id in sorted(aggregated):
+        values = aggregated[class_id]
+        scores = np.concatenate(values['scores'])
+        matches = np.concatenate(values['matches'], axis=1)
+        ignored = np.concatenate(values['ignored'], axis=1)
+        n_gt = int(sum(values['n_gt']))
+        results = [average_precision(scores, matches[t], ignored[t], n_gt) for t in range(len(iou_thresholds))]
+        aps = np.array([r[0] for r in results])
+        union = sum(values['union'])
+        rows.append({
+            'class_id': class_id,
+            'class_name': coco.cats[class_id]['name'] if class_id in coco.cats else str(class_id),
+            'AP': float(np.nanmean(aps)) if n_gt else np.nan,
+            'AP50': results[t50][0],
+            'AP75': results[t75][0],
+            'precision@50': results[t50][1],
+            'recall@50': results[t50][2],
+            'IoU': sum(values['intersection']) / union if union else np.nan,
+            'n_gt': n_gt,
+            'n_pred': int(len(scores)),
+        })
+    return pd.DataFrame(rows)
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Segmentation_Evaluator`)
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración
+    json_path = '/home/robotica10/yolosampaper/project-5-at-2023-01-23-03-20-3039b793/result.json'
+    labels_folder = '/home/robotica10/yolov8/runs/segment/predict/labels'
+
+    metrics = evaluate(json_path, labels_folder)
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info("\n" + metrics.to_string(index=False))
+    logger.info(f"mAP@[.5:.95]: {metrics['AP'].mean():.4f}  mIoU: {metrics['IoU'].mean():.4f}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
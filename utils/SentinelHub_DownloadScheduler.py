@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import hashlib
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import List, Tuple, Dict, Optional, Iterator, Sequence
+
+import pandas as pd
+from sentinelhub import (
+    CRS,
+    BBox,
+    DataCollection,
+    MimeType,
+    SentinelHubDownloadClient,
+    SentinelHubRequest,
+    SHConfig,
+    bbox_to_dimensions,
+)
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Evalscript con las 12 bandas de Sentinel-2 L2A (mismo que en GetDB_Fondecyt.ipynb)
+EVALSCRIPT_ALL_BANDS = """
+//VERSION=3
+function setup() {
+  return {
+    input: [
+      {
+        bands: ["B01", "B02", "B03", "B04", "B05", "B06", "B07", "B08", "B8A", "B09", "B11", "B12"],
+        units: "DN",
+      },
+    ],
+    output: {
+      id: "default",
+      bands: 12,
+      sampleType: SampleType.UINT16,
+    },
+  }
+}
+
+function evaluatePixel(sample) {
+  return [
+    sample.B01, sample.B02, sample.B03, sample.B04, sample.B05, sample.B06,
+    sample.B07, sample.B08, sample.B8A, sample.B09, sample.B11, sample.B12,
+  ]
+}
+"""
+
+ALL_BANDS = ["B01", "B02", "B03", "B04", "B05", "B06", "B07", "B08", "B8A", "B09", "B11", "B12"]
+
+RESPONSE_FILENAME = "response.tiff"
+# La respuesta se descarga con este nombre y se renombra al terminar: un corte a mitad de la descarga
+# no deja un response.tiff truncado que luego se tome como caché válido
+PARTIAL_FILENAME = "response.tiff.part"
+METADATA_FILENAME = "metadata.json"
+
+
+@dataclass(frozen=True)
+class DownloadJob:
+    """
+    Una descarga individual: un bbox en un intervalo de tiempo (slot).
+    """
+    bbox: Tuple[float, float, float, float]
+    slot: Tuple[str, str]
+    evalscript: str = EVALSCRIPT_ALL_BANDS
+    resolution: int = 10
+
+    @property
+    def key(self) -> str:
+        return cache_key(self.bbox, self.slot, self.evalscript, self.resolution)
+
+
+@dataclass
+class DownloadResult:
+    """
+    Resultado de una descarga: ruta del TIFF en caché y si vino del caché o de la red.
+    """
+    job: DownloadJob
+    path: Optional[str]
+    cached: bool
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None
+
+
+def cache_key(bbox: Sequence[float], slot: Sequence[str], evalscript: str, resolution: int) -> str:
+    """
+    Calcula la clave del caché a partir de (bbox, slot, evalscript, resolución).
+
+    Args:
+        bbox (Sequence[float]): Coordenadas lon_min, lat_min, lon_max, lat_max en WGS84.
+        slot (Sequence[str]): Fechas de inicio y fin en formato ISO.
+        evalscript (str): Evalscript de Sentinel Hub.
+        resolution (int): Resolución en metros.
+
+    Returns:
+        str: Hash SHA-1 en hexadecimal.
+    """
+    payload = json.dumps({
+        "bbox": [round(float(c), 10) for c in bbox],
+        "slot": [str(s) for s in slot],
+        "evalscript": hashlib.sha1(evalscript.strip().encode('utf-8')).hexdigest(),
+        "resolution": int(resolution),
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def make_time_slots(start: datetime.datetime, end: datetime.datetime, n_chunks: int) -> List[Tuple[str, str]]:
+    """
+    Divide un intervalo de tiempo en n_chunks slots iguales (igual que en GetDB_Fondecyt.ipynb).
+
+    Returns:
+        List[Tuple[str, str]]: Lista de pares (inicio, fin) en formato ISO.
+    """
+    tdelta = (end - start) / n_chunks
+    edges = [(start + i * tdelta).date().isoformat() for i in range(n_chunks + 1)]
+    return [(edges[i], edges[i + 1]) for i in range(len(edges) - 1)]
+
+
+def load_bboxes_from_excel(excel_file: str, sheet_name: str = 'Sheet1', column_name: str = 'B') -> List[List[float]]:
+    """
+    Lee los bbox desde dbCoordenadas.xlsx con el mismo formato que usa GetDB_Fondecyt.ipynb.
+
+    Returns:
+        List[List[float]]: Lista de [longMin, latMin, longMax, latMax].
+    """
+    df = pd.read_excel(excel_file, sheet_name=sheet_name, usecols=column_name)
+    df['Bbox'] = df['Bbox'].str.slice(start=7).str[:-1]
+    df[['longMin', 'latMin', 'longMax', 'latMax']] = df['Bbox'].str.split(',', expand=True)
+    df[['longMin', 'latMin', 'longMax', 'latMax']] = df[['longMin', 'latMin', 'longMax', 'latMax']].apply(pd.to_numeric)
+    df.drop(columns=['Bbox'], inplace=True)
+    return df.values.tolist()
+
+
+class SentinelHubDownloadScheduler:
+    """
+    Planificador de descargas de Sentinel Hub con concurrencia acotada, reintentos y caché en disco.
+
+    Cada respuesta se guarda en `cache_dir/<clave>/response.tiff`, donde la clave depende de
+    (bbox, slot, evalscript, resolución). Al re-ejecutar solo se descargan los trabajos que faltan.
+    La respuesta se escribe primero como `response.tiff.part` y se renombra con `os.replace` una vez
+    completa, de modo que solo existe `response.tiff` si la descarga terminó.
+    Para pruebas basta con apuntar `config.sh_base_url` y `config.sh_token_url` a un servidor HTTP local.
+    """
+
+    def __init__(
+        self,
+        config: SHConfig,
+        cache_dir: str,
+        max_threads: int = 4,
+        batch_size: int = 50,
+        max_rounds: int = 4,
+        backoff_seconds: float = 5.0,
+        data_collection: Optional[DataCollection] = None,
+        mosaicking_order: str = "leastCC",
+    ):
+        """
+        Args:
+            config (SHConfig): Configuración de Sentinel Hub (credenciales y URLs).
+            cache_dir (str): Directorio del caché en disco.
+            max_threads (int): Número máximo de descargas simultáneas.
+            batch_size (int): Número de solicitudes enviadas al cliente por lote.
+            max_rounds (int): Número de rondas de reintento para las solicitudes fallidas.
+            backoff_seconds (float): Espera base entre rondas; se duplica en cada ronda.
+            data_collection (Optional[DataCollection]): Colección; por defecto Sentinel-2 L2A de CDSE.
+            mosaicking_order (str): Orden de mosaico enviado en `dataFilter`.
+        """
+        self.config = config
+        self.cache_dir = cache_dir
+        self.max_threads = max_threads
+        self.batch_size = batch_size
+        self.max_rounds = max_rounds
+        self.backoff_seconds = backoff_seconds
+        self.mosaicking_order = mosaicking_order
+        self.data_collection = data_collection or DataCollection.SENTINEL2_L2A.define_from(
+            name="s2", service_url=config.sh_base_url
+        )
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def job_dir(self, job: DownloadJob) -> str:
+        return os.path.join(self.cache_dir, job.key)
+
+    def cached_path(self, job: DownloadJob) -> Optional[str]:
+        """
+        Devuelve la ruta del TIFF en caché si ya existe, o None.
+        """
+        path = os.path.join(self.job_dir(job), RESPONSE_FILENAME)
+        return path if os.path.exists(path) else None
+
+    def _build_request(self, job: DownloadJob) -> SentinelHubRequest:
+        aoi_bbox = BBox(bbox=list(job.bbox), crs=CRS.WGS84)
+        aoi_size = bbox_to_dimensions(aoi_bbox, resolution=job.resolution)
+        return SentinelHubRequest(
+            evalscript=job.evalscript,
+            input_data=[
+                SentinelHubRequest.input_data(
+                    data_collection=self.data_collection,
+                    time_interval=job.slot,
+                    other_args={"dataFilter": {"mosaickingOrder": self.mosaicking_order}},
+                )
+            ],
+            responses=[SentinelHubRequest.output_response("default", MimeType.TIFF)],
+            bbox=aoi_bbox,
+            size=aoi_size,
+            data_folder=self.job_dir(job),
+            config=self.config,
+        )
+
+    def _download_request(self, job: DownloadJob):
+        download_request = self._build_request(job).download_list[0]
+        # Nombre fijo dentro de la carpeta de la clave, para que el caché no dependa del payload;
+        # se descarga con el nombre temporal y `_download_batch` lo renombra al terminar
+        download_request.filename = PARTIAL_FILENAME
+        download_request.save_response = True
+        download_request.return_data = False
+        return download_request
+
+    def _write_metadata(self, job: DownloadJob) -> None:
+        metadata = {
+            "key": job.key,
+            "bbox": list(job.bbox),
+            "slot": list(job.slot),
+            "resolution": job.resolution,
+            "bands": ALL_BANDS if job.evalscript == EVALSCRIPT_ALL_BANDS else None,
+            "downloaded_at": datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(os.path.join(self.job_dir(job), METADATA_FILENAME), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+    def _download_batch(self, jobs: List[DownloadJob]) -> Dict[str, Optional[str]]:
+        """
+        Descarga un lote y devuelve un diccionario clave -> mensaje de error (None si fue exitosa).
+        """
+        client = SentinelHubDownloadClient(config=self.config, raise_download_errors=False)
+        # Restos de una descarga interrumpida: si quedaran, una descarga fallida parecería exitosa
+        for job in jobs:
+            partial = os.path.join(self.job_dir(job), PARTIAL_FILENAME)
+            if os.path.exists(partial):
+                os.remove(partial)
+        requests_list = [self._download_request(job) for job in jobs]
+        client.download(requests_list, max_threads=self.max_threads, decode_data=False)
+
+        errors = {}
+        for job in jobs:
+            partial = os.path.join(self.job_dir(job), PARTIAL_FILENAME)
+            if not os.path.exists(partial):
+                errors[job.key] = "Respuesta no recibida"
+            else:
+                self._write_metadata(job)
+                os.replace(partial, os.path.join(self.job_dir(job), RESPONSE_FILENAME))
+                errors[job.key] = None
+        return errors
+
+    def run(self, jobs: Sequence[DownloadJob]) -> Iterator[DownloadResult]:
+        """
+        Ejecuta todos los trabajos y entrega los resultados a medida que se completan.
+
+        Args:
+            jobs (Sequence[DownloadJob]): Trabajos a ejecutar.
+
+        Yields:
+            DownloadResult: Un resultado por trabajo (desde caché, descargado o fallido).
+        """
+        unique_jobs = list(dict.fromkeys(jobs))
+        pending = []
+        for job in unique_jobs:
+            path = self.cached_path(job)
+            if path is not None:
+                yield DownloadResult(job, path, cached=True)
+            else:
+                pending.append(job)
+
+        logger.info(f"{len(unique_jobs) - len(pending)} trabajos en caché, {len(pending)} por descargar")
+
+        last_errors = {}
+        for round_index in range(self.max_rounds):
+            if not pending:
+                break
+            if round_index > 0:
+                wait = self.backoff_seconds * 2 ** (round_index - 1)
+                logger.warning(f"Reintentando {len(pending)} descargas en {wait:.0f} s (ronda {round_index + 1}/{self.max_rounds})")
+                time.sleep(wait)
+
+            failed = []
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                errors = self._download_batch(batch)
+                for job in batch:
+                    if errors[job.key] is None:
+                        yield DownloadResult(job, self.cached_path(job), cached=False)
+                    else:
+                        failed.append(job)
+                        last_errors[job.key] = errors[job.key]
+            pending = failed
+
+        for job in pending:
+            logger.error(f"Descarga fallida para {job.bbox} {job.slot}")
+            yield DownloadResult(job, None, cached=False, error=last_errors.get(job.key))
+
+
+def build_jobs(
+    bboxes: Sequence[Sequence[float]],
+    slots: Sequence[Tuple[str, str]],
+    evalscript: str = EVALSCRIPT_ALL_BANDS,
+    resolution: int = 10,
+) -> List[DownloadJob]:
+    """
+    Genera el producto cartesiano bbox × slot como lista de trabajos.
+    """
+    return [DownloadJob(tuple(float(c) for c in bbox), tuple(slot), evalscript, resolution)
+            for bbox in bboxes for slot in slots]
+
+
+# Uso del script
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración
+    config = SHConfig("cdse")
+    excel_file = 'dbCoordenadas.xlsx'
+    cache_dir = './sentinel_cache'
+
+    bboxes = load_bboxes_from_excel(excel_file)
+    slots = make_time_slots(datetime.datetime(2019, 1, 1), datetime.datetime(2024, 4, 3), 50)
+    jobs = build_jobs(bboxes, slots)
+
+    scheduler = SentinelHubDownloadScheduler(config, cache_dir, max_threads=4)
+    results = list(scheduler.run(jobs))
+
+    n_cached = sum(r.cached for r in results)
+    n_failed = sum(not r.ok for r in results)
+    execution_time_minutes = (time.time() - start_time) / 60
+
+    logger.info("\n--- Resumen de Descargas ---")
+    logger.info(f"Trabajos totales: {len(results)}")
+    logger.info(f"Desde caché: {n_cached}")
+    logger.info(f"Descargados: {len(results) - n_cached - n_failed}")
+    logger.info(f"Fallidos: {n_failed}")
+    logger.info(f"\nTiempo total de ejecución: {execution_time_minutes:.2f} minutos")
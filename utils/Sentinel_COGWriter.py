@@ -0,0 +1,385 @@
+import os
+import json
+import time
+import logging
+from dataclasses import dataclass, asdict, field
+from typing import List, Tuple, Dict, Optional, Sequence, Iterable
+
+import numpy as np
+import pandas as pd
+import rasterio
+import rasterio.shutil
+from rasterio.io import MemoryFile
+from rasterio.windows import Window, from_bounds as window_from_bounds
+
+from utils.SentinelHub_DownloadScheduler import ALL_BANDS, DownloadResult
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Opciones de creación del COG: teselas de 512, DEFLATE con predictor horizontal y overviews internas
+COG_OPTIONS = {
+    'COMPRESS': 'DEFLATE',
+    'PREDICTOR': '2',
+    'BLOCKSIZE': '512',
+    'OVERVIEWS': 'AUTO',
+    'OVERVIEW_RESAMPLING': 'AVERAGE',
+    'BIGTIFF': 'IF_SAFER',
+    'NUM_THREADS': 'ALL_CPUS',
+}
+
+
+@dataclass
+class SceneItem:
+    """
+    Entrada del índice tipo STAC: una escena (bbox, slot) con todas sus bandas en un COG.
+    """
+    id: str
+    path: str
+    bbox: Tuple[float, float, float, float]
+    start_date: str
+    end_date: str
+    bands: List[str]
+    width: int
+    height: int
+    crs: str
+    datetime: Optional[str] = None
+    cloud_cover: Optional[float] = None
+    valid_fraction: Optional[float] = None
+    properties: Dict = field(default_factory=dict)
+
+    @property
+    def footprint(self) -> Dict:
+        """
+        Huella de la escena como geometría GeoJSON.
+        """
+        lon_min, lat_min, lon_max, lat_max = self.bbox
+        return {
+            "type": "Polygon",
+            "coordinates": [[[lon_min, lat_min], [lon_max, lat_min], [lon_max, lat_max],
+                             [lon_min, lat_max], [lon_min, lat_min]]],
+        }
+
+
+def write_multiband_cog(
+    data: np.ndarray,
+    output_path: str,
+    transform: rasterio.Affine,
+    crs: str,
+    band_names: Sequence[str],
+    nodata: Optional[float] = 0,
+    cog_options: Optional[Dict] = None,
+) -> None:
+    """
+    Escribe un arreglo (bandas, alto, ancho) como un único COG teselado, comprimido y con overviews.
+
+    Args:
+        data (np.ndarray): Arreglo con forma (bandas, alto, ancho).
+        output_path (str): Ruta del COG de salida.
+        transform (rasterio.Affine): Transformación geoespacial.
+        crs (str): Sistema de referencia.
+        band_names (Sequence[str]): Nombre de cada banda; se guarda como descripción de banda.
+        nodata (Optional[float]): Valor nodata.
+        cog_options (Optional[Dict]): Opciones de creación del driver COG.
+    """
+    count, height, width = data.shape
+    if len(band_names) != count:
+        raise ValueError(f"Se esperaban {count} nombres de banda, se recibieron {len(band_names)}")
+
+    profile = {
+        'driver': 'GTiff',
+        'dtype': data.dtype,
+        'nodata': nodata,
+        'width': width,
+        'height': height,
+        'count': count,
+        'crs': crs,
+        'transform': transform,
+    }
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as mem:
+            mem.write(data)
+            mem.descriptions = tuple(band_names)
+        with memfile.open() as mem:
+            rasterio.shutil.copy(mem, tmp_path, driver='COG', **(cog_options or COG_OPTIONS))
+    # Renombrado atómico: un COG a medio escribir nunca queda con el nombre final
+    os.replace(tmp_path, output_path)
+
+
+def convert_response_to_cog(
+    response_path: str,
+    output_path: str,
+    band_names: Sequence[str] = ALL_BANDS,
+    cog_options: Optional[Dict] = None,
+) -> Tuple[int, int, str, float]:
+    """
+    Convierte la respuesta TIFF de Sentinel Hub en un COG multibanda.
+
+    Returns:
+        Tuple[int, int, str, float]: Ancho, alto, CRS y fracción de píxeles válidos.
+    """
+    with rasterio.open(response_path) as src:
+        data = src.read()
+        transform, crs = src.transform, src.crs.to_string()
+    write_multiband_cog(data, output_path, transform, crs, band_names, nodata=0, cog_options=cog_options)
+    valid_fraction = float(np.count_nonzero(data.any(axis=0))) / (data.shape[1] * data.shape[2])
+    return data.shape[2], data.shape[1], crs, valid_fraction
+
+
+class SceneIndex:
+    """
+    Índice local de escenas en JSON o Parquet (según la extensión del archivo).
+
+    Permite buscar escenas por bbox, fechas y nubosidad sin recorrer directorios.
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.items: Dict[str, SceneItem] = {}
+        if os.path.exists(index_path):
+            self._load()
+
+    @property
+    def _is_parquet(self) -> bool:
+        return self.index_path.endswith('.parquet')
+
+    def _load(self) -> None:
+        if self._is_parquet:
+            records = pd.read_parquet(self.index_path).to_dict(orient='records')
+            for record in records:
+                record['bbox'] = tuple(record['bbox'])
+                record['bands'] = list(record['bands'])
+                record['properties'] = json.loads(record['properties'] or '{}')
+                # Parquet guarda los valores desconocidos de columnas numéricas como NaN
+                for key in ('cloud_cover', 'valid_fraction'):
+                    if record.get(key) is not None and np.isnan(record[key]):
+                        record[key] = None
+        else:
+            with open(self.index_path, 'r') as f:
+                records = [feature['properties'] for feature in json.load(f)['features']]
+            for record in records:
+                record['bbox'] = tuple(record['bbox'])
+        self.items = {record['id']: SceneItem(**record) for record in records}
+
+    def save(self) -> None:
+        """
+        Guarda el índice de forma atómica.
+        """
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        items = sorted(self.items.values(), key=lambda item: (item.start_date, item.id))
+        if self._is_parquet:
+            df = pd.DataFrame([asdict(item) for item in items])
+            if not df.empty:
+                df['properties'] = df['properties'].apply(json.dumps)
+            df.to_parquet(tmp_path, index=False)
+        else:
+            collection = {
+                "type": "FeatureCollection",
+                "features": [
+                    {"type": "Feature", "id": item.id, "bbox": list(item.bbox),
+                     "geometry": item.footprint, "properties": asdict(item)}
+                    for item in items
+                ],
+            }
+            with open(tmp_path, 'w') as f:
+                json.dump(collection, f)
+        os.replace(tmp_path, self.index_path)
+
+    def add(self, item: SceneItem) -> None:
+        self.items[item.id] = item
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def query(
+        self,
+        bbox: Optional[Sequence[float]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_cloud_cover: Optional[float] = None,
+    ) -> List[SceneItem]:
+        """
+        Busca escenas que intersectan un bbox y un rango de fechas.
+
+        Args:
+            bbox (Optional[Sequence[float]]): lon_min, lat_min, lon_max, lat_max en WGS84.
+            start_date (Optional[str]): Fecha mínima (ISO).
+            end_date (Optional[str]): Fecha máxima (ISO).
+            max_cloud_cover (Optional[float]): Nubosidad máxima en porcentaje; excluye las escenas
+                con nubosidad desconocida (None o NaN).
+
+        Returns:
+            List[SceneItem]: Escenas que cumplen todos los filtros.
+        """
+        results = []
+        for item in self.items.values():
+            if bbox is not None:
+                lon_min, lat_min, lon_max, lat_max = item.bbox
+                if lon_max < bbox[0] or lon_min > bbox[2] or lat_max < bbox[1] or lat_min > bbox[3]:
+                    continue
+            if start_date is not None and item.end_date < start_date:
+                continue
+            if end_date is not None and item.start_date > end_date:
+                continue
+            if max_cloud_cover is not None and (item.cloud_cover is None or np.isnan(item.cloud_cover)
+                                                or item.cloud_cover > max_cloud_cover):
+                continue
+            results.append(item)
+        return sorted(results, key=lambda item: (item.start_date, item.id))
+
+
+def read_bands(
+    path: str,
+    bands: Optional[Sequence[str]] = None,
+    bounds: Optional[Sequence[float]] = None,
+    window: Optional[Window] = None,
+) -> Tuple[np.ndarray, rasterio.Affine]:
+    """
+    Lee un subconjunto de bandas y una ventana de un COG, tocando solo las teselas necesarias.
+
+    Args:
+        path (str): Ruta del COG.
+        bands (Optional[Sequence[str]]): Nombres de las bandas; por defecto todas.
+        bounds (Optional[Sequence[float]]): Límites en el CRS del COG (alternativa a `window`).
+        window (Optional[Window]): Ventana en píxeles.
+
+    Returns:
+        Tuple[np.ndarray, rasterio.Affine]: Datos (bandas, alto, ancho) y transformación de la ventana.
+    """
+    with rasterio.open(path) as src:
+        if bands is None:
+            indexes = list(range(1, src.count + 1))
+        else:
+            descriptions = list(src.descriptions)
+            indexes = [descriptions.index(band) + 1 for band in bands]
+        if bounds is not None:
+            window = window_from_bounds(*bounds, transform=src.transform).round_offsets().round_lengths()
+        data = src.read(indexes, window=window)
+        transform = src.window_transform(window) if window is not None else src.transform
+    return data, transform
+
+
+def scene_id(bbox: Sequence[float], slot: Sequence[str]) -> str:
+    """
+    Identificador legible y determinista de una escena (bbox, slot).
+    """
+    return "S2L2A_" + "_".join(f"{c:.5f}" for c in bbox) + f"_{slot[0]}_{slot[1]}"
+
+
+def build_cogs_from_downloads(
+    results: Iterable[DownloadResult],
+    output_directory: str,
+    index: SceneIndex,
+    cloud_cover_lookup=None,
+    overwrite: bool = False,
+) -> SceneIndex:
+    """
+    Convierte las descargas del planificador a COGs y actualiza el índice.
+
+    Args:
+        results (Iterable[DownloadResult]): Resultados de `SentinelHubDownloadScheduler.run`.
+        output_directory (str): Directorio de los COGs.
+        index (SceneIndex): Índice a actualizar.
+        cloud_cover_lookup: Función opcional (bbox, slot) -> (fecha de adquisición, nubosidad).
+        overwrite (bool): Si es True, reescribe COGs ya indexados.
+
+    Returns:
+        SceneIndex: El índice actualizado (y guardado).
+    """
+    for result in results:
+        if not result.ok:
+            continue
+        job = result.job
+        item_id = scene_id(job.bbox, job.slot)
+        if item_id in index and not overwrite and os.path.exists(index.items[item_id].path):
+            continue
+
+        output_path = os.path.join(output_directory, f"{item_id}.tif")
+        try:
+            width, height, crs, valid_fraction = convert_response_to_cog(result.path, output_path)
+        except Exception as e:
+            logger.error(f"Error al convertir {result.path}: {str(e)}")
+            continue
+
+        acquired, cloud_cover = cloud_cover_lookup(job.bbox, job.slot) if cloud_cover_lookup else (None, None)
+        index.add(SceneItem(
+            id=item_id,
+            path=os.path.abspath(output_path),
+            bbox=tuple(job.bbox),
+            start_date=job.slot[0],
+            end_date=job.slot[1],
+            bands=list(ALL_BANDS),
+            width=width,
+            height=height,
+            crs=crs,
+            datetime=acquired,
+            cloud_cover=cloud_cover,
+            valid_fraction=valid_fraction,
+            properties={"resolution": job.resolution, "cache_key": job.key},
+        ))
+        logger.info(f"COG generado: {output_path}")
+
+    index.save()
+    return index
+
+
+def make_catalog_cloud_cover_lookup(config, data_collection):
+    """
+    Crea una función que consulta el catálogo de Sentinel Hub y devuelve la fecha y la nubosidad
+    de la escena menos nublada del slot (la misma que elige el mosaico `leastCC`).
+    """
+    from sentinelhub import BBox, CRS, SentinelHubCatalog
+
+    catalog = SentinelHubCatalog(config=config)
+
+    def lookup(bbox, slot):
+        search = catalog.search(
+            data_collection,
+            bbox=BBox(bbox=list(bbox), crs=CRS.WGS84),
+            time=tuple(slot),
+            fields={"include": ["properties.datetime", "properties.eo:cloud_cover"], "exclude": []},
+        )
+        features = list(search)
+        if not features:
+            return None, None
+        best = min(features, key=lambda f: f['properties'].get('eo:cloud_cover', 100.0))
+        return best['properties'].get('datetime'), best['properties'].get('eo:cloud_cover')
+
+    return lookup
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Sentinel_COGWriter`)
+if __name__ == "__main__":
+    import datetime
+    from sentinelhub import SHConfig
+    from utils.SentinelHub_DownloadScheduler import (
+        SentinelHubDownloadScheduler, build_jobs, load_bboxes_from_excel, make_time_slots)
+
+    start_time = time.time()
+
+    # Configuración
+    config = SHConfig("cdse")
+    excel_file = 'dbCoordenadas.xlsx'
+    cache_dir = './sentinel_cache'
+    output_directory = './sentinel_cogs'
+    index_path = os.path.join(output_directory, 'index.parquet')
+
+    bboxes = load_bboxes_from_excel(excel_file)
+    slots = make_time_slots(datetime.datetime(2019, 1, 1), datetime.datetime(2024, 4, 3), 50)
+    scheduler = SentinelHubDownloadScheduler(config, cache_dir, max_threads=4)
+    lookup = make_catalog_cloud_cover_lookup(config, scheduler.data_collection)
+
+    index = build_cogs_from_downloads(
+        scheduler.run(build_jobs(bboxes, slots)), output_directory, SceneIndex(index_path), lookup)
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Escenas indexadas: {len(index)}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
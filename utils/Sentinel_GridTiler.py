@@ -0,0 +1,178 @@
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from PIL import Image
+from pyproj import Transformer
+
+from utils.Raster_BandRatioEngine import find_band_paths
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_transformer(from_crs: str, to_crs: str = "epsg:4326") -> Transformer:
+    """
+    Transformer de pyproj cacheado: se construye una sola vez por par de CRS.
+    """
+    return Transformer.from_crs(from_crs, to_crs)
+
+
+def grid_offsets(length: int, size: int, stride: int) -> np.ndarray:
+    """
+    Desplazamientos de las teselas a lo largo de un eje; la última tesela se alinea con el borde.
+    """
+    if length <= size:
+        return np.array([0])
+    offsets = np.arange(0, length - size + 1, stride)
+    if offsets[-1] != length - size:
+        offsets = np.append(offsets, length - size)
+    return offsets
+
+
+def compute_tile_grid(transform: rasterio.Affine, crs: str, width: int, height: int,
+                      size: int = 256, stride: int = 204) -> Dict[str, np.ndarray]:
+    """
+    Calcula toda la grilla de teselas y sus límites WGS84 de una sola vez, en forma vectorizada.
+
+    Los nombres siguen el formato de `formatFilenametFromCoordiates` del notebook de segmentación:
+    minx_maxx_miny_maxy con el orden de ejes de EPSG:4326 (primero latitud).
+
+    Args:
+        transform (rasterio.Affine): Transformación del raster.
+        crs (str): CRS del raster.
+        width (int): Ancho en píxeles.
+        height (int): Alto en píxeles.
+        size (int): Tamaño de tesela en píxeles.
+        stride (int): Paso entre teselas en píxeles (0.8 × 256 en el notebook).
+
+    Returns:
+        Dict[str, np.ndarray]: Filas, columnas, límites WGS84 y nombres de archivo de cada tesela.
+    """
+    rows, cols = np.meshgrid(grid_offsets(height, size, stride), grid_offsets(width, size, stride), indexing='ij')
+    rows, cols = rows.ravel(), cols.ravel()
+
+    xmin = transform.c + cols * transform.a
+    xmax = transform.c + (cols + size) * transform.a
+    ymax = transform.f + rows * transform.e
+    ymin = transform.f + (rows + size) * transform.e
+
+    transformer = get_transformer(str(crs))
+    minx, miny = transformer.transform(xmin, ymin)
+    maxx, maxy = transformer.transform(xmax, ymax)
+
+    names = np.array([f"{float(a)}_{float(b)}_{float(c)}_{float(d)}" for a, b, c, d in zip(minx, maxx, miny, maxy)])
+    return {'rows': rows, 'cols': cols, 'minx': np.asarray(minx), 'maxx': np.asarray(maxx),
+            'miny': np.asarray(miny), 'maxy': np.asarray(maxy), 'names': names}
+
+
+def format_to_save(sample: np.ndarray, scale: float = 6000.0) -> Image.Image:
+    """
+    Escala una tesela (bandas, alto, ancho) a RGB uint8 como `formatToSave` del notebook.
+    """
+    scaled = np.clip(sample.astype('float32') / scale, 0.0, 1.0)
+    return Image.fromarray((np.transpose(scaled, (1, 2, 0)) * 255).astype(np.uint8))
+
+
+def _tile_strip(band_paths: List[str], row: int, cols: np.ndarray, names: np.ndarray, size: int,
+                output_directory: str, scale: float, skip_nodata: bool) -> Tuple[int, int]:
+    """
+    Lee una franja de filas de todas las bandas con una sola lectura por banda y guarda sus teselas.
+
+    Returns:
+        Tuple[int, int]: Teselas guardadas y teselas omitidas por ser solo nodata.
+    """
+    col_start, col_stop = int(cols.min()), int(cols.max()) + size
+    window = Window(col_start, row, col_stop - col_start, size)
+    strip = []
+    for path in band_paths:
+        with rasterio.open(path) as src:
+            strip.append(src.read(1, window=window, boundless=True, fill_value=0))
+    strip = np.stack(strip)
+
+    saved = skipped = 0
+    for col, name in zip(cols, names):
+        tile = strip[:, :, col - col_start:col - col_start + size]
+        if skip_nodata and not tile.any():
+            skipped += 1
+            continue
+        format_to_save(tile, scale).save(os.path.join(output_directory, f"{name}.png"), format='PNG')
+        saved += 1
+    return saved, skipped
+
+
+def tile_scene(
+    band_paths: Sequence[str],
+    output_directory: str,
+    size: int = 256,
+    stride: Optional[int] = None,
+    scale: float = 6000.0,
+    skip_nodata: bool = True,
+    max_workers: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    Tesela un gránulo completo: grilla y nombres calculados de antemano, lectura por franjas y
+    codificación/escritura PNG en un pool de procesos.
+
+    Args:
+        band_paths (Sequence[str]): Rutas de las bandas en el orden de los canales RGB de salida.
+        output_directory (str): Directorio de salida de los PNG.
+        size (int): Tamaño de tesela en píxeles.
+        stride (Optional[int]): Paso entre teselas; por defecto 0.8 × size como en el notebook.
+        scale (float): Valor que se mapea a 255.
+        skip_nodata (bool): Omitir teselas cuyos píxeles son todos 0.
+        max_workers (Optional[int]): Número de procesos.
+
+    Returns:
+        Tuple[int, int]: Teselas guardadas y omitidas.
+    """
+    stride = stride or int(size * 0.8)
+    os.makedirs(output_directory, exist_ok=True)
+    with rasterio.open(band_paths[0]) as src:
+        grid = compute_tile_grid(src.transform, src.crs.to_string(), src.width, src.height, size, stride)
+    logger.info(f"{len(grid['names'])} teselas de {size}px (paso {stride}px)")
+
+    saved = skipped = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for row in np.unique(grid['rows']):
+            in_row = grid['rows'] == row
+            futures.append(executor.submit(_tile_strip, list(band_paths), int(row), grid['cols'][in_row],
+                                           grid['names'][in_row], size, output_directory, scale, skip_nodata))
+        for future in as_completed(futures):
+            try:
+                s, k = future.result()
+                saved += s
+                skipped += k
+            except Exception as e:
+                logger.error(f"Error al teselar una franja: {str(e)}")
+    return saved, skipped
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Sentinel_GridTiler`)
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración
+    ROOT_DIR = "/home/manuel/Descargas/"
+    ANALYZED_MAP = "gaby2_2019"
+    # Mismo orden de canales que formatToSave: sample[[3, 2, 1]] de ["B02", "B03", "B04", "B08"]
+    rgb_bands = ['B08', 'B04', 'B03']
+
+    safe_dir = os.path.join(ROOT_DIR, ANALYZED_MAP, sorted(os.listdir(os.path.join(ROOT_DIR, ANALYZED_MAP)))[0])
+    granule = os.path.join(safe_dir, 'GRANULE', sorted(os.listdir(os.path.join(safe_dir, 'GRANULE')))[0])
+    found = find_band_paths(os.path.join(granule, 'IMG_DATA'), rgb_bands)
+
+    saved, skipped = tile_scene([found[band] for band in rgb_bands], 'exported_' + ANALYZED_MAP)
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Teselas guardadas: {saved}, omitidas (nodata): {skipped}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
@@ -0,0 +1,312 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from shapely import wkt
+from shapely.geometry import Polygon, box
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Resolución nativa de cada banda en productos L1C (sus IMAGE_FILE no llevan sufijo de resolución)
+NATIVE_RESOLUTION = {
+    'B01': 60, 'B02': 10, 'B03': 10, 'B04': 10, 'B05': 20, 'B06': 20, 'B07': 20,
+    'B08': 10, 'B8A': 20, 'B09': 60, 'B10': 60, 'B11': 20, 'B12': 20,
+}
+
+IMAGE_FILE_PATTERN = re.compile(r"_(?P<band>B\d[\dA]|TCI|AOT|WVP|SCL)(?:_(?P<res>\d+)m)?$")
+TILE_PATTERN = re.compile(r"_T(\d{2}[A-Z]{3})_")
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_product_metadata(mtd_path: str) -> Dict:
+    """
+    Lee en streaming solo los elementos necesarios del MTD_MSIL*.xml de un producto SAFE.
+
+    Args:
+        mtd_path (str): Ruta al MTD_MSIL2A.xml o MTD_MSIL1C.xml.
+
+    Returns:
+        Dict: Fecha de adquisición, nivel, satélite, huella WKT (lon/lat), nubosidad y archivos de imagen.
+    """
+    record = {'image_files': []}
+    for _, element in ET.iterparse(mtd_path, events=('end',)):
+        name = _local_name(element.tag)
+        if name == 'PRODUCT_START_TIME':
+            record['sensing_time'] = element.text.strip()
+        elif name == 'PROCESSING_LEVEL':
+            record['processing_level'] = element.text.strip()
+        elif name == 'SPACECRAFT_NAME':
+            record['spacecraft'] = element.text.strip()
+        elif name == 'IMAGE_FILE':
+            record['image_files'].append(element.text.strip())
+        elif name == 'EXT_POS_LIST' and 'footprint' not in record:
+            values = [float(v) for v in element.text.split()]
+            # EXT_POS_LIST viene como lat lon lat lon ...
+            record['footprint'] = Polygon(list(zip(values[1::2], values[0::2]))).wkt
+        elif name == 'Cloud_Coverage_Assessment':
+            record['cloud_cover'] = float(element.text)
+        element.clear()
+    return record
+
+
+def band_paths_from_image_files(safe_dir: str, image_files: Sequence[str]) -> Dict[str, Dict[int, str]]:
+    """
+    Convierte las entradas IMAGE_FILE en banda -> {resolución: ruta del JP2}.
+    """
+    bands: Dict[str, Dict[int, str]] = {}
+    for image_file in image_files:
+        match = IMAGE_FILE_PATTERN.search(image_file)
+        if not match:
+            continue
+        band = match.group('band')
+        resolution = int(match.group('res')) if match.group('res') else NATIVE_RESOLUTION.get(band, 10)
+        bands.setdefault(band, {})[resolution] = os.path.join(safe_dir, image_file + '.jp2')
+    return bands
+
+
+def scan_product(safe_dir: str) -> Optional[Dict]:
+    """
+    Indexa un producto SAFE (se ejecuta en paralelo, un producto por tarea).
+    """
+    mtd_files = [f for f in os.listdir(safe_dir) if f.startswith('MTD_MSIL') and f.endswith('.xml')]
+    if not mtd_files:
+        logger.warning(f"Sin MTD_MSIL*.xml en {safe_dir}")
+        return None
+    mtd_path = os.path.join(safe_dir, mtd_files[0])
+    metadata = parse_product_metadata(mtd_path)
+    product_id = os.path.basename(safe_dir.rstrip(os.sep))
+    tile = TILE_PATTERN.search(product_id)
+    return {
+        'product_id': product_id,
+        'path': os.path.abspath(safe_dir),
+        'mtd_mtime': os.path.getmtime(mtd_path),
+        'tile_id': tile.group(1) if tile else None,
+        'sensing_date': metadata.get('sensing_time', '')[:10],
+        'sensing_time': metadata.get('sensing_time'),
+        'processing_level': metadata.get('processing_level'),
+        'spacecraft': metadata.get('spacecraft'),
+        'cloud_cover': metadata.get('cloud_cover'),
+        'footprint': metadata.get('footprint'),
+        'bands': band_paths_from_image_files(safe_dir, metadata['image_files']),
+    }
+
+
+def find_safe_products(root_directory: str) -> Iterator[str]:
+    """
+    Recorre un árbol de directorios y entrega cada carpeta *.SAFE (sin descender dentro de ellas).
+    """
+    for current, dirs, _ in os.walk(root_directory):
+        safe = [d for d in dirs if d.endswith('.SAFE')]
+        for d in sorted(safe):
+            yield os.path.join(current, d)
+        dirs[:] = [d for d in dirs if not d.endswith('.SAFE')]
+
+
+class SafeCatalog:
+    """
+    Catálogo persistente (SQLite con índice R*Tree) de productos Sentinel-2 SAFE.
+
+    Permite encontrar al instante las escenas que cubren un depósito en un rango de fechas,
+    sin volver a recorrer directorios ni parsear XML.
+    """
+
+    def __init__(self, catalog_path: str):
+        self.catalog_path = catalog_path
+        self.conn = sqlite3.connect(catalog_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS products (
+                rowid INTEGER PRIMARY KEY,
+                product_id TEXT UNIQUE,
+                path TEXT,
+                mtd_mtime REAL,
+                tile_id TEXT,
+                sensing_date TEXT,
+                sensing_time TEXT,
+                processing_level TEXT,
+                spacecraft TEXT,
+                cloud_cover REAL,
+                footprint TEXT,
+                bands TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_products_date ON products (sensing_date);
+            CREATE INDEX IF NOT EXISTS idx_products_tile ON products (tile_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_rtree USING rtree (rowid, min_lon, max_lon, min_lat, max_lat);
+        """)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _indexed_mtimes(self) -> Dict[str, float]:
+        return {row['path']: row['mtd_mtime'] for row in self.conn.execute("SELECT path, mtd_mtime FROM products")}
+
+    def upsert(self, record: Dict) -> None:
+        self.conn.execute("DELETE FROM products_rtree WHERE rowid IN (SELECT rowid FROM products WHERE product_id = ?)",
+                          (record['product_id'],))
+        self.conn.execute("DELETE FROM products WHERE product_id = ?", (record['product_id'],))
+        cursor = self.conn.execute(
+            "INSERT INTO products (product_id, path, mtd_mtime, tile_id, sensing_date, sensing_time, "
+            "processing_level, spacecraft, cloud_cover, footprint, bands) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (record['product_id'], record['path'], record['mtd_mtime'], record['tile_id'], record['sensing_date'],
+             record['sensing_time'], record['processing_level'], record['spacecraft'], record['cloud_cover'],
+             record['footprint'], json.dumps(record['bands'])))
+        if record['footprint']:
+            min_lon, min_lat, max_lon, max_lat = wkt.loads(record['footprint']).bounds
+            self.conn.execute("INSERT INTO products_rtree VALUES (?, ?, ?, ?, ?)",
+                              (cursor.lastrowid, min_lon, max_lon, min_lat, max_lat))
+
+    def remove(self, paths: Sequence[str]) -> None:
+        """
+        Elimina del catálogo (tabla y R*Tree) los productos con esas rutas.
+        """
+        for path in paths:
+            self.conn.execute("DELETE FROM products_rtree WHERE rowid IN (SELECT rowid FROM products WHERE path = ?)",
+                              (path,))
+            self.conn.execute("DELETE FROM products WHERE path = ?", (path,))
+
+    def scan(self, root_directory: str, max_workers: Optional[int] = None) -> int:
+        """
+        Indexa (en paralelo) los productos nuevos o modificados bajo root_directory y elimina los
+        productos de ese árbol que ya no están (borrados, movidos o sin MTD_MSIL*.xml).
+
+        Returns:
+            int: Número de productos indexados en esta pasada.
+        """
+        indexed = self._indexed_mtimes()
+        pending, present = [], set()
+        for safe_dir in find_safe_products(root_directory):
+            path = os.path.abspath(safe_dir)
+            mtd = [f for f in os.listdir(safe_dir) if f.startswith('MTD_MSIL') and f.endswith('.xml')]
+            if mtd:
+                present.add(path)
+            if mtd and indexed.get(path) == os.path.getmtime(os.path.join(safe_dir, mtd[0])):
+                continue
+            pending.append(safe_dir)
+
+        # Solo se eliminan productos bajo root_directory: el catálogo puede reunir varios árboles
+        root = os.path.abspath(root_directory)
+        missing = [path for path in indexed
+                   if (path == root or path.startswith(root + os.sep)) and path not in present]
+        self.remove(missing)
+        logger.info(f"{len(pending)} productos nuevos o modificados por indexar, {len(missing)} eliminados del catálogo")
+
+        count = 0
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(scan_product, safe_dir): safe_dir for safe_dir in pending}
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    logger.error(f"Error al indexar {futures[future]}: {str(e)}")
+                    continue
+                if record:
+                    self.upsert(record)
+                    count += 1
+        self.conn.commit()
+        return count
+
+    def query(
+        self,
+        geometry=None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_cloud_cover: Optional[float] = None,
+        tile_id: Optional[str] = None,
+        processing_level: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Busca productos por geometría (lon/lat), fechas, nubosidad, tile y nivel de procesamiento.
+
+        Args:
+            geometry: Geometría shapely en WGS84 o tupla (lon_min, lat_min, lon_max, lat_max).
+            start_date (Optional[str]): Fecha mínima (ISO).
+            end_date (Optional[str]): Fecha máxima (ISO).
+            max_cloud_cover (Optional[float]): Nubosidad máxima en porcentaje.
+            tile_id (Optional[str]): Tile MGRS, por ejemplo '19HBE'.
+            processing_level (Optional[str]): Por ejemplo 'Level-2A'.
+
+        Returns:
+            List[Dict]: Productos ordenados por fecha, con `bands` como diccionario.
+        """
+        if geometry is not None and not hasattr(geometry, 'bounds'):
+            geometry = box(*geometry)
+
+        sql = "SELECT p.* FROM products p"
+        conditions, params = [], []
+        if geometry is not None:
+            min_lon, min_lat, max_lon, max_lat = geometry.bounds
+            sql += " JOIN products_rtree r ON r.rowid = p.rowid"
+            conditions += ["r.max_lon >= ?", "r.min_lon <= ?", "r.max_lat >= ?", "r.min_lat <= ?"]
+            params += [min_lon, max_lon, min_lat, max_lat]
+        if start_date:
+            conditions.append("p.sensing_date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("p.sensing_date <= ?")
+            params.append(end_date)
+        if max_cloud_cover is not None:
+            conditions.append("p.cloud_cover <= ?")
+            params.append(max_cloud_cover)
+        if tile_id:
+            conditions.append("p.tile_id = ?")
+            params.append(tile_id)
+        if processing_level:
+            conditions.append("p.processing_level = ?")
+            params.append(processing_level)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY p.sensing_time"
+
+        results = []
+        for row in self.conn.execute(sql, params):
+            record = dict(row)
+            # Filtro exacto sobre la huella tras el filtro por bbox del R*Tree
+            if geometry is not None and record['footprint'] and not wkt.loads(record['footprint']).intersects(geometry):
+                continue
+            record['bands'] = {band: {int(res): path for res, path in paths.items()}
+                               for band, paths in json.loads(record['bands']).items()}
+            results.append(record)
+        return results
+
+
+def best_band_paths(record: Dict, bands: Sequence[str]) -> Dict[str, str]:
+    """
+    Para cada banda pedida, la ruta del JP2 con la mejor resolución disponible.
+    """
+    return {band: record['bands'][band][min(record['bands'][band])] for band in bands if band in record['bands']}
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Sentinel_SafeCatalog`)
+if __name__ == "__main__":
+    import geopandas as gpd
+
+    start_time = time.time()
+
+    # Configuración
+    root_directory = "/media/manuel/BE8A98BF8A98759D/Minera_LasCenizas"
+    catalog_path = "/media/manuel/BE8A98BF8A98759D/Minera_LasCenizas/safe_catalog.sqlite"
+    polygon_file = 'minera_lascenizas.geojson'
+
+    catalog = SafeCatalog(catalog_path)
+    indexed = catalog.scan(root_directory)
+
+    deposit = gpd.read_file(polygon_file).to_crs("EPSG:4326").geometry.unary_union
+    products = catalog.query(deposit, start_date='2018-01-01', max_cloud_cover=20)
+    for product in products:
+        logger.info(f"{product['sensing_date']} {product['tile_id']} nubes={product['cloud_cover']}% {product['path']}")
+    catalog.close()
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Productos indexados en esta pasada: {indexed}; escenas que cubren el depósito: {len(products)}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
@@ -0,0 +1,341 @@
+import os
+import re
+import csv
+import json
+import time
+import heapq
+import shutil
+import hashlib
+import logging
+import argparse
+import itertools
+import contextlib
+import subprocess
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import geopandas as gpd
+import fiona
+import shapely
+import pyarrow.parquet as pq
+from pyproj import CRS
+
+from utils.Vector_StreamWriter import FLUSH_SIZE, SINKS, LayerChunker, make_sink
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SHARD_PATTERN = re.compile(r"^(\d+)/(\d+)$")
+
+Shard = Tuple[int, int]
+
+
+def parse_shard(value: str) -> Shard:
+    """
+    Interpreta '--shard i/N' (0 <= i < N).
+    """
+    match = SHARD_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Formato de shard inválido: {value!r} (se espera i/N)")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard fuera de rango: {value!r}")
+    return index, count
+
+
+def shard_of(key, count: int) -> int:
+    """
+    Shard de una clave según un hash estable (igual en cualquier máquina y versión de Python,
+    a diferencia de `hash()`).
+    """
+    digest = hashlib.sha1(str(key).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+
+def select_shard(keys: Iterable, shard: Shard) -> List:
+    """
+    Claves que le corresponden al shard, en su orden original.
+    """
+    index, count = shard
+    return [key for key in keys if shard_of(key, count) == index]
+
+
+def stable_id(*parts) -> str:
+    """
+    Identificador determinista (reemplazo de uuid4): el mismo en cada ejecución y en cada nodo.
+    """
+    return hashlib.sha1('/'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+
+
+def partial_path(output_path: str, shard: Shard) -> str:
+    """
+    Ruta de la salida parcial de un shard: 'x.gpkg' -> 'x.shard-0-of-4.gpkg'; 'dir' -> 'dir.shard-0-of-4'.
+    """
+    index, count = shard
+    root, extension = os.path.splitext(output_path.rstrip(os.sep))
+    return f"{root}.shard-{index}-of-{count}{extension}"
+
+
+def all_partials(output_path: str, count: int) -> List[str]:
+    """
+    Rutas de las salidas parciales de los N shards; error si falta alguna.
+    """
+    paths = [partial_path(output_path, (index, count)) for index in range(count)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Faltan salidas parciales: {', '.join(missing)}")
+    return paths
+
+
+def shard_argument_parser(description: str) -> argparse.ArgumentParser:
+    """
+    Parser común de los exportadores con la opción --shard.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--shard', type=parse_shard, default=(0, 1),
+                        help="Procesar solo la partición i de N de las imágenes (por defecto 0/1: todas)")
+    return parser
+
+
+def natural_key(value) -> Tuple:
+    """
+    Clave de orden natural: 'uniqueID12_annotationID3' -> ('uniqueID', 12, '_annotationID', 3, ''),
+    de modo que los números dentro del texto se comparan como números.
+    """
+    parts = re.split(r'(\d+)', str(value))
+    return tuple(int(part) if i % 2 else part for i, part in enumerate(parts))
+
+
+def _replace(source: str, output_path: str) -> None:
+    if os.path.isdir(output_path):
+        shutil.rmtree(output_path)
+    elif os.path.exists(output_path):
+        os.remove(output_path)
+    os.replace(source, output_path)
+
+
+def _vector_layers(path: str, driver: str) -> List[str]:
+    if driver == 'GPKG':
+        return fiona.listlayers(path)
+    extension = SINKS[driver].extension
+    return sorted(f[:-len(extension)] for f in os.listdir(path) if f.endswith(extension))
+
+
+def _read_vector_chunks(path: str, driver: str, layer: str, chunk_size: int) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Lee una capa parcial por bloques de `chunk_size` filas, en el orden en que fue escrita.
+    """
+    if driver == 'Parquet':
+        parquet = pq.ParquetFile(os.path.join(path, f"{layer}{SINKS[driver].extension}"))
+        crs = CRS.from_json_dict(json.loads(parquet.metadata.metadata[b'geo'])['columns']['geometry']['crs'])
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            df = batch.to_pandas()
+            geometry = shapely.from_wkb(df.pop('geometry').to_numpy())
+            yield gpd.GeoDataFrame(df.drop(columns='bbox'), geometry=geometry, crs=crs)
+        return
+    file_path = path if driver == 'GPKG' else os.path.join(path, f"{layer}{SINKS[driver].extension}")
+    with fiona.open(file_path, layer=layer if driver == 'GPKG' else None) as src:
+        columns = list(src.schema['properties'])
+        records = iter(src)
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                return
+            yield gpd.GeoDataFrame.from_features(chunk, crs=src.crs, columns=[*columns, 'geometry'])
+
+
+def _keyed_rows(chunks: Iterable[pd.DataFrame], sort_by: Sequence[str], source: str) -> Iterator[Tuple]:
+    """
+    Recorre las filas de una salida parcial como (clave, bloque, posición) y verifica que vengan ordenadas.
+    """
+    previous = None
+    for chunk in chunks:
+        columns = [column for column in sort_by if column in chunk.columns]
+        keys = zip(*(map(natural_key, chunk[column]) for column in columns)) if columns else [()] * len(chunk)
+        for position, key in enumerate(keys):
+            if previous is not None and key < previous:
+                raise ValueError(f"{source} no está ordenada por {', '.join(columns)}")
+            previous = key
+            yield key, chunk, position
+
+
+def merge_vector(partials: Sequence[str], output_path: str, driver: str = 'GPKG',
+                 sort_by: Sequence[str] = ('id',), chunk_size: int = FLUSH_SIZE) -> int:
+    """
+    Une las salidas vectoriales parciales (GPKG, GeoParquet o FlatGeobuf) capa por capa.
+
+    Cada parcial debe estar escrita en orden natural por `sort_by` y sin orden espacial
+    (`spatial_order=False`); la unión es un merge de k vías que lee y escribe por bloques de
+    `chunk_size` filas, así que la memoria no depende del tamaño de las capas. El destino recibe los
+    mismos bloques que en una ejecución de un solo nodo con el mismo `chunk_size`.
+
+    Returns:
+        int: Número de geometrías escritas.
+    """
+    layers = sorted({layer for path in partials for layer in _vector_layers(path, driver)})
+    chunker = LayerChunker(make_sink(driver, output_path), chunk_size)
+    for layer in layers:
+        streams = [_keyed_rows(_read_vector_chunks(path, driver, layer, chunk_size), sort_by, f"{path}:{layer}")
+                   for path in partials if layer in _vector_layers(path, driver)]
+        pieces, pending = [], 0
+        run_chunk, run_rows = None, []
+        for _, chunk, position in heapq.merge(*streams, key=itemgetter(0)):
+            if chunk is not run_chunk:
+                if run_rows:
+                    pieces.append(run_chunk.iloc[run_rows])
+                run_chunk, run_rows = chunk, []
+            run_rows.append(position)
+            pending += 1
+            if pending >= chunk_size:
+                pieces.append(run_chunk.iloc[run_rows])
+                chunker.add(layer, pd.concat(pieces, ignore_index=True))
+                pieces, pending, run_rows = [], 0, []
+        if run_rows:
+            pieces.append(run_chunk.iloc[run_rows])
+        if pieces:
+            chunker.add(layer, pd.concat(pieces, ignore_index=True))
+    chunker.close()
+    return chunker.written
+
+
+def _line_terminator(path: str) -> str:
+    with open(path, 'rb') as f:
+        return '\r\n' if f.readline().endswith(b'\r\n') else '\n'
+
+
+def merge_csv(partials: Sequence[str], output_path: str) -> int:
+    """
+    Une CSV parciales con el mismo encabezado, cada uno ordenado por sus filas como texto. Se leen
+    fila a fila (merge de k vías), así que el resultado es idéntico byte a byte al de un solo nodo.
+
+    Returns:
+        int: Número de filas escritas.
+    """
+    total = 0
+    with contextlib.ExitStack() as stack:
+        readers = [csv.reader(stack.enter_context(open(path, newline=''))) for path in partials]
+        headers = [next(reader, None) for reader in readers]
+        if any(header != headers[0] for header in headers):
+            raise ValueError("Los CSV parciales no tienen el mismo encabezado")
+        output = stack.enter_context(open(output_path, 'w', newline=''))
+        writer = csv.writer(output, lineterminator=_line_terminator(partials[0]))
+        writer.writerow(headers[0])
+        previous = [None] * len(partials)
+
+        def checked(index, reader):
+            for row in reader:
+                if previous[index] is not None and row < previous[index]:
+                    raise ValueError(f"{partials[index]} no está ordenado")
+                previous[index] = row
+                yield row
+
+        for row in heapq.merge(*(checked(index, reader) for index, reader in enumerate(readers))):
+            writer.writerow(row)
+            total += 1
+    return total
+
+
+def merge_directories(partials: Sequence[str], output_directory: str, csv_files: Sequence[str] = ()) -> int:
+    """
+    Mueve los archivos de los directorios parciales al directorio final, que se vacía antes. Los
+    shards no deben repetir rutas, salvo los CSV de `csv_files` (relativos), que se unen con `merge_csv`.
+
+    Returns:
+        int: Número de archivos movidos.
+    """
+    if os.path.exists(output_directory):
+        shutil.rmtree(output_directory)
+    os.makedirs(output_directory)
+    csv_files = {os.path.normpath(name) for name in csv_files}
+    total = 0
+    for partial in partials:
+        for root, _, files in os.walk(partial):
+            relative_root = os.path.relpath(root, partial)
+            os.makedirs(os.path.join(output_directory, relative_root), exist_ok=True)
+            for name in files:
+                relative = os.path.normpath(os.path.join(relative_root, name))
+                if relative in csv_files:
+                    continue
+                target = os.path.join(output_directory, relative)
+                if os.path.exists(target):
+                    raise FileExistsError(f"{relative} aparece en más de un shard")
+                shutil.move(os.path.join(root, name), target)
+                total += 1
+    for name in sorted(csv_files):
+        parts = [os.path.join(partial, name) for partial in partials if os.path.exists(os.path.join(partial, name))]
+        if parts:
+            merge_csv(parts, os.path.join(output_directory, name))
+    return total
+
+
+def finalize(partials: Sequence[str], output_path: str, kind: str, sort_by: Optional[Sequence[str]] = None,
+             csv_files: Sequence[str] = (), chunk_size: int = FLUSH_SIZE) -> None:
+    """
+    Arma la salida final a partir de las salidas parciales y elimina las parciales.
+
+    Con un solo shard la parcial ya es la salida final (mismo orden y mismos bloques) y solo se
+    renombra; con varios se unen en streaming.
+
+    Args:
+        partials (Sequence[str]): Salidas parciales de todos los shards.
+        output_path (str): Salida final (se reemplaza si existe).
+        kind (str): 'CSV', 'DIR' o un formato vectorial ('GPKG', 'Parquet', 'FlatGeobuf').
+        sort_by (Optional[Sequence[str]]): Columnas del orden de las salidas vectoriales.
+        csv_files (Sequence[str]): CSV a unir dentro de los directorios ('DIR').
+        chunk_size (int): Filas por escritura de las salidas vectoriales (el `flush_size` de los shards).
+    """
+    if len(partials) == 1:
+        _replace(partials[0], output_path)
+        logger.info(f"Salida parcial renombrada a {output_path}")
+        return
+    if kind == 'CSV':
+        total = merge_csv(partials, output_path)
+    elif kind == 'DIR':
+        total = merge_directories(partials, output_path, csv_files)
+    else:
+        total = merge_vector(partials, output_path, kind, sort_by or ('id',), chunk_size)
+    for path in partials:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    logger.info(f"{len(partials)} salidas parciales unidas en {output_path} ({total} filas o archivos)")
+
+
+def run_local_shards(command: Sequence[str], count: int) -> None:
+    """
+    Ejecuta N shards como procesos locales (`command --shard i/N`) y espera a que terminen todos.
+    Sirve para probar en una sola máquina que la unión reproduce la ejecución de un solo nodo.
+    """
+    processes = [subprocess.Popen(list(command) + ['--shard', f"{index}/{count}"]) for index in range(count)]
+    failed = [index for index, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        raise RuntimeError(f"Fallaron los shards {failed}")
+
+
+# Uso del script (ejecutar desde la raíz del repositorio):
+#   python -m utils.Shard_Runner run --shards 4 --output salida.gpkg --kind GPKG -- python generate_grouped_geopackage_coco.py
+#   python -m utils.Shard_Runner merge --shards 4 --output salida.gpkg --kind GPKG
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecución por shards y unión determinista de salidas")
+    parser.add_argument('action', choices=['run', 'merge'])
+    parser.add_argument('--shards', type=int, required=True, help="Número de shards N")
+    parser.add_argument('--output', required=True, help="Salida final (las parciales se derivan de ella)")
+    parser.add_argument('--kind', default='GPKG', choices=['CSV', 'DIR', *SINKS], help="Tipo de salida")
+    parser.add_argument('--sort-by', nargs='*', default=None, help="Columnas del orden de las salidas vectoriales")
+    parser.add_argument('--csv-files', nargs='*', default=(), help="CSV a unir dentro de los directorios (DIR)")
+    parser.add_argument('command', nargs=argparse.REMAINDER, help="Comando del exportador (tras --)")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.action == 'run':
+        command = args.command[1:] if args.command[:1] == ['--'] else args.command
+        if not command:
+            parser.error("Falta el comando del exportador")
+        run_local_shards(command, args.shards)
+    finalize(all_partials(args.output, args.shards), args.output, args.kind, args.sort_by, args.csv_files)
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
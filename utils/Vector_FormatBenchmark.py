@@ -0,0 +1,130 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from utils.Vector_StreamWriter import SINKS, make_sink
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LAYER = 'benchmark'
+
+
+def synthetic_annotations(n: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """
+    Polígonos de prueba con el esquema de los exportadores (id/class/filename/year/color) repartidos sobre Chile.
+    """
+    rng = np.random.default_rng(seed)
+    lon, lat = rng.uniform(-72, -68, n), rng.uniform(-30, -18, n)
+    # Polígonos irregulares de ~20 vértices y unos cientos de metros
+    angles = np.sort(rng.uniform(0, 2 * np.pi, (n, 20)), axis=1)
+    radius = rng.uniform(0.001, 0.004, (n, 1)) * rng.uniform(0.7, 1.0, (n, 20))
+    coords = np.stack([lon[:, None] + radius * np.cos(angles), lat[:, None] + radius * np.sin(angles)], axis=-1)
+    polygons = shapely.polygons(coords)
+    classes = rng.choice(['bem', 'ripio', 'tranque'], n)
+    return gpd.GeoDataFrame({
+        'id': [f"uniqueID{i // 4}_annotationID{i}" for i in range(n)],
+        'class': classes,
+        'filename': [f"[{a:.4f}, {b:.4f}, {a + 0.05:.4f}, {b + 0.05:.4f}] - ('2018-01-01', '2018-12-31') - img.png"
+                     for a, b in zip(lon, lat)],
+        'year': '2018',
+        'color': pd.Series(classes).map({'bem': '#FF0000', 'ripio': '#00FF00', 'tranque': '#0000FF'}).to_numpy(),
+    }, geometry=polygons, crs="EPSG:4326")
+
+
+def _size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def _read(driver: str, path: str, bbox: Optional[tuple] = None) -> gpd.GeoDataFrame:
+    if driver == 'GPKG':
+        return gpd.read_file(path, layer=LAYER, bbox=bbox)
+    if driver == 'Parquet':
+        return gpd.read_parquet(os.path.join(path, f"{LAYER}.parquet"), bbox=bbox)
+    return gpd.read_file(os.path.join(path, f"{LAYER}.fgb"), bbox=bbox)
+
+
+def benchmark(gdf: gpd.GeoDataFrame, chunk_size: int = 10000, drivers: Optional[List[str]] = None,
+              workdir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Compara escritura en streaming (por lotes de `chunk_size`, como el proceso escritor), lectura
+    completa, lectura por caja y tamaño en disco de cada formato.
+
+    Si no se indica `workdir` se usa un directorio temporal que se borra al terminar; un `workdir`
+    del llamador se conserva con las salidas de cada formato.
+
+    Returns:
+        pd.DataFrame: Por formato, segundos de escritura y lectura, features/s y MB.
+    """
+    drivers = drivers or list(SINKS)
+    temporary = workdir is None
+    if temporary:
+        workdir = tempfile.mkdtemp(prefix='vector_benchmark_')
+    minx, miny, maxx, maxy = gdf.total_bounds
+    # Caja de consulta: ~1 % del área total
+    query_bbox = (minx, miny, minx + (maxx - minx) * 0.1, miny + (maxy - miny) * 0.1)
+
+    rows: List[Dict] = []
+    try:
+        for driver in drivers:
+            path = os.path.join(workdir, 'output.gpkg' if driver == 'GPKG' else driver.lower())
+            t0 = time.perf_counter()
+            sink = make_sink(driver, path, crs=str(gdf.crs))
+            for start in range(0, len(gdf), chunk_size):
+                sink.write(LAYER, gdf.iloc[start:start + chunk_size])
+            sink.close()
+            write_seconds = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            n_read = len(_read(driver, path))
+            read_seconds = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            n_bbox = len(_read(driver, path, query_bbox))
+            bbox_seconds = time.perf_counter() - t0
+
+            rows.append({
+                'driver': driver,
+                'features': n_read,
+                'write_s': write_seconds,
+                'write_features_s': len(gdf) / write_seconds,
+                'read_s': read_seconds,
+                'read_features_s': n_read / read_seconds,
+                'bbox_read_s': bbox_seconds,
+                'bbox_features': n_bbox,
+                'size_mb': _size(path) / 1024 ** 2,
+            })
+            logger.info(f"{driver}: escritura {write_seconds:.2f} s, lectura {read_seconds:.2f} s, "
+                        f"{rows[-1]['size_mb']:.1f} MB")
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return pd.DataFrame(rows)
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Vector_FormatBenchmark`)
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración: una capa real (p. ej. de labeledMasks_grouped.gpkg) o datos sintéticos
+    input_file = None
+    input_layer = 'tranque_2018'
+    n_synthetic = 200000
+
+    gdf = gpd.read_file(input_file, layer=input_layer) if input_file else synthetic_annotations(n_synthetic)
+    results = benchmark(gdf)
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info("\n" + results.to_string(index=False))
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
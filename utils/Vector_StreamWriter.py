@@ -0,0 +1,452 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait as wait_connections
+from typing import Dict, List, Optional, Sequence
+
+import fiona
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from pyproj import CRS
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Cola del proceso escritor y aviso de que terminó con error, en cada worker (se asignan con `init_worker`)
+_channel: Optional[mp.Queue] = None
+_writer_failed = None
+
+# Segundos entre intentos de envío a una cola llena, para revisar si el escritor sigue vivo
+SEND_TIMEOUT = 1.0
+
+# Filas por escritura en el destino (por capa)
+FLUSH_SIZE = 10000
+
+
+def encode_batch(layers: Sequence[str], geometries: Sequence, attributes: pd.DataFrame,
+                 seq: Optional[int] = None) -> Dict:
+    """
+    Empaqueta un lote de geometrías en forma compacta para enviarlo entre procesos: WKB en vez de
+    objetos shapely y columnas en vez de un diccionario por fila. `seq` es la posición del lote
+    cuando el escritor es ordenado (un lote vacío también cuenta).
+    """
+    return {
+        'seq': seq,
+        'layer': np.asarray(layers, dtype=object),
+        'wkb': shapely.to_wkb(np.asarray(geometries, dtype=object)),
+        'columns': {name: attributes[name].to_numpy() for name in attributes.columns},
+    }
+
+
+def decode_batch(batch: Dict, crs: str) -> gpd.GeoDataFrame:
+    """
+    Reconstruye un GeoDataFrame (con la columna 'layer') a partir de un lote de `encode_batch`.
+    """
+    gdf = gpd.GeoDataFrame(batch['columns'], geometry=shapely.from_wkb(batch['wkb']), crs=crs)
+    gdf['layer'] = batch['layer']
+    return gdf
+
+
+class GeoPackageSink:
+    """
+    Destino GeoPackage: una capa por nombre, escrita en modo append.
+    """
+
+    def __init__(self, output_file: str, crs: str = "EPSG:4326", spatial_order: bool = True):
+        self.output_file = output_file
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+
+    def write(self, layer: str, gdf: gpd.GeoDataFrame) -> None:
+        gdf.to_file(self.output_file, layer=layer, driver="GPKG", mode='a')
+
+    def close(self) -> None:
+        pass
+
+
+class GeoParquetSink:
+    """
+    Destino GeoParquet: un archivo por capa en el directorio de salida, escrito por grupos de filas
+    con `pyarrow.parquet.ParquetWriter` (sin cargar la capa completa).
+
+    Cada lote se ordena por la curva de Hilbert antes de escribirse y lleva la columna `bbox`
+    (xmin, ymin, xmax, ymax) declarada como covering en los metadatos GeoParquet 1.1, de modo que
+    los lectores (GDAL, DuckDB) pueden descartar grupos de filas por estadísticas sin leer geometrías.
+    Con `spatial_order=False` se conserva el orden de llegada (salidas parciales que luego se unen).
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, output_directory: str, crs: str = "EPSG:4326", row_group_size: int = 65536,
+                 spatial_order: bool = True):
+        self.output_directory = output_directory
+        self.crs = crs
+        self.row_group_size = row_group_size
+        self.spatial_order = spatial_order
+        self._writers: Dict[str, pq.ParquetWriter] = {}
+        self._geometry_types: Dict[str, set] = {}
+        self._bounds: Dict[str, np.ndarray] = {}
+        os.makedirs(output_directory, exist_ok=True)
+        for filename in os.listdir(output_directory):
+            if filename.endswith(self.extension):
+                os.remove(os.path.join(output_directory, filename))
+
+    def _geo_metadata(self, layer: str) -> Dict:
+        return {
+            'version': '1.1.0',
+            'primary_column': 'geometry',
+            'columns': {'geometry': {
+                'encoding': 'WKB',
+                'geometry_types': sorted(self._geometry_types.get(layer, ())),
+                'crs': CRS.from_user_input(self.crs).to_json_dict(),
+                'bbox': self._bounds[layer].tolist() if layer in self._bounds else [],
+                'covering': {'bbox': {key: ['bbox', key] for key in ('xmin', 'ymin', 'xmax', 'ymax')}},
+            }},
+        }
+
+    def write(self, layer: str, gdf: gpd.GeoDataFrame) -> None:
+        if gdf.empty:
+            return
+        if self.spatial_order:
+            gdf = gdf.iloc[np.argsort(gdf.geometry.hilbert_distance(), kind='stable')]
+        geometries = gdf.geometry.to_numpy()
+        bounds = shapely.bounds(geometries)
+        attributes = pd.DataFrame(gdf.drop(columns=gdf.geometry.name)).reset_index(drop=True)
+        table = pa.Table.from_pandas(attributes, preserve_index=False)
+        table = table.append_column('geometry', pa.array(shapely.to_wkb(geometries), type=pa.binary()))
+        table = table.append_column('bbox', pa.StructArray.from_arrays(
+            [pa.array(bounds[:, i]) for i in range(4)], names=['xmin', 'ymin', 'xmax', 'ymax']))
+
+        self._geometry_types.setdefault(layer, set()).update(shapely.get_type_id(geometries).tolist())
+        extent = np.array([*np.nanmin(bounds[:, :2], axis=0), *np.nanmax(bounds[:, 2:], axis=0)])
+        if layer in self._bounds:
+            previous = self._bounds[layer]
+            extent = np.array([*np.minimum(previous[:2], extent[:2]), *np.maximum(previous[2:], extent[2:])])
+        self._bounds[layer] = extent
+
+        if layer not in self._writers:
+            path = os.path.join(self.output_directory, f"{layer}{self.extension}")
+            self._writers[layer] = pq.ParquetWriter(path, table.schema, compression='zstd',
+                                                    write_statistics=True)
+        self._writers[layer].write_table(table, row_group_size=self.row_group_size)
+
+    def close(self) -> None:
+        names = {0: 'Point', 1: 'LineString', 3: 'Polygon', 4: 'MultiPoint', 5: 'MultiLineString',
+                 6: 'MultiPolygon', 7: 'GeometryCollection'}
+        for layer, writer in self._writers.items():
+            # Los metadatos 'geo' (tipos y extensión) solo se conocen al final: se agregan al pie del archivo
+            self._geometry_types[layer] = {names.get(t, 'Unknown') for t in self._geometry_types[layer]}
+            writer.add_key_value_metadata({'geo': json.dumps(self._geo_metadata(layer))})
+            writer.close()
+        self._writers.clear()
+
+
+class FlatGeobufSink:
+    """
+    Destino FlatGeobuf: un archivo por capa, cada uno abierto una sola vez durante toda la escritura.
+    GDAL escribe los registros a medida que llegan y al cerrar construye el índice R-tree empaquetado
+    por curva de Hilbert (SPATIAL_INDEX=YES), lo que reordena los registros; con `spatial_order=False`
+    no hay índice y se conserva el orden de llegada.
+    """
+
+    extension = '.fgb'
+
+    def __init__(self, output_directory: str, crs: str = "EPSG:4326", spatial_order: bool = True):
+        self.output_directory = output_directory
+        self.crs = crs
+        self.spatial_order = spatial_order
+        self._collections: Dict[str, fiona.Collection] = {}
+        os.makedirs(output_directory, exist_ok=True)
+        for filename in os.listdir(output_directory):
+            if filename.endswith(self.extension):
+                os.remove(os.path.join(output_directory, filename))
+
+    @staticmethod
+    def _schema(gdf: gpd.GeoDataFrame) -> Dict:
+        types = {'f': 'float', 'i': 'int', 'u': 'int', 'b': 'bool'}
+        properties = {name: types.get(dtype.kind, 'str')
+                      for name, dtype in gdf.drop(columns=gdf.geometry.name).dtypes.items()}
+        return {'geometry': 'Unknown', 'properties': properties}
+
+    def write(self, layer: str, gdf: gpd.GeoDataFrame) -> None:
+        if gdf.empty:
+            return
+        if layer not in self._collections:
+            path = os.path.join(self.output_directory, f"{layer}{self.extension}")
+            self._collections[layer] = fiona.open(path, 'w', driver='FlatGeobuf', schema=self._schema(gdf),
+                                                  crs=self.crs,
+                                                  SPATIAL_INDEX='YES' if self.spatial_order else 'NO')
+        collection = self._collections[layer]
+        columns = list(collection.schema['properties'])
+        geometries = shapely.to_geojson(gdf.geometry.to_numpy())
+        values = gdf[columns].astype(object).where(gdf[columns].notna(), None).to_numpy()
+        collection.writerecords(
+            {'geometry': json.loads(geometry), 'properties': dict(zip(columns, row))}
+            for geometry, row in zip(geometries, values)
+        )
+
+    def close(self) -> None:
+        for collection in self._collections.values():
+            collection.close()
+        self._collections.clear()
+
+
+# Formatos de salida disponibles: driver -> clase del destino
+SINKS = {
+    'GPKG': GeoPackageSink,
+    'Parquet': GeoParquetSink,
+    'FlatGeobuf': FlatGeobufSink,
+}
+
+
+def make_sink(driver: str, output_path: str, crs: str = "EPSG:4326", spatial_order: bool = True):
+    """
+    Crea el destino de un formato. GPKG escribe un archivo con una capa por nombre; Parquet y
+    FlatGeobuf, un archivo por capa dentro del directorio `output_path`.
+    """
+    if driver not in SINKS:
+        raise ValueError(f"Formato no soportado: {driver} (opciones: {', '.join(SINKS)})")
+    return SINKS[driver](output_path, crs=crs, spatial_order=spatial_order)
+
+
+class LayerChunker:
+    """
+    Acumula filas por capa y las entrega al destino en bloques de exactamente `chunk_size` filas
+    (al cerrar, el resto de cada capa). Con las mismas filas en el mismo orden el destino recibe
+    siempre las mismas escrituras, sin importar cómo venían agrupadas los lotes.
+    """
+
+    def __init__(self, sink, chunk_size: int = FLUSH_SIZE):
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.written = 0
+        self._buffers: Dict[str, List[gpd.GeoDataFrame]] = {}
+        self._counts: Dict[str, int] = {}
+
+    def _write(self, layer: str, gdf: gpd.GeoDataFrame) -> None:
+        self.sink.write(layer, gdf.reset_index(drop=True))
+        self.written += len(gdf)
+
+    def add(self, layer: str, gdf: gpd.GeoDataFrame) -> None:
+        if gdf.empty:
+            return
+        parts = self._buffers.setdefault(layer, [])
+        parts.append(gdf)
+        self._counts[layer] = self._counts.get(layer, 0) + len(gdf)
+        if self._counts[layer] < self.chunk_size:
+            return
+        merged = pd.concat(parts, ignore_index=True)
+        full = len(merged) - len(merged) % self.chunk_size
+        for start in range(0, full, self.chunk_size):
+            self._write(layer, merged.iloc[start:start + self.chunk_size])
+        self._buffers[layer] = [merged.iloc[full:]] if full < len(merged) else []
+        self._counts[layer] = len(merged) - full
+
+    def close(self) -> None:
+        for layer in sorted(self._buffers):
+            parts = self._buffers[layer]
+            if parts:
+                self._write(layer, pd.concat(parts, ignore_index=True))
+        self._buffers.clear()
+        self._counts.clear()
+        self.sink.close()
+
+
+def _writer_main(channel: mp.Queue, output_file: str, driver: str, crs: str, flush_size: int, written,
+                 ordered: bool, spatial_order: bool, errors) -> None:
+    """
+    Proceso escritor: consume lotes de la cola y los escribe por capa en bloques de `flush_size`
+    filas para no abrir el archivo por cada imagen. Termina al recibir None; si falla, envía la traza
+    por `errors` antes de terminar con código distinto de 0.
+
+    Si `ordered`, los lotes se escriben en el orden de su `seq` (0, 1, 2, ...) aunque lleguen
+    desordenados: los que se adelantan esperan en memoria hasta que llega el que falta.
+    """
+    try:
+        chunker = LayerChunker(make_sink(driver, output_file, crs, spatial_order), flush_size)
+        early: Dict[int, Dict] = {}
+        next_seq = 0
+
+        def consume(batch):
+            gdf = decode_batch(batch, crs)
+            for layer, part in gdf.groupby('layer', sort=False):
+                chunker.add(layer, part.drop(columns='layer'))
+            written.value = chunker.written
+
+        while True:
+            batch = channel.get()
+            if batch is None:
+                break
+            if not ordered:
+                consume(batch)
+                continue
+            early[batch['seq']] = batch
+            while next_seq in early:
+                consume(early.pop(next_seq))
+                next_seq += 1
+        if early:
+            raise RuntimeError(f"Falta el lote {next_seq}; quedaron {len(early)} lotes sin escribir")
+        chunker.close()
+        written.value = chunker.written
+    except BaseException:
+        # Se recorta para que quepa en el buffer del pipe (el padre lo lee después de join)
+        errors.send(traceback.format_exc()[-8000:])
+        raise
+
+
+class StreamingVectorWriter:
+    """
+    Canal de resultados entre workers de cómputo y un proceso escritor dedicado.
+
+    Los workers envían lotes compactos (`encode_batch`) por una cola acotada y el escritor los
+    escribe mientras el cómputo continúa. La cola acotada frena a los workers si la escritura se
+    atrasa, así que la memoria se mantiene plana y el tiempo total tiende a max(cómputo, escritura).
+
+    Con `ordered=True` la salida no depende del orden en que terminan los workers: cada tarea envía
+    exactamente un lote (vacío si no tiene resultados) con su posición `seq`, y quien envía las tareas
+    limita cuántas hay en curso para que los lotes adelantados no se acumulen en el escritor.
+
+    Si el escritor muere (disco lleno, error del driver), un hilo vigía marca `failed`: los workers
+    dejan de esperar en la cola llena y fallan, y al salir del bloque se relanza el error del escritor.
+
+    Uso:
+        with StreamingVectorWriter(output_file) as writer:
+            with ProcessPoolExecutor(initializer=init_worker, initargs=(writer.queue, writer.failed)) as executor:
+                ...  # los workers llaman a send_batch(encode_batch(...))
+    """
+
+    def __init__(self, output_file: str, driver: str = "GPKG", crs: str = "EPSG:4326", max_pending: int = 64,
+                 flush_size: int = FLUSH_SIZE, ordered: bool = False, spatial_order: bool = True):
+        """
+        Args:
+            output_file (str): GeoPackage de salida (se reemplaza si existe), o directorio para
+                los formatos de una capa por archivo.
+            driver (str): 'GPKG', 'Parquet' (GeoParquet) o 'FlatGeobuf'.
+            crs (str): CRS de las geometrías.
+            max_pending (int): Lotes máximos en la cola antes de bloquear a los workers.
+            flush_size (int): Filas acumuladas por capa antes de escribir.
+            ordered (bool): Escribir los lotes en el orden de su `seq`.
+            spatial_order (bool): Orden espacial del destino (Hilbert en Parquet, índice en FlatGeobuf);
+                desactivarlo conserva el orden de escritura.
+        """
+        if driver not in SINKS:
+            raise ValueError(f"Formato no soportado: {driver} (opciones: {', '.join(SINKS)})")
+        self.output_file = output_file
+        self.queue = mp.Queue(maxsize=max_pending)
+        self.failed = mp.Event()
+        self._written = mp.Value('q', 0)
+        self._errors, errors = mp.Pipe(duplex=False)
+        self._closing = False
+        self._process = mp.Process(target=_writer_main,
+                                   args=(self.queue, output_file, driver, crs, flush_size, self._written,
+                                         ordered, spatial_order, errors), daemon=True)
+
+    @property
+    def written(self) -> int:
+        return self._written.value
+
+    def _watch(self) -> None:
+        # Espera el sentinel del proceso (sin recolectarlo, eso lo hace join); si termina antes de
+        # close(), el escritor falló
+        wait_connections([self._process.sentinel])
+        if not self._closing:
+            self.failed.set()
+
+    def start(self) -> 'StreamingVectorWriter':
+        self._process.start()
+        threading.Thread(target=self._watch, daemon=True).start()
+        return self
+
+    def _raise_if_failed(self, cause: Optional[BaseException] = None) -> None:
+        self._process.join()
+        if self._process.exitcode != 0:
+            detail = self._errors.recv() if self._errors.poll() else ''
+            raise RuntimeError(f"El proceso escritor terminó con código {self._process.exitcode}\n{detail}") from cause
+
+    def close(self) -> int:
+        """
+        Indica el fin de los lotes, espera al escritor y devuelve el número de geometrías escritas.
+        Relanza el error del escritor si terminó con código distinto de 0.
+        """
+        self._closing = True
+        while not self.failed.is_set() and self._process.is_alive():
+            try:
+                self.queue.put(None, timeout=SEND_TIMEOUT)
+                break
+            except queue.Full:
+                continue
+        self._raise_if_failed()
+        return self.written
+
+    def __enter__(self) -> 'StreamingVectorWriter':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        elif self.failed.is_set():
+            # El error de los workers es consecuencia de la caída del escritor: se informa la causa
+            self._raise_if_failed(exc)
+        else:
+            self._closing = True
+            self._process.terminate()
+            self._process.join()
+
+
+def init_worker(channel: mp.Queue, writer_failed=None) -> None:
+    """
+    Inicializador de los workers: guarda la cola del escritor y su aviso de error (no se pueden enviar
+    en cada tarea).
+    """
+    global _channel, _writer_failed
+    _channel = channel
+    _writer_failed = writer_failed
+
+
+def send_batch(batch: Dict) -> None:
+    """
+    Envía un lote al escritor; espera si la cola está llena, pero falla si el escritor terminó con error
+    en vez de quedar bloqueado para siempre.
+    """
+    if _channel is None:
+        raise RuntimeError("El worker no fue inicializado con init_worker")
+    while True:
+        try:
+            _channel.put(batch, timeout=SEND_TIMEOUT)
+            return
+        except queue.Full:
+            if _writer_failed is not None and _writer_failed.is_set():
+                raise RuntimeError("El proceso escritor terminó con error; no se puede enviar el lote")
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.Vector_StreamWriter`)
+if __name__ == "__main__":
+    from concurrent.futures import ProcessPoolExecutor
+
+    def _random_squares(seed: int) -> int:
+        rng = np.random.default_rng(seed)
+        x, y = rng.uniform(-70, -69, 1000), rng.uniform(-23, -22, 1000)
+        squares = shapely.box(x, y, x + 0.001, y + 0.001)
+        attributes = pd.DataFrame({'id': [f"{seed}_{i}" for i in range(len(squares))]})
+        send_batch(encode_batch([f"layer_{seed % 3}"] * len(squares), squares, attributes))
+        return len(squares)
+
+    start_time = time.time()
+    with StreamingVectorWriter('stream_writer_demo.gpkg') as writer:
+        with ProcessPoolExecutor(initializer=init_worker, initargs=(writer.queue, writer.failed)) as executor:
+            sent = sum(executor.map(_random_squares, range(50)))
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Geometrías enviadas: {sent}, escritas: {writer.written}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
@@ -0,0 +1,358 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'index.json'
+IMAGES_FILENAME = 'images.u8'
+CACHE_VERSION = 1
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff')
+
+# Normalización de google/vit-base-patch16-224-in21k (ViTFeatureExtractor)
+VIT_MEAN = (0.5, 0.5, 0.5)
+VIT_STD = (0.5, 0.5, 0.5)
+
+# Nombres de recortes: "[lon_min,lat_min,lon_max,lat_max]_<clase>_<id>.png" (COCO_GeoImageCropExtractor)
+# y "<clase>_(top, left, bottom, right).png" (coco_to_geopng)
+CROP_EXTRACTOR_PATTERN = re.compile(r"^\[([^\]]+)\]_")
+GEOPNG_PATTERN = re.compile(r"_\(([^)]+)\)$")
+
+
+def parse_crop_bounds(filename: str) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Recupera los límites geográficos de un recorte a partir de su nombre.
+
+    Returns:
+        Optional[Tuple[float, float, float, float]]: lon_min, lat_min, lon_max, lat_max, o None.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    try:
+        match = CROP_EXTRACTOR_PATTERN.match(stem)
+        if match:
+            left, bottom, right, top = map(float, match.group(1).split(','))
+            return left, bottom, right, top
+        match = GEOPNG_PATTERN.search(stem)
+        if match:
+            top, left, bottom, right = map(float, match.group(1).split(','))
+            return min(left, right), min(bottom, top), max(left, right), max(bottom, top)
+    except ValueError:
+        pass
+    return None
+
+
+def list_crops(crop_root: str) -> List[Tuple[str, str]]:
+    """
+    Lista los recortes bajo `crop_root` con su clase (la primera carpeta bajo la raíz), en orden estable.
+
+    Returns:
+        List[Tuple[str, str]]: (ruta relativa a la raíz, clase).
+    """
+    crops = []
+    for directory, _, filenames in os.walk(crop_root):
+        for filename in filenames:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                relative = os.path.relpath(os.path.join(directory, filename), crop_root)
+                parts = relative.split(os.sep)
+                crops.append((relative, parts[0] if len(parts) > 1 else ''))
+    return sorted(crops)
+
+
+def split_of(relative_path: str, test_ratio: float, seed: int = 0) -> str:
+    """
+    Asigna 'train' o 'test' según un hash estable de la ruta: la partición no depende del orden
+    del listado ni cambia para los recortes existentes cuando se agregan otros.
+    """
+    digest = hashlib.sha1(f"{seed}:{relative_path}".encode('utf-8')).digest()
+    fraction = int.from_bytes(digest[:8], 'big') / 2 ** 64
+    return 'test' if fraction < test_ratio else 'train'
+
+
+def load_crop(path: str, image_size: int = 224) -> np.ndarray:
+    """
+    Decodifica un recorte y lo redimensiona como ViTFeatureExtractor (RGB, bilineal, image_size²).
+    """
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB').resize((image_size, image_size), Image.BILINEAR), dtype=np.uint8)
+
+
+def _fill_rows(cache_dir: str, crop_root: str, paths: List[str], start: int, total: int, image_size: int) -> int:
+    """
+    Worker: decodifica un bloque de recortes y lo escribe en su rango del memmap.
+    """
+    images = np.memmap(os.path.join(cache_dir, IMAGES_FILENAME), dtype=np.uint8, mode='r+',
+                       shape=(total, image_size, image_size, 3))
+    for i, path in enumerate(paths):
+        images[start + i] = load_crop(os.path.join(crop_root, path), image_size)
+    images.flush()
+    return len(paths)
+
+
+def _listing_sha1(crop_root: str, crops: List[Tuple[str, str]]) -> str:
+    digest = hashlib.sha1()
+    for relative, _ in crops:
+        stat = os.stat(os.path.join(crop_root, relative))
+        digest.update(f"{relative}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_tensor_cache(crop_root: str, cache_dir: str, image_size: int = 224, test_ratio: float = 0.2,
+                       seed: int = 0, max_workers: Optional[int] = None, chunk_size: int = 256,
+                       force: bool = False) -> Dict:
+    """
+    Decodifica y redimensiona una sola vez todos los recortes de las carpetas por clase y los guarda en
+    un arreglo memory-mapped (N, image_size, image_size, 3) uint8, con etiquetas y partición fija.
+
+    Se guardan bytes y no tensores normalizados: ocupan 4 veces menos y la normalización por lote es
+    trivial. El caché se reutiliza mientras no cambien los archivos ni los parámetros.
+
+    Args:
+        crop_root (str): Carpeta con una subcarpeta por clase (p. ej. DB_SORTED_BY_TYPE).
+        cache_dir (str): Directorio del caché.
+        image_size (int): Lado de la imagen de entrada del ViT.
+        test_ratio (float): Fracción de prueba.
+        seed (int): Semilla del hash de partición.
+        max_workers (Optional[int]): Procesos para decodificar.
+        chunk_size (int): Recortes por tarea.
+        force (bool): Reconstruir aunque el caché esté al día.
+
+    Returns:
+        Dict: Índice del caché.
+    """
+    crops = list_crops(crop_root)
+    listing_sha1 = _listing_sha1(crop_root, crops)
+    params = {'image_size': image_size, 'test_ratio': test_ratio, 'seed': seed}
+
+    index_path = os.path.join(cache_dir, INDEX_FILENAME)
+    if not force and os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if (index.get('version') == CACHE_VERSION and index.get('listing_sha1') == listing_sha1
+                and index.get('params') == params):
+            logger.info(f"Caché de tensores al día en {cache_dir}")
+            return index
+
+    classes = sorted({label for _, label in crops})
+    label2id = {label: i for i, label in enumerate(classes)}
+    entries = [{
+        'path': relative,
+        'label': label2id[label],
+        'split': split_of(relative, test_ratio, seed),
+        'bounds': parse_crop_bounds(relative),
+    } for relative, label in crops]
+    total = len(entries)
+
+    # Construir en un directorio temporal y reemplazar al final: nunca queda un caché a medias
+    tmp_dir = cache_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.memmap(os.path.join(tmp_dir, IMAGES_FILENAME), dtype=np.uint8, mode='w+',
+              shape=(max(total, 1), image_size, image_size, 3)).flush()
+
+    logger.info(f"Construyendo caché de {total} recortes ({len(classes)} clases) en {cache_dir}...")
+    paths = [entry['path'] for entry in entries]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_fill_rows, tmp_dir, crop_root, paths[start:start + chunk_size], start,
+                                   max(total, 1), image_size) for start in range(0, total, chunk_size)]
+        for future in as_completed(futures):
+            future.result()
+
+    index = {
+        'version': CACHE_VERSION,
+        'listing_sha1': listing_sha1,
+        'params': params,
+        'label2id': label2id,
+        'total': total,
+        'entries': entries,
+    }
+    with open(os.path.join(tmp_dir, INDEX_FILENAME), 'w') as f:
+        json.dump(index, f)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    return index
+
+
+def normalize(images: torch.Tensor, mean: Sequence[float] = VIT_MEAN, std: Sequence[float] = VIT_STD) -> torch.Tensor:
+    """
+    (N, alto, ancho, 3) uint8 -> (N, 3, alto, ancho) float32 normalizado, como ViTFeatureExtractor.
+    """
+    pixels = images.permute(0, 3, 1, 2).float().div_(255.0)
+    mean = torch.tensor(mean, dtype=pixels.dtype).view(1, 3, 1, 1)
+    std = torch.tensor(std, dtype=pixels.dtype).view(1, 3, 1, 1)
+    return pixels.sub_(mean).div_(std)
+
+
+class CachedCropDataset(Dataset):
+    """
+    Recortes de una partición leídos desde el caché memory-mapped, listos para el ViT.
+
+    Cada elemento es {'pixel_values': (3, 224, 224) float32, 'labels': int}, el formato que espera
+    `transformers.Trainer` con ViTForImageClassification. Los workers del DataLoader abren el memmap
+    en modo solo lectura tras el fork, sin copiar arreglos.
+    """
+
+    def __init__(self, cache_dir: str, split: str = 'train', transform: Optional[Callable] = None,
+                 mean: Sequence[float] = VIT_MEAN, std: Sequence[float] = VIT_STD):
+        """
+        Args:
+            cache_dir (str): Directorio del caché.
+            split (str): 'train' o 'test'.
+            transform (Optional[Callable]): Aumentación sobre el tensor uint8 (3, alto, ancho), antes de normalizar.
+            mean (Sequence[float]): Media de normalización.
+            std (Sequence[float]): Desviación estándar de normalización.
+        """
+        with open(os.path.join(cache_dir, INDEX_FILENAME)) as f:
+            self.index = json.load(f)
+        self.cache_dir = cache_dir
+        self.transform = transform
+        self.mean = mean
+        self.std = std
+        self.rows = np.array([i for i, entry in enumerate(self.index['entries']) if entry['split'] == split],
+                             dtype=np.int64)
+        self.labels = np.array([self.index['entries'][i]['label'] for i in self.rows], dtype=np.int64)
+        self.label2id = self.index['label2id']
+        self.id2label = {i: label for label, i in self.label2id.items()}
+        self._images = None
+
+    def _open(self) -> None:
+        size = self.index['params']['image_size']
+        self._images = np.memmap(os.path.join(self.cache_dir, IMAGES_FILENAME), dtype=np.uint8, mode='r',
+                                 shape=(max(self.index['total'], 1), size, size, 3))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def __getitem__(self, index: int) -> Dict:
+        if self._images is None:
+            self._open()
+        image = torch.from_numpy(np.array(self._images[self.rows[index]]))
+        if self.transform:
+            image = self.transform(image.permute(2, 0, 1)).permute(1, 2, 0)
+        return {'pixel_values': normalize(image[None], self.mean, self.std)[0], 'labels': int(self.labels[index])}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+def load_splits(crop_root: str, cache_dir: str, test_ratio: float = 0.2, augmentation: Optional[Callable] = None,
+                **kwargs) -> Tuple[CachedCropDataset, CachedCropDataset, Dict[int, str], Dict[str, int]]:
+    """
+    Reemplazo de `VisionDataset.fromImageFolder`: construye (o reutiliza) el caché y devuelve
+    train, test, id2label y label2id.
+    """
+    build_tensor_cache(crop_root, cache_dir, test_ratio=test_ratio, **kwargs)
+    train = CachedCropDataset(cache_dir, 'train', transform=augmentation)
+    test = CachedCropDataset(cache_dir, 'test')
+    return train, test, train.id2label, train.label2id
+
+
+def _load_batch(crop_root: str, paths: List[str], image_size: int) -> np.ndarray:
+    return np.stack([load_crop(os.path.join(crop_root, path), image_size) for path in paths])
+
+
+def predict_directory(
+    model_path: str,
+    crop_root: str,
+    output_path: str,
+    batch_size: int = 64,
+    num_threads: Optional[int] = None,
+    prefetch: int = 4,
+) -> pd.DataFrame:
+    """
+    Clasifica todos los recortes de un directorio por lotes en CPU y guarda una tabla con la clase
+    predicha, su probabilidad y los límites geográficos de cada recorte.
+
+    La decodificación de los lotes siguientes se hace en hilos mientras el modelo procesa el actual.
+
+    Args:
+        model_path (str): Carpeta del modelo entrenado (ViTForImageClassification + feature extractor).
+        crop_root (str): Carpeta de recortes (cualquier estructura de subcarpetas).
+        output_path (str): Tabla de salida (.parquet o .csv).
+        batch_size (int): Recortes por lote.
+        num_threads (Optional[int]): Hilos de PyTorch.
+        prefetch (int): Lotes decodificados por adelantado.
+
+    Returns:
+        pd.DataFrame: Una fila por recorte.
+    """
+    from transformers import ViTFeatureExtractor, ViTForImageClassification
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    feature_extractor = ViTFeatureExtractor.from_pretrained(model_path)
+    model = ViTForImageClassification.from_pretrained(model_path).eval()
+    size = feature_extractor.size
+    image_size = int(size['height'] if isinstance(size, dict) else size)
+    mean, std = feature_extractor.image_mean, feature_extractor.image_std
+
+    paths = [relative for relative, _ in list_crops(crop_root)]
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    logger.info(f"Clasificando {len(paths)} recortes en {len(batches)} lotes...")
+
+    predictions, scores = [], []
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        pending = [executor.submit(_load_batch, crop_root, batch, image_size) for batch in batches[:prefetch]]
+        for i in range(len(batches)):
+            images = pending[i].result()
+            pending[i] = None
+            if i + prefetch < len(batches):
+                pending.append(executor.submit(_load_batch, crop_root, batches[i + prefetch], image_size))
+            with torch.inference_mode():
+                logits = model(pixel_values=normalize(torch.from_numpy(images), mean, std)).logits
+            probabilities = logits.softmax(dim=-1)
+            score, predicted = probabilities.max(dim=-1)
+            predictions.extend(predicted.tolist())
+            scores.extend(score.tolist())
+
+    bounds = [parse_crop_bounds(path) or (np.nan,) * 4 for path in paths]
+    table = pd.DataFrame({
+        'path': paths,
+        'folder': [path.split(os.sep)[0] if os.sep in path else '' for path in paths],
+        'predicted': [model.config.id2label[p] for p in predictions],
+        'score': scores,
+    })
+    table[['lon_min', 'lat_min', 'lon_max', 'lat_max']] = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    if output_path.endswith('.parquet'):
+        table.to_parquet(output_path, index=False)
+    else:
+        table.to_csv(output_path, index=False)
+    return table
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.ViT_TensorCache`)
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración
+    crop_root = "./DB_SORTED_BY_TYPE"
+    cache_dir = "./DB_SORTED_BY_TYPE_cache"
+    model_path = "./out/MWDTYPE/5_2023-12-11-23-42-51/model"
+
+    train, test, id2label, label2id = load_splits(crop_root, cache_dir, test_ratio=0.20)
+    logger.info(f"Entrenamiento: {len(train)}, prueba: {len(test)}, clases: {id2label}")
+
+    table = predict_directory(model_path, crop_root, "./out/predictions.parquet", batch_size=64,
+                              num_threads=os.cpu_count())
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Recortes clasificados: {len(table)}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
@@ -0,0 +1,208 @@
+import os
+import re
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from rasterio.transform import from_bounds
+
+from utils.Geometry_PostProcessor import postprocess
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Un número del nombre de archivo; Roboflow reemplaza el punto decimal por '-' ("-22-2883" = -22.2883)
+NUMBER_PATTERN = re.compile(r"^(-?\d+)[.-](\d+)$")
+# Sufijo que agrega Roboflow: "_png.rf.<hash>.jpg"
+ROBOFLOW_SUFFIX = re.compile(r"_(png|jpg|jpeg|tif)\.rf\.[0-9a-f]+$", re.IGNORECASE)
+# Prefijo de 8 hexadecimales que agrega Label Studio; el '-' que le sigue es el signo de la latitud
+# ("3b9c485d-22-2883..." = -22.2883), como en `clean_filename` del notebook (start_index = 8)
+HASH_PREFIX = re.compile(r"^[0-9a-f]{8}(?=-\d)")
+
+
+@dataclass
+class YoloLabels:
+    """
+    Todas las etiquetas YOLO en arreglos columnares.
+
+    El polígono i tiene sus vértices en `coords[ring_offsets[i]:ring_offsets[i + 1]]`
+    (normalizados a [0, 1]) y proviene del archivo `filenames[file_index[i]]`.
+    """
+    filenames: List[str]
+    file_index: np.ndarray
+    class_id: np.ndarray
+    confidence: np.ndarray
+    ring_offsets: np.ndarray
+    coords: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.class_id)
+
+    def polygon(self, i: int) -> np.ndarray:
+        return self.coords[self.ring_offsets[i]:self.ring_offsets[i + 1]]
+
+
+def _parse_label_text(text: str) -> Tuple[List[int], List[float], List[np.ndarray]]:
+    classes, scores, rings = [], [], []
+    for line in text.splitlines():
+        values = np.array(line.split(), dtype=np.float64)
+        if values.size < 7:
+            continue
+        coords = values[1:]
+        # Con save_conf, ultralytics agrega la confianza al final (queda un número impar de valores)
+        if coords.size % 2 == 1:
+            score, coords = float(coords[-1]), coords[:-1]
+        else:
+            score = 1.0
+        classes.append(int(values[0]))
+        scores.append(score)
+        rings.append(coords.reshape(-1, 2))
+    return classes, scores, rings
+
+
+def _read_text(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def load_yolo_labels(labels_folder: str, max_workers: int = 16) -> YoloLabels:
+    """
+    Lee todos los .txt de una carpeta de etiquetas YOLO y los deja en arreglos columnares.
+
+    Args:
+        labels_folder (str): Carpeta runs/segment/predict/labels.
+        max_workers (int): Hilos para la lectura de archivos.
+
+    Returns:
+        YoloLabels: Polígonos de todas las etiquetas.
+    """
+    filenames = sorted(f for f in os.listdir(labels_folder) if f.endswith('.txt'))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        texts = list(executor.map(_read_text, [os.path.join(labels_folder, f) for f in filenames]))
+
+    file_index, classes, scores, rings = [], [], [], []
+    for i, text in enumerate(texts):
+        c, s, r = _parse_label_text(text)
+        file_index.extend([i] * len(c))
+        classes.extend(c)
+        scores.extend(s)
+        rings.extend(r)
+
+    lengths = np.array([len(r) for r in rings], dtype=np.int64)
+    return YoloLabels(
+        filenames=filenames,
+        file_index=np.array(file_index, dtype=np.int64),
+        class_id=np.array(classes, dtype=np.int64),
+        confidence=np.array(scores, dtype=np.float64),
+        ring_offsets=np.concatenate([[0], np.cumsum(lengths)]),
+        coords=np.concatenate(rings) if rings else np.empty((0, 2)),
+    )
+
+
+def parse_tile_bounds(filename: str) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Recupera los límites WGS84 de una tesela a partir de su nombre.
+
+    Acepta el formato del teselador (`minx_maxx_miny_maxy`, con minx/maxx en latitud por el orden de ejes
+    de EPSG:4326) y la variante de Roboflow con prefijo hash, puntos reemplazados por '-' y sufijo `_png.rf.<hash>`.
+
+    Returns:
+        Optional[Tuple[float, float, float, float]]: lon_min, lat_min, lon_max, lat_max, o None.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    stem = ROBOFLOW_SUFFIX.sub('', stem)
+    stem = HASH_PREFIX.sub('', stem)
+    tokens = stem.split('_')
+    if len(tokens) != 4:
+        return None
+    values = []
+    for token in tokens:
+        match = NUMBER_PATTERN.match(token)
+        if not match:
+            return None
+        values.append(float(f"{match.group(1)}.{match.group(2)}"))
+    lat_a, lat_b, lon_a, lon_b = values
+    return min(lon_a, lon_b), min(lat_a, lat_b), max(lon_a, lon_b), max(lat_a, lat_b)
+
+
+def tile_transform(filename: str, width: int, height: int):
+    """
+    Transformación afín de una tesela derivada de su nombre.
+    """
+    bounds = parse_tile_bounds(filename)
+    return from_bounds(*bounds, width, height) if bounds else None
+
+
+def labels_to_geodataframe(labels: YoloLabels, class_names: Optional[Dict[int, str]] = None) -> gpd.GeoDataFrame:
+    """
+    Georreferencia todos los polígonos en una sola pasada vectorizada (sin leer las imágenes:
+    las coordenadas YOLO son normalizadas, basta con los límites de cada tesela).
+    """
+    bounds = np.array([parse_tile_bounds(f) or (np.nan,) * 4 for f in labels.filenames], dtype=np.float64)
+    if len(bounds) == 0:
+        bounds = np.empty((0, 4))
+    per_polygon = bounds[labels.file_index]
+    valid = ~np.isnan(per_polygon).any(axis=1) & (np.diff(labels.ring_offsets) >= 3)
+    skipped = np.unique(labels.file_index[np.isnan(per_polygon).any(axis=1)])
+    if len(skipped):
+        logger.warning(f"{len(skipped)} archivos sin coordenadas reconocibles en el nombre")
+
+    lengths = np.diff(labels.ring_offsets)
+    ring_index = np.repeat(np.arange(len(labels)), lengths)
+    vertex_bounds = per_polygon[ring_index]
+    lon = vertex_bounds[:, 0] + labels.coords[:, 0] * (vertex_bounds[:, 2] - vertex_bounds[:, 0])
+    lat = vertex_bounds[:, 3] - labels.coords[:, 1] * (vertex_bounds[:, 3] - vertex_bounds[:, 1])
+
+    keep_vertex = valid[ring_index]
+    # Índices consecutivos: un anillo por polígono válido, en el mismo orden que `idx`
+    _, kept_ring_index = np.unique(ring_index[keep_vertex], return_inverse=True)
+    rings = shapely.linearrings(np.column_stack([lon, lat])[keep_vertex], indices=kept_ring_index)
+    polygons = shapely.polygons(rings)
+
+    idx = np.where(valid)[0]
+    filenames = np.array(labels.filenames, dtype=object)
+    class_names = class_names or {}
+    return gpd.GeoDataFrame({
+        'filename': filenames[labels.file_index[idx]],
+        'class_id': labels.class_id[idx],
+        'class': [class_names.get(int(c), str(int(c))) for c in labels.class_id[idx]],
+        'confidence': labels.confidence[idx],
+    }, geometry=polygons, crs="EPSG:4326")
+
+
+def export_predictions(labels_folder: str, output_file: str, layer: str = 'predictions',
+                       class_names: Optional[Dict[int, str]] = None) -> int:
+    """
+    Escribe todas las predicciones (WGS84, con clase, confianza y atributos geométricos) en una sola
+    capa con índice espacial.
+
+    Returns:
+        int: Número de polígonos escritos.
+    """
+    gdf = postprocess(labels_to_geodataframe(load_yolo_labels(labels_folder), class_names))
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    gdf.to_file(output_file, layer=layer, driver="GPKG", SPATIAL_INDEX="YES")
+    return len(gdf)
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.YOLO_LabelGeoExporter`)
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración
+    labels_folder = '/home/robotica10/yolov8/runs/segment/predict/labels'
+    output_file = '/home/robotica10/yolov8/runs/segment/predict/predictions.gpkg'
+    class_names = {0: 'bem', 1: 'ripio', 2: 'tranque'}
+
+    n = export_predictions(labels_folder, output_file, class_names=class_names)
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Polígonos exportados: {n} en {output_file}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")
@@ -0,0 +1,215 @@
+import os
+import time
+import logging
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+from segment_anything import sam_model_registry, SamPredictor
+
+from utils.SAM_EmbeddingCache import SamEmbeddingCache
+
+# Configuración del logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff')
+
+ImageSource = Union[str, Tuple[str, np.ndarray]]
+
+
+@dataclass
+class SegmentationResult:
+    """
+    Una detección de YOLO refinada por SAM.
+    """
+    image_id: str
+    detection_id: int
+    class_id: int
+    class_name: str
+    score: float
+    sam_score: float
+    box: Tuple[float, float, float, float]
+    mask: np.ndarray
+
+
+def iter_images(source: Union[str, Iterable[ImageSource]]) -> Iterator[Tuple[str, np.ndarray]]:
+    """
+    Entrega pares (id, imagen RGB) desde un directorio, una lista de rutas o un stream de (id, arreglo RGB).
+    """
+    if isinstance(source, str):
+        source = [os.path.join(source, f) for f in sorted(os.listdir(source)) if f.lower().endswith(IMAGE_EXTENSIONS)]
+    for item in source:
+        if isinstance(item, str):
+            image = cv2.imread(item)
+            if image is None:
+                logger.warning(f"No se pudo leer la imagen {item}")
+                continue
+            yield item, cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        else:
+            yield item
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[List]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class YoloSamPipeline:
+    """
+    Pipeline detección→segmentación: YOLOv8 propone cajas y SAM las segmenta.
+
+    Ambos modelos se cargan una sola vez. YOLO procesa las imágenes por lotes y todas las cajas de
+    una imagen se envían a SAM en una sola llamada. Funciona en CPU con tamaño de lote e hilos configurables.
+    """
+
+    def __init__(
+        self,
+        yolo_weights: str,
+        sam_checkpoint: str,
+        model_type: str = "vit_h",
+        device: Optional[str] = None,
+        batch_size: int = 8,
+        num_threads: Optional[int] = None,
+        conf: float = 0.25,
+        imgsz: int = 640,
+        embedding_cache: Optional[SamEmbeddingCache] = None,
+    ):
+        """
+        Args:
+            yolo_weights (str): Ruta a best.pt de YOLOv8.
+            sam_checkpoint (str): Ruta al checkpoint de SAM.
+            model_type (str): Tipo de modelo SAM ('vit_h', 'vit_l', 'vit_b').
+            device (Optional[str]): 'cuda' o 'cpu'; por defecto cuda si está disponible.
+            batch_size (int): Imágenes por lote de YOLO.
+            num_threads (Optional[int]): Hilos de PyTorch en CPU.
+            conf (float): Confianza mínima de YOLO.
+            imgsz (int): Tamaño de entrada de YOLO.
+            embedding_cache (Optional[SamEmbeddingCache]): Caché de embeddings de SAM; si se indica,
+                las imágenes ya vistas no vuelven a pasar por el encoder.
+        """
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.batch_size = batch_size
+        self.conf = conf
+        self.imgsz = imgsz
+
+        self.yolo = YOLO(yolo_weights)
+        self.class_names = self.yolo.names
+
+        sam = sam_model_registry[model_type](checkpoint=sam_checkpoint)
+        sam.to(device=self.device)
+        sam.eval()
+        self.model_type = model_type
+        self.predictor = SamPredictor(sam)
+        self.embedding_cache = embedding_cache
+
+    def set_image(self, image: np.ndarray, use_cache: bool = True) -> None:
+        """
+        Calcula el embedding de SAM para la imagen (el paso más costoso), o lo restaura del caché.
+        Con `use_cache=False` se calcula siempre y no se guarda (imágenes que no se repetirán).
+        """
+        if use_cache and self.embedding_cache is not None:
+            self.embedding_cache.set_image(self.predictor, image, self.model_type)
+        else:
+            self.predictor.set_image(image)
+
+    def detect(self, images: List[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Ejecuta YOLO sobre un lote de imágenes RGB.
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray, np.ndarray]]: Por imagen, cajas xyxy, clases y confianzas.
+        """
+        # Ultralytics espera imágenes BGR cuando recibe arreglos
+        bgr = [cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for image in images]
+        results = self.yolo.predict(bgr, conf=self.conf, imgsz=self.imgsz, device=self.device, verbose=False)
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            detections.append((boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int), boxes.conf.cpu().numpy()))
+        return detections
+
+    @torch.no_grad()
+    def segment(self, image: np.ndarray, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Segmenta todas las cajas de la imagen actual en una sola llamada a SAM.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Máscaras (N, alto, ancho) y puntajes de SAM (N,).
+        """
+        boxes_tensor = torch.as_tensor(boxes, dtype=torch.float, device=self.predictor.device)
+        transformed = self.predictor.transform.apply_boxes_torch(boxes_tensor, image.shape[:2])
+        masks, scores, _ = self.predictor.predict_torch(
+            point_coords=None,
+            point_labels=None,
+            boxes=transformed,
+            multimask_output=False,
+        )
+        return masks[:, 0].cpu().numpy(), scores[:, 0].cpu().numpy()
+
+    def run(self, source: Union[str, Iterable[ImageSource]]) -> Iterator[SegmentationResult]:
+        """
+        Procesa un directorio o stream de imágenes y entrega cada máscara a medida que se obtiene.
+
+        Args:
+            source: Directorio, lista de rutas o stream de (id, arreglo RGB).
+
+        Yields:
+            SegmentationResult: Una máscara por detección, con clase, puntajes e identificadores.
+        """
+        for batch in batched(iter_images(source), self.batch_size):
+            ids = [image_id for image_id, _ in batch]
+            images = [image for _, image in batch]
+            for image_id, image, (boxes, classes, scores) in zip(ids, images, self.detect(images)):
+                if len(boxes) == 0:
+                    continue
+                self.set_image(image)
+                masks, sam_scores = self.segment(image, boxes)
+                for i in range(len(boxes)):
+                    yield SegmentationResult(
+                        image_id=image_id,
+                        detection_id=i,
+                        class_id=int(classes[i]),
+                        class_name=self.class_names.get(int(classes[i]), str(classes[i])),
+                        score=float(scores[i]),
+                        sam_score=float(sam_scores[i]),
+                        box=tuple(float(c) for c in boxes[i]),
+                        mask=masks[i],
+                    )
+
+
+# Uso del script (ejecutar desde la raíz del repositorio con `python -m utils.YOLO_SAM_Pipeline`)
+if __name__ == "__main__":
+    start_time = time.time()
+
+    # Configuración
+    yolo_weights = '/home/robotica10/yolov8/runs/segment/train3/weights/best.pt'
+    sam_checkpoint = "sam_vit_h_4b8939.pth"
+    image_directory = "/home/robotica10/yolov7-segmentation/c.v2i.yolov5pytorch/train/images"
+
+    pipeline = YoloSamPipeline(yolo_weights, sam_checkpoint, model_type="vit_h", device="cpu",
+                               batch_size=8, num_threads=os.cpu_count(),
+                               embedding_cache=SamEmbeddingCache("./sam_embeddings"))
+    n_masks = 0
+    images = set()
+    for result in pipeline.run(image_directory):
+        n_masks += 1
+        images.add(result.image_id)
+        logger.info(f"{os.path.basename(result.image_id)} #{result.detection_id}: {result.class_name} "
+                    f"yolo={result.score:.2f} sam={result.sam_score:.2f} área={int(result.mask.sum())} px")
+
+    execution_time_minutes = (time.time() - start_time) / 60
+    logger.info(f"Máscaras generadas: {n_masks} en {len(images)} imágenes")
+    logger.info(f"Caché de embeddings: {pipeline.embedding_cache.stats}")
+    logger.info(f"Tiempo total de ejecución: {execution_time_minutes:.2f} minutos")